@@ -1,55 +1,236 @@
-import streamlit as st
-import requests
+import hashlib
 import os
+import time
+import uuid
+
+import requests
+import streamlit as st
 
-st.set_page_config(page_title="Resume Tailoring Tool", layout="centered")
+# Job descriptions that can be tailored and compared side by side.
+MAX_JDS = 4
+POLL_INTERVAL_SECONDS = 1.0
+JOB_TIMEOUT_SECONDS = 600
+# A 429 on submission is waited out (per its Retry-After) this many times before giving up.
+SUBMIT_RETRIES = 3
+MAX_RETRY_WAIT_SECONDS = 30
+
+st.set_page_config(page_title="Resume Tailoring Tool", layout="wide")
 st.title("Resume Tailoring Tool")
-st.write("Upload your resume PDF, LaTeX template, and paste the job description.")
+st.write("Upload your resume PDF and LaTeX template, then paste one or more job descriptions to compare.")
+
+backend_url = st.text_input("Backend URL (FastAPI)", value=os.getenv("BACKEND_URL", "https://resume-tailoring-tool.onrender.com"))
+# Older settings pointed at the /tailor_resume endpoint itself; everything below uses the base URL.
+BASE_URL = backend_url.strip().rstrip("/").removesuffix("/tailor_resume")
+
+# Labels this browser session in the backend's fair queue (rate limits are per address).
+st.session_state.setdefault("client_id", uuid.uuid4().hex)
+# Input hash -> {"job_id", "status", "stage", "progress", "error"} for every job this session submitted.
+st.session_state.setdefault("jobs", {})
+# What the results section shows: the resume's hash and one entry per compared JD.
+st.session_state.setdefault("comparison", None)
+
+
+class BackendError(Exception):
+    pass
+
+
+def digest(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    """One keep-alive connection pool for every session of this app."""
+    return requests.Session()
+
+
+def call(base_url: str, method: str, path: str, **kwargs) -> requests.Response:
+    headers = {"X-Client-Id": st.session_state.client_id}
+    return http_session().request(method, base_url + path, headers=headers, timeout=60, **kwargs)
+
+
+def error_message(resp: requests.Response) -> str:
+    try:
+        message = resp.json().get("error", "Unknown error")
+    except ValueError:
+        message = resp.text[:500] or f"HTTP {resp.status_code}"
+    if resp.status_code == 429 and resp.headers.get("Retry-After"):
+        message += f" (retry in {resp.headers['Retry-After']}s)"
+    return message
 
-API_URL = st.text_input("Backend URL (FastAPI)", value=os.getenv("BACKEND_URL", "https://resume-tailoring-tool.onrender.com/tailor_resume"))
+
+# Arguments starting with "_" are not hashed by st.cache_data: uploads are keyed
+# on their SHA-256 instead, so reruns neither re-hash nor re-send megabytes.
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def register_template(base_url: str, template_hash: str, _template: bytes) -> str:
+    """template_id of a template, uploaded once per content hash."""
+    resp = call(base_url, "POST", "/templates", files={"latex_template": ("template.tex", _template, "text/x-tex")})
+    if resp.status_code != 201:
+        raise BackendError(f"Template rejected: {error_message(resp)}")
+    return resp.json()["template_id"]
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def tailored_result(base_url: str, input_hash: str, _job_id: str) -> dict:
+    """PDF and LaTeX of a finished job, cached by the hash of its inputs."""
+    pdf = call(base_url, "GET", f"/jobs/{_job_id}/pdf")
+    if pdf.status_code != 200:
+        raise BackendError(error_message(pdf))
+    latex = call(base_url, "GET", f"/jobs/{_job_id}/latex")
+    return {"pdf": pdf.content, "latex": latex.text if latex.status_code == 200 else None}
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def match_score(base_url: str, pdf_hash: str, jd_hash: str, _pdf: bytes, _jd_text: str):
+    """Local keyword/similarity score of a PDF against a JD (no LLM call), or None if unavailable."""
+    resp = call(base_url, "POST", "/match_score", files={"resume_pdf": ("resume.pdf", _pdf, "application/pdf")},
+                data={"jd_text": _jd_text})
+    return resp.json() if resp.status_code == 200 else None
+
+
+def submit_job(base_url: str, resume: bytes, template_hash: str, template: bytes, jd_text: str, api_key: str) -> str:
+    data = {"jd_text": jd_text}
+    if api_key:
+        data["api_key"] = api_key
+    registered_again = False
+    retries = 0
+    while True:
+        data["template_id"] = register_template(base_url, template_hash, template)
+        resp = call(base_url, "POST", "/jobs", files={"resume_pdf": ("resume.pdf", resume, "application/pdf")}, data=data)
+        if resp.status_code == 404 and not registered_again:
+            # The backend lost its template registry (e.g. a fresh container); upload the template again.
+            register_template.clear()
+            registered_again = True
+            continue
+        if resp.status_code == 429 and retries < SUBMIT_RETRIES:
+            retries += 1
+            try:
+                wait = float(resp.headers.get("Retry-After", POLL_INTERVAL_SECONDS))
+            except ValueError:
+                wait = POLL_INTERVAL_SECONDS
+            with st.spinner(f"Backend is busy, retrying in {wait:.0f}s..."):
+                time.sleep(min(wait, MAX_RETRY_WAIT_SECONDS))
+            continue
+        if resp.status_code != 202:
+            raise BackendError(error_message(resp))
+        return resp.json()["job_id"]
+
+
+def poll_jobs(items: list, placeholders: dict):
+    """Poll unfinished jobs, updating their progress bars, until all are done or JOB_TIMEOUT_SECONDS pass."""
+    jobs = st.session_state.jobs
+    deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+    pending = [item["key"] for item in items if jobs.get(item["key"], {}).get("status") in ("queued", "running")]
+    while pending and time.monotonic() < deadline:
+        for key in list(pending):
+            try:
+                resp = call(BASE_URL, "GET", f"/jobs/{jobs[key]['job_id']}")
+            except requests.exceptions.RequestException:
+                continue  # transient; try again on the next round
+            if resp.status_code != 200:
+                jobs[key].update(status="failed", error=error_message(resp))
+            else:
+                jobs[key].update(resp.json())
+            if jobs[key]["status"] in ("succeeded", "failed"):
+                pending.remove(key)
+                placeholders[key].empty()
+            else:
+                placeholders[key].progress(jobs[key]["progress"] / 100, text=f"{jobs[key]['stage']}...")
+        if pending:
+            time.sleep(POLL_INTERVAL_SECONDS)
+    for key in pending:
+        jobs[key].update(status="failed", error=f"Still running after {JOB_TIMEOUT_SECONDS}s; resubmit to keep waiting")
+
+
+jd_count = st.number_input("Job descriptions to compare", min_value=1, max_value=MAX_JDS, value=1)
 
 with st.form("tailor_form"):
     resume_file = st.file_uploader("Upload resume (PDF)", type=["pdf"])
     latex_file = st.file_uploader("Upload LaTeX template (.tex)", type=["tex"])
-    jd_text = st.text_area("Job Description (paste here)", height=200)
+    jd_texts = [st.text_area(f"Job Description {i + 1} (paste here)", height=200, key=f"jd_{i}")
+                for i in range(int(jd_count))]
     api_key_input = st.text_input("OpenRouter API Key (optional; leave blank to use backend env var)", type="password")
-    keep_files = st.checkbox("Keep temp files on backend (for debugging)", value=False)
     submit = st.form_submit_button("Tailor Resume")
 
 if submit:
-    if not resume_file or not latex_file or not jd_text.strip():
-        st.error("Please provide resume PDF, LaTeX template and job description.")
+    jd_texts = [jd for jd in jd_texts if jd.strip()]
+    if not resume_file or not latex_file or not jd_texts:
+        st.error("Please provide resume PDF, LaTeX template and at least one job description.")
     else:
-        with st.spinner("Sending data to backend... this may take 30–90s"):
+        resume = resume_file.getvalue()
+        template = latex_file.getvalue()
+        resume_hash, template_hash = digest(resume), digest(template)
+        items = []
+        try:
+            for i, jd_text in enumerate(jd_texts):
+                key = digest(resume_hash, template_hash, jd_text)
+                items.append({"key": key, "title": f"JD {i + 1}", "jd_text": jd_text, "jd_hash": digest(jd_text)})
+                # Inputs already tailored (or in progress) in this session are not sent again.
+                if st.session_state.jobs.get(key, {}).get("status") in ("queued", "running", "succeeded"):
+                    continue
+                job_id = submit_job(BASE_URL, resume, template_hash, template, jd_text, api_key_input)
+                st.session_state.jobs[key] = {"job_id": job_id, "status": "queued", "stage": "queued",
+                                              "progress": 0, "error": None}
+        except BackendError as e:
+            st.error(f"Backend error: {e}")
+        except requests.exceptions.RequestException as e:
+            st.error(f"Request failed: {str(e)}")
+        st.session_state.comparison = {"resume_hash": resume_hash, "items": items}
+
+comparison = st.session_state.comparison
+if comparison and comparison["items"]:
+    items = comparison["items"]
+    jobs = st.session_state.jobs
+    # The uploader keeps its file across reruns, so the original resume can be scored without the user re-uploading.
+    resume = resume_file.getvalue() if resume_file and digest(resume_file.getvalue()) == comparison["resume_hash"] else None
+
+    st.subheader("Results")
+    columns = st.columns(len(items))
+    placeholders = {}
+    for column, item in zip(columns, items):
+        with column:
+            st.markdown(f"**{item['title']}**")
+            placeholders[item["key"]] = st.empty()
+    poll_jobs(items, placeholders)
+
+    for column, item in zip(columns, items):
+        job = jobs.get(item["key"])
+        with column:
+            if job is None:
+                st.warning("Not submitted")
+                continue
+            if job["status"] == "failed":
+                st.error(job["error"] or "Tailoring failed")
+                continue
+            if job["status"] != "succeeded":
+                st.info(f"{job['status']} ({job['stage']})")
+                continue
             try:
-                files = {
-                    "resume_pdf": ("resume.pdf", resume_file.getvalue(), "application/pdf"),
-                    "latex_template": ("template.tex", latex_file.getvalue(), "text/x-tex"),
-                }
-                data = {
-                    "jd_text": jd_text,
-                    "keep_files": str(keep_files).lower()
-                }
-                if api_key_input:
-                    data["api_key"] = api_key_input
-
-                resp = requests.post(API_URL, files=files, data=data, timeout=300)
-
-                if resp.status_code == 200 and resp.headers.get("content-type","").startswith("application/pdf"):
-                    st.success("Tailored PDF ready!")
-                    st.download_button(
-                        label="Download tailored PDF",
-                        data=resp.content,
-                        file_name="tailored_resume.pdf",
-                        mime="application/pdf"
-                    )
-                else:
-                    try:
-                        j = resp.json()
-                        st.error(f"Backend error: {j.get('error', 'Unknown error')}")
-                    except Exception:
-                        st.error(f"Unexpected response: {resp.status_code}")
-                        st.text(resp.text[:2000])
-
-            except requests.exceptions.RequestException as e:
-                st.error(f"Request failed: {str(e)}")
+                result = tailored_result(BASE_URL, item["key"], job["job_id"])
+            except (BackendError, requests.exceptions.RequestException) as e:
+                st.error(f"Could not fetch the result: {e}")
+                continue
+
+            tailored = match_score(BASE_URL, digest(result["pdf"]), item["jd_hash"], result["pdf"], item["jd_text"])
+            original = match_score(BASE_URL, comparison["resume_hash"], item["jd_hash"], resume,
+                                   item["jd_text"]) if resume else None
+            if tailored:
+                delta = round(tailored["score"] - original["score"], 1) if original else None
+                st.metric("Match score", tailored["score"], delta=delta)
+                if tailored["missing_keywords"]:
+                    st.caption("Missing keywords: " + ", ".join(tailored["missing_keywords"][:10]))
+            st.download_button(
+                label="Download tailored PDF",
+                data=result["pdf"],
+                file_name=f"tailored_resume_{item['title'].replace(' ', '_').lower()}.pdf",
+                mime="application/pdf",
+                key=f"download_{item['key']}",
+            )
+            if result["latex"]:
+                with st.expander("LaTeX"):
+                    st.code(result["latex"], language="latex")
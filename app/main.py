@@ -1,11 +1,140 @@
-from fastapi import FastAPI, UploadFile, Form
-from fastapi.responses import FileResponse, JSONResponse
+from dotenv import load_dotenv
+
+# Before the imports below, which read their configuration from the environment.
+load_dotenv()
+
+from fastapi import FastAPI, UploadFile, Form, File
+from typing import List, Optional
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from tempfile import TemporaryDirectory
-import shutil
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import base64
+import threading
+from contextlib import asynccontextmanager
+import importlib
+import io
+import json
+import multiprocessing
+import zipfile
+import tempfile
 import os
 
-from tailor_resume import resume_tailoring_pipeline
+from tailor_resume import (
+    run_tailoring,
+    run_tailoring_async,
+    stream_tailoring_events,
+    tailor_latex_async,
+    TAILORING_ENGINES,
+)
+from utils.batch_utils import tailor_batch, safe_name
+from utils.pdf_and_latex_utils import pdflatex_version, read_pdf, save_latex_code
+from utils.http_utils import close_async_client, get_async_client, get_session
+from utils.llm_scheduler import RateLimitedError, current_client, get_llm_scheduler, start_llm_request
+from utils.latex_validation_utils import LatexValidationError
+from utils.latex_sandbox_utils import LatexCompileError, LatexUnavailableError
+from utils.model_router import get_model_router
+from utils.cache_utils import get_result_cache
+from utils.prompt_utils import compaction_totals, strip_jd_boilerplate
+from utils.relevance_utils import match_score
+from utils.slot_utils import parse_slots
+from utils.text_utils import strip_latex
+from utils.page_fit_utils import page_fit_totals
+from utils.template_utils import get_template_registry, prewarm_template, template_summary
+from utils.job_utils import JobStore, JobScheduler, job_status
+from utils.metrics_utils import (
+    Collector,
+    http_request_seconds,
+    render_metrics,
+    server_timing_header,
+    start_stage_timings,
+)
+import time
+
+# Jobs admitted at once (LLM wait + compile); beyond this the API answers 429.
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "32"))
+# Threads for blocking work (PDF text extraction, pdflatex subprocesses).
+COMPILE_WORKERS = int(os.getenv("COMPILE_WORKERS", str(os.cpu_count() or 2)))
+
+# Largest number of job descriptions accepted by /tailor_resume/batch.
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "200"))
+
+# Upload limits, in bytes: per resume PDF, per LaTeX template / JD file, and per request body.
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_TEMPLATE_BYTES = int(os.getenv("MAX_TEMPLATE_BYTES", str(512 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(32 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Warm up in the background after startup (see warm_up below); the port opens without waiting for it.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1").lower() not in ("0", "false", "off")
+# Heavy modules the pipeline imports on first use rather than at startup.
+WARMUP_MODULES = ("fitz", "numpy", "httpx", "requests", "tenacity")
+
+class CountingThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that counts tasks still waiting for a thread (the compile_queue_depth gauge)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.queued = 0
+        self._queued_lock = threading.Lock()
+
+    def _count(self, delta: int):
+        with self._queued_lock:
+            self.queued += delta
+
+    def submit(self, fn, /, *args, **kwargs):
+        def run():
+            self._count(-1)
+            return fn(*args, **kwargs)
+
+        self._count(1)
+        try:
+            return super().submit(run)
+        except BaseException:
+            self._count(-1)
+            raise
+
+
+compile_executor = CountingThreadPoolExecutor(max_workers=COMPILE_WORKERS, thread_name_prefix="compile")
+# Batch compiles are CPU-bound and numerous, so they get their own process pool. Each worker
+# runs one pdflatex at a time, outside this process's compile_slots (utils/latex_sandbox_utils.py).
+_batch_compile_executor = None
+_batch_compile_executor_lock = threading.Lock()
+
+
+def get_batch_compile_executor() -> ProcessPoolExecutor:
+    """
+    The batch compile pool, started on first use. Its workers are spawned, not
+    forked: a fork would copy locks other threads hold and the warm pdflatex pool.
+    """
+    global _batch_compile_executor
+    with _batch_compile_executor_lock:
+        if _batch_compile_executor is None:
+            _batch_compile_executor = ProcessPoolExecutor(max_workers=COMPILE_WORKERS,
+                                                          mp_context=multiprocessing.get_context("spawn"))
+        return _batch_compile_executor
+
+
+job_slots = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+# Requests holding a job slot (only changed on the event loop, so no lock).
+jobs_in_flight = 0
+
+
+@asynccontextmanager
+async def job_slot():
+    """Hold one of the job_slots for the duration of a request, counted in jobs_in_flight."""
+    global jobs_in_flight
+    async with job_slots:
+        jobs_in_flight += 1
+        try:
+            yield
+        finally:
+            jobs_in_flight -= 1
+
+job_store = JobStore()
+job_scheduler = JobScheduler(job_store, run_tailoring)
+
+warmup_state = {"done": False, "seconds": None, "pdflatex": None}
 
 app = FastAPI(title="Resume Tailoring API")
 
@@ -16,51 +145,647 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/jobs/{job_id}), not the raw path, to keep cardinality bounded.
+    route = request.scope.get("route")
+    http_request_seconds.observe(time.perf_counter() - started, method=request.method,
+                                 path=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
+
+@app.middleware("http")
+async def identify_client(request, call_next):
+    # LLM calls made for this request are rate-limited per peer address and fair-queued per client
+    # (utils/llm_scheduler.py). X-Client-Id only labels the queue: anyone can rotate it, so it never
+    # picks the rate-limit bucket. Behind a reverse proxy, set FORWARDED_ALLOW_IPS for uvicorn so the
+    # peer address is the real client's, not the proxy's.
+    address = request.client.host if request.client else None
+    label = request.headers.get("x-client-id")
+    start_llm_request(f"{address}/{label[:64]}" if label else address, rate_key=address)
+    return await call_next(request)
+
+
+class LimitRequestBody:
+    """
+    ASGI middleware capping request bodies at MAX_REQUEST_BYTES. Counts the
+    bytes as they are received, so chunked uploads without a Content-Length
+    are cut off too, before the multipart parser has buffered or spooled them.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(send)
+
+        received = 0
+        too_large = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # The app sees the client go away and stops reading; it never gets the rest.
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Whatever the app answers to a cut-off body is replaced by the 413 below.
+            if not too_large:
+                started = started or message["type"] == "http.response.start"
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        response = JSONResponse({"error": f"Request body is larger than {self.max_bytes} bytes"}, status_code=413)
+        await response({"type": "http"}, None, send)
+
+
+app.add_middleware(LimitRequestBody)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """
+    Read an upload in chunks, raising UploadTooLarge as soon as it passes
+    `limit` bytes. This is a per-file limit on an already parsed part; the
+    request body as a whole is capped while it arrives, by LimitRequestBody.
+    """
+    if upload.size is not None and upload.size > limit:
+        raise UploadTooLarge(f"'{upload.filename}' is larger than {limit} bytes")
+    chunks, size = [], 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise UploadTooLarge(f"'{upload.filename}' is larger than {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def read_template_input(latex_template: Optional[UploadFile], template_id: Optional[str]):
+    """
+    (template bytes, None) for an uploaded template, or (None, registry entry)
+    for a template_id. Raises LookupError for an unknown id and ValueError if
+    neither was given or the upload is not UTF-8 text.
+    """
+    if template_id:
+        template = get_template_registry().get(template_id)
+        if template is None:
+            raise LookupError(f"Unknown template '{template_id}'")
+        return None, template
+    if latex_template is None:
+        raise ValueError("Provide latex_template or template_id")
+    template_bytes = await read_upload(latex_template, MAX_TEMPLATE_BYTES)
+    try:
+        template_bytes.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("latex_template must be UTF-8 text")
+    return template_bytes, None
+
+
+def input_error_response(e: Exception) -> JSONResponse:
+    """Status for a rejected upload: 413 too large, 404 unknown template, 400 otherwise."""
+    status_code = 413 if isinstance(e, UploadTooLarge) else 404 if isinstance(e, LookupError) else 400
+    return JSONResponse({"error": str(e)}, status_code=status_code)
+
+
+def rate_limited_response(e: RateLimitedError) -> JSONResponse:
+    return JSONResponse({"error": str(e)}, status_code=429,
+                        headers={"Retry-After": str(max(1, int(e.retry_after + 0.999)))})
+
+
+def _collect_app_metrics():
+    cache = get_result_cache().stats()
+    prompt = compaction_totals()
+    page_fit = page_fit_totals()
+    yield "result_cache_hits_total", "counter", "Result cache hits.", [({}, cache["hits"])]
+    yield "result_cache_misses_total", "counter", "Result cache misses.", [({}, cache["misses"])]
+    yield "result_cache_hit_ratio", "gauge", "Result cache hit ratio.", [({}, cache["hit_rate"])]
+    yield "prompt_tokens_saved_total", "counter", "Estimated prompt tokens removed by compaction.", \
+        [({}, prompt["tokens_saved"])]
+    yield "page_fit_iterations_total", "counter", "Probe compiles spent fitting resumes to the page limit.", \
+        [({}, page_fit["iterations"])]
+    yield "page_fit_overflowing_total", "counter", "Resumes that compiled past the page limit.", \
+        [({}, page_fit["overflowing"])]
+    yield "jobs_in_flight", "gauge", "Requests holding a job slot.", \
+        [({}, jobs_in_flight)]
+    yield "compile_queue_depth", "gauge", "Blocking tasks waiting for a compile thread.", \
+        [({}, compile_executor.queued)]
+    yield "background_jobs_active", "gauge", "Queued or running /jobs entries.", [({}, job_store.count_active())]
+
+    scheduler = get_llm_scheduler().stats()
+    yield "llm_scheduler_queued", "gauge", "LLM calls waiting for their API key's fair queue.", \
+        [({"key": key}, state["queued"]) for key, state in scheduler["keys"].items()]
+    yield "llm_scheduler_inflight", "gauge", "LLM calls holding an API key slot.", \
+        [({"key": key}, state["inflight"]) for key, state in scheduler["keys"].items()]
+    yield "llm_rate_limited_total", "counter", "Requests refused because their client was over its rate limit.", \
+        [({}, scheduler["rate_limited"])]
+    yield "llm_queue_timeouts_total", "counter", "LLM calls that gave up waiting in the fair queue.", \
+        [({}, scheduler["queue_timeouts"])]
+    yield "llm_coalesced_total", "counter", "LLM calls answered by an identical in-flight call.", \
+        [({}, scheduler["coalesced"])]
+
+    latency, outcomes, circuits = [], [], []
+    for model, histogram in get_model_router().stats().items():
+        circuits.append(({"model": model}, 0 if histogram["circuit"] == "closed" else 1))
+        cumulative = 0
+        for bound, count in histogram["buckets"].items():
+            cumulative += count
+            le = bound if bound == "+Inf" else repr(float(bound))
+            latency.append(("_bucket", {"model": model, "le": le}, cumulative))
+        latency.append(("_sum", {"model": model}, histogram["sum"]))
+        latency.append(("_count", {"model": model}, histogram["count"]))
+        outcomes.extend(({"model": model, "outcome": outcome}, count)
+                        for outcome, count in histogram["outcomes"].items())
+    yield "llm_request_seconds", "histogram", "LLM call latency by model.", latency
+    yield "llm_requests_total", "counter", "LLM calls by model and outcome.", outcomes
+    yield "llm_circuit_open", "gauge", "1 while a model's circuit breaker is open or half-open.", circuits
+
+
+Collector(_collect_app_metrics)
+
+
+@app.on_event("startup")
+def resume_jobs():
+    resumed = job_scheduler.resume_unfinished()
+    if resumed:
+        print(f"🔁 Re-queued {resumed} unfinished job(s)")
+
+
+def _warm_up_blocking():
+    started = time.perf_counter()
+    for module in WARMUP_MODULES:
+        importlib.import_module(module)
+    get_session()
+    warmup_state["pdflatex"] = pdflatex_version()
+    if warmup_state["pdflatex"] is None:
+        print("⚠️ pdflatex is not available; every compile will fail")
+    return time.perf_counter() - started
+
+
+async def _warm_up():
+    try:
+        seconds = await asyncio.get_running_loop().run_in_executor(compile_executor, _warm_up_blocking)
+        get_async_client()  # bound to this loop, so created here rather than in the thread
+    except Exception as e:
+        print(f"⚠️ Warm-up failed: {e}")
+        return
+    warmup_state.update(done=True, seconds=round(seconds, 3))
+    print(f"✅ Warmed up in {seconds:.2f}s ({warmup_state['pdflatex'] or 'no pdflatex'})")
+
+
+@app.on_event("startup")
+async def warm_up():
+    # Preload PyMuPDF/NumPy, open the HTTP pools and check pdflatex, so the first request does not pay for it.
+    if STARTUP_WARMUP:
+        app.state.warmup_task = asyncio.create_task(_warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown_executor():
+    await close_async_client()
+    compile_executor.shutdown(wait=False, cancel_futures=True)
+    if _batch_compile_executor is not None:
+        _batch_compile_executor.shutdown(wait=False, cancel_futures=True)
+    job_scheduler.shutdown()
+
+
 @app.post("/tailor_resume")
 async def tailor_resume(
     resume_pdf: UploadFile,
-    latex_template: UploadFile,
+    latex_template: UploadFile = File(None),
+    template_id: str = Form(None),
     jd_text: str = Form(...),
     api_key: str = Form(None),
-    keep_files: str = Form("false")
+    keep_files: str = Form("false"),
+    engine: str = Form("full"),
+    timings: str = Form("false")
 ):
     keep_files_bool = keep_files.lower() == "true"
+    # Per-stage durations, returned in a Server-Timing header when asked for.
+    stage_timings = start_stage_timings()
 
-    try:
-        with TemporaryDirectory() as temp_dir:
-            # Save uploaded files
-            resume_path = os.path.join(temp_dir, "resume.pdf")
-            latex_path = os.path.join(temp_dir, "template.tex")
-            output_tex_path = os.path.join(temp_dir, "tailored.tex")
-            output_pdf_path = os.path.join(temp_dir, "tailored.pdf")
-
-            with open(resume_path, "wb") as f:
-                f.write(await resume_pdf.read())
-
-            with open(latex_path, "wb") as f:
-                f.write(await latex_template.read())
-
-            # Save JD text
-            jd_path = os.path.join(temp_dir, "jd.txt")
-            with open(jd_path, "w", encoding="utf-8") as f:
-                f.write(jd_text)
-
-            # Run the pipeline
-            final_pdf = resume_tailoring_pipeline(
-                pdf_path=resume_path,
-                latex_path=latex_path,
-                jd_path=jd_path,
+    if engine not in TAILORING_ENGINES:
+        return JSONResponse({"error": f"engine must be one of {list(TAILORING_ENGINES)}"}, status_code=400)
+
+    if job_slots.locked():
+        return JSONResponse(
+            {"error": "Server is busy, please retry shortly"},
+            status_code=429,
+            headers={"Retry-After": "10"},
+        )
+
+    async with job_slot():
+        try:
+            resume_bytes = await read_upload(resume_pdf, MAX_UPLOAD_BYTES)
+            template_bytes, template = await read_template_input(latex_template, template_id)
+        except (UploadTooLarge, LookupError, ValueError) as e:
+            return input_error_response(e)
+
+        try:
+            get_llm_scheduler().admit()
+        except RateLimitedError as e:
+            return rate_limited_response(e)
+
+        try:
+            # Run the pipeline on the uploads in memory; only pdflatex uses its scratch dir
+            final_pdf, final_latex = await run_tailoring_async(
+                resume_pdf=resume_bytes,
+                latex_template=template_bytes,
+                jd_text=jd_text,
                 api_key=api_key,
-                saving_path=output_tex_path,
-                output_latex_path=output_tex_path
+                executor=compile_executor,
+                engine=engine,
+                template=template
             )
 
-            if final_pdf and os.path.exists(final_pdf):
-                return FileResponse(final_pdf, media_type="application/pdf", filename="tailored_resume.pdf")
+            if keep_files_bool:
+                _keep_artifacts(final_latex, final_pdf)
+
+            if final_pdf:
+                headers = {"Content-Disposition": 'attachment; filename="tailored_resume.pdf"'}
+                if timings.lower() == "true":
+                    headers["Server-Timing"] = server_timing_header(stage_timings)
+                return Response(final_pdf, media_type="application/pdf", headers=headers)
             else:
                 return JSONResponse({"error": "Tailoring failed"}, status_code=500)
 
-    except Exception as e:
-        return JSONResponse({"error": str(e)}, status_code=500)
+        except LatexCompileError as e:
+            return JSONResponse({"error": f"Model produced LaTeX that would not compile: {e}",
+                                 "compile_error": e.error}, status_code=422)
+        except LatexValidationError as e:
+            return JSONResponse({"error": f"Model produced LaTeX that would not compile: {e}"}, status_code=422)
+        except LatexUnavailableError as e:
+            return JSONResponse({"error": str(e)}, status_code=503)
+        except RateLimitedError as e:
+            return rate_limited_response(e)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+
+def _keep_artifacts(latex: str, pdf: bytes):
+    """Debugging aid for keep_files=true: write the tailored .tex/.pdf to a fresh temp dir."""
+    kept_dir = tempfile.mkdtemp(prefix="tailored_")
+    save_latex_code(latex, os.path.join(kept_dir, "tailored.tex"))
+    if pdf:
+        with open(os.path.join(kept_dir, "tailored.pdf"), "wb") as f:
+            f.write(pdf)
+    print(f"📄 Kept tailored files in '{kept_dir}'")
+
+
+@app.post("/tailor_resume/stream")
+async def tailor_resume_stream(
+    resume_pdf: UploadFile,
+    latex_template: UploadFile = File(None),
+    template_id: str = Form(None),
+    jd_text: str = Form(...),
+    api_key: str = Form(None)
+):
+    """Same inputs as /tailor_resume, answered as a text/event-stream of stage/progress/done events."""
+    if job_slots.locked():
+        return JSONResponse(
+            {"error": "Server is busy, please retry shortly"},
+            status_code=429,
+            headers={"Retry-After": "10"},
+        )
+
+    try:
+        resume_bytes = await read_upload(resume_pdf, MAX_UPLOAD_BYTES)
+        template_bytes, template = await read_template_input(latex_template, template_id)
+    except (UploadTooLarge, LookupError, ValueError) as e:
+        return input_error_response(e)
+
+    try:
+        get_llm_scheduler().admit()
+    except RateLimitedError as e:
+        return rate_limited_response(e)
+
+    async def event_stream():
+        async with job_slot():
+            try:
+                async for event, data in stream_tailoring_events(
+                    resume_pdf=resume_bytes,
+                    latex_template=template_bytes if template is None else template["latex"],
+                    jd_text=jd_text,
+                    api_key=api_key,
+                    executor=compile_executor
+                ):
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/tailor_resume/batch")
+async def tailor_resume_batch(
+    resume_pdf: UploadFile,
+    latex_template: UploadFile = File(None),
+    template_id: str = Form(None),
+    jd_files: List[UploadFile] = File(None),
+    jd_texts: str = Form(None),
+    api_key: str = Form(None),
+    engine: str = Form("full"),
+    output_format: str = Form("ndjson")
+):
+    """
+    Tailor one resume against many JDs, given as uploaded .txt files and/or a
+    JSON list of strings in `jd_texts`. With output_format=ndjson, one JSON line
+    (PDF base64-encoded) is streamed per JD as it finishes; with zip, a zip of
+    the PDFs plus manifest.ndjson is returned once all are done.
+    """
+    if engine not in TAILORING_ENGINES:
+        return JSONResponse({"error": f"engine must be one of {list(TAILORING_ENGINES)}"}, status_code=400)
+    if output_format not in ("ndjson", "zip"):
+        return JSONResponse({"error": "output_format must be 'ndjson' or 'zip'"}, status_code=400)
+
+    jds = []
+    try:
+        for index, upload in enumerate(jd_files or []):
+            jd_bytes = await read_upload(upload, MAX_TEMPLATE_BYTES)
+            jds.append((safe_name(upload.filename, f"jd_{index}"), jd_bytes.decode("utf-8")))
+        resume_bytes = await read_upload(resume_pdf, MAX_UPLOAD_BYTES)
+        template_bytes, template = await read_template_input(latex_template, template_id)
+        latex_code = template["latex"] if template is not None else template_bytes.decode("utf-8")
+    except (UploadTooLarge, LookupError, ValueError) as e:
+        return input_error_response(e)
+    if jd_texts:
+        try:
+            texts = json.loads(jd_texts)
+        except json.JSONDecodeError:
+            texts = None
+        if not isinstance(texts, list) or not all(isinstance(text, str) and text.strip() for text in texts):
+            return JSONResponse({"error": "jd_texts must be a JSON list of non-empty strings"}, status_code=400)
+        jds.extend((f"jd_{i}", text) for i, text in enumerate(texts, start=len(jds)))
+    if not jds:
+        return JSONResponse({"error": "Provide jd_files or jd_texts"}, status_code=400)
+    if len(jds) > MAX_BATCH_SIZE:
+        return JSONResponse({"error": f"At most {MAX_BATCH_SIZE} job descriptions per batch"}, status_code=400)
+
+    if job_slots.locked():
+        return JSONResponse(
+            {"error": "Server is busy, please retry shortly"},
+            status_code=429,
+            headers={"Retry-After": "10"},
+        )
+
+    try:
+        get_llm_scheduler().admit()
+    except RateLimitedError as e:
+        return rate_limited_response(e)
+    # A batch is charged as one request and its calls wait their turn in the fair queue, however long.
+    start_llm_request(current_client(), queue_timeout=None)["admitted"] = True
+
+    # Extract the resume once for the whole batch.
+    resume_text = await asyncio.get_running_loop().run_in_executor(
+        compile_executor, lambda: read_pdf(data=resume_bytes)
+    )
+    api_key = api_key or os.getenv("api_key")
+
+    async def tailor(resume_text, jd_text, latex_code, api_key):
+        return await tailor_latex_async(resume_text, jd_text, latex_code, api_key, engine, template)
+
+    def results():
+        return tailor_batch(resume_text, latex_code, jds, api_key, tailor, compile_executor=get_batch_compile_executor())
+
+    def manifest_entry(result):
+        return {"index": result["index"], "name": result["name"], "status": result["status"], "error": result["error"],
+                "compile_error": result["compile_error"], "page_fit": result["page_fit"]}
+
+    if output_format == "zip":
+        async with job_slot():
+            buffer = io.BytesIO()
+            manifest = []
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                async for result in results():
+                    entry = manifest_entry(result)
+                    if result["pdf"]:
+                        entry["pdf"] = f"{result['index']:03d}_{result['name']}.pdf"
+                        archive.writestr(entry["pdf"], result["pdf"])
+                    manifest.append(json.dumps(entry))
+                archive.writestr("manifest.ndjson", "\n".join(manifest) + "\n")
+        return Response(buffer.getvalue(), media_type="application/zip",
+                        headers={"Content-Disposition": 'attachment; filename="tailored_resumes.zip"'})
+
+    async def ndjson_stream():
+        async with job_slot():
+            async for result in results():
+                entry = manifest_entry(result)
+                entry["latex"] = result["latex"]
+                entry["pdf_base64"] = base64.b64encode(result["pdf"]).decode("ascii") if result["pdf"] else None
+                yield json.dumps(entry) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/match_score")
+async def resume_match_score(
+    jd_text: str = Form(...),
+    resume_pdf: UploadFile = File(None),
+    resume_text: str = Form(None),
+    latex_template: UploadFile = File(None),
+    template_id: str = Form(None)
+):
+    """
+    Score a resume (PDF or plain text) against a JD locally, without any LLM
+    call. With a template (upload or template_id), its bullets and skills are
+    ranked instead of the resume's lines.
+    """
+    try:
+        if resume_pdf is not None:
+            resume_bytes = await read_upload(resume_pdf, MAX_UPLOAD_BYTES)
+            resume_text = await asyncio.get_running_loop().run_in_executor(
+                compile_executor, lambda: read_pdf(data=resume_bytes)
+            )
+        if not resume_text:
+            raise ValueError("Provide resume_pdf or resume_text")
+        items = None
+        if latex_template is not None or template_id:
+            template_bytes, template = await read_template_input(latex_template, template_id)
+            slots = template["slots"] if template is not None else parse_slots(template_bytes.decode("utf-8"))
+            items = [" ".join(strip_latex(slot["text"]).split()) for slot in slots]
+    except (UploadTooLarge, LookupError, ValueError) as e:
+        return input_error_response(e)
+
+    return match_score(resume_text, strip_jd_boilerplate(jd_text), items)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return get_result_cache().stats()
+
+
+@app.get("/prompt/stats")
+async def prompt_stats():
+    return compaction_totals()
+
+
+@app.get("/page_fit/stats")
+async def page_fit_stats():
+    return page_fit_totals()
+
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return get_llm_scheduler().stats()
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    resume_pdf: UploadFile,
+    latex_template: UploadFile = File(None),
+    template_id: str = Form(None),
+    jd_text: str = Form(...),
+    api_key: str = Form(None)
+):
+    if job_store.count_active() >= MAX_CONCURRENT_JOBS:
+        return JSONResponse(
+            {"error": "Too many queued jobs, please retry shortly"},
+            status_code=429,
+            headers={"Retry-After": "10"},
+        )
+
+    try:
+        resume_bytes = await read_upload(resume_pdf, MAX_UPLOAD_BYTES)
+        template_bytes, template = await read_template_input(latex_template, template_id)
+    except (UploadTooLarge, LookupError, ValueError) as e:
+        return input_error_response(e)
+
+    try:
+        get_llm_scheduler().admit()
+    except RateLimitedError as e:
+        return rate_limited_response(e)
+
+    job_id = job_store.create(
+        resume_pdf=resume_bytes,
+        latex_template=template_bytes,
+        jd_text=jd_text,
+        api_key=api_key,
+        template_id=template["id"] if template is not None else None,
+        client=current_client(),
+    )
+    job_scheduler.submit(job_id)
+    return job_status(job_store.get(job_id))
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    return job_status(job)
+
+
+@app.get("/jobs/{job_id}/pdf")
+async def get_job_pdf(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    if job["status"] != "succeeded":
+        return JSONResponse({"error": f"Job is {job['status']}"}, status_code=409)
+    return FileResponse(job["pdf_path"], media_type="application/pdf", filename="tailored_resume.pdf")
+
+
+@app.get("/jobs/{job_id}/latex")
+async def get_job_latex(job_id: str):
+    job = job_store.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found"}, status_code=404)
+    if not job["latex_path"] or not os.path.exists(job["latex_path"]):
+        return JSONResponse({"error": f"Job is {job['status']}"}, status_code=409)
+    with open(job["latex_path"], "r", encoding="utf-8") as f:
+        return PlainTextResponse(f.read(), media_type="text/x-tex")
+
+
+@app.post("/templates", status_code=201)
+async def register_template(latex_template: UploadFile, name: str = Form(None)):
+    """Store a template once; pass the returned template_id instead of uploading it again."""
+    try:
+        latex = (await read_upload(latex_template, MAX_TEMPLATE_BYTES)).decode("utf-8")
+        template = get_template_registry().register(latex, name or latex_template.filename)
+    except (UploadTooLarge, ValueError) as e:
+        return input_error_response(e)
+
+    # Dump the preamble format and seed the compile work dir before the first request needs them.
+    # prewarm_template never raises; whether the template compiled shows in GET /templates/{id}.
+    asyncio.get_running_loop().run_in_executor(compile_executor, prewarm_template, template)
+    return template_summary(template)
+
+
+@app.get("/templates")
+async def list_templates():
+    return [template_summary(template) for template in get_template_registry().list()]
+
+
+@app.get("/templates/{template_id}")
+async def get_template(template_id: str):
+    template = get_template_registry().get(template_id)
+    if template is None:
+        return JSONResponse({"error": "Template not found"}, status_code=404)
+    return template_summary(template)
+
+
+@app.get("/templates/{template_id}/latex")
+async def get_template_latex(template_id: str):
+    template = get_template_registry().get(template_id)
+    if template is None:
+        return JSONResponse({"error": "Template not found"}, status_code=404)
+    return PlainTextResponse(template["latex"], media_type="text/x-tex")
+
+
+@app.delete("/templates/{template_id}")
+async def delete_template(template_id: str):
+    if not get_template_registry().delete(template_id):
+        return JSONResponse({"error": "Template not found"}, status_code=404)
+    return {"template_id": template_id, "deleted": True}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "warm": warmup_state["done"], "warmup_seconds": warmup_state["seconds"],
+            "pdflatex": warmup_state["pdflatex"]}
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of latency histograms, token counts, cache and queue gauges."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/models/stats")
+async def model_stats():
+    router = get_model_router()
+    return {"models": [name for name, _ in router.models], "hedge": router.hedge, "latency": router.stats()}
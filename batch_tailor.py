@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+# Before the imports below, which read their configuration from the environment.
+load_dotenv()
+
+from tailor_resume import tailor_latex_async, TAILORING_ENGINES
+from utils.batch_utils import tailor_batch, safe_name, BATCH_CONCURRENCY, BATCH_RATE_LIMIT
+from utils.pdf_and_latex_utils import read_pdf
+
+
+def load_jds(paths):
+    """Collect (name, text) pairs from JD files and/or directories of .txt files."""
+    jds = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".txt"))
+        else:
+            files = [path]
+        for file_path in files:
+            with open(file_path, "r", encoding="utf-8") as f:
+                jds.append((safe_name(file_path, f"jd_{len(jds)}"), f.read()))
+    return jds
+
+
+async def run_batch(args):
+    resume_text = read_pdf(pdf_path=args.resume)
+    with open(args.template, "r", encoding="utf-8") as f:
+        latex_code = f.read()
+    jds = load_jds(args.jds)
+    api_key = args.api_key or os.getenv("api_key")
+
+    async def tailor(resume_text, jd_text, latex_code, api_key):
+        return await tailor_latex_async(resume_text, jd_text, latex_code, api_key, args.engine)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest_path = os.path.join(args.out, "manifest.ndjson")
+    archive = zipfile.ZipFile(args.zip, "w", zipfile.ZIP_DEFLATED) if args.zip else None
+    succeeded = 0
+
+    print(f"📄 Tailoring {len(jds)} job description(s)...")
+    with ProcessPoolExecutor(max_workers=args.workers) as compile_pool, open(manifest_path, "w", encoding="utf-8") as manifest:
+        async for result in tailor_batch(resume_text, latex_code, jds, api_key, tailor,
+                                         compile_executor=compile_pool, concurrency=args.concurrency,
+                                         rate_limit=args.rate):
+            name = f"{result['index']:03d}_{result['name']}"
+            entry = {"index": result["index"], "name": result["name"], "status": result["status"],
+                     "error": result["error"], "compile_error": result["compile_error"], "page_fit": result["page_fit"]}
+            if result["latex"]:
+                entry["latex"] = f"{name}.tex"
+                with open(os.path.join(args.out, entry["latex"]), "w", encoding="utf-8") as f:
+                    f.write(result["latex"])
+            if result["pdf"]:
+                entry["pdf"] = f"{name}.pdf"
+                with open(os.path.join(args.out, entry["pdf"]), "wb") as f:
+                    f.write(result["pdf"])
+                if archive:
+                    archive.writestr(entry["pdf"], result["pdf"])
+                succeeded += 1
+            manifest.write(json.dumps(entry) + "\n")
+            manifest.flush()
+            print(("✅" if result["status"] == "succeeded" else "❌") + f" {name}" +
+                  (f": {result['error']}" if result["error"] else ""))
+
+    if archive:
+        archive.write(manifest_path, "manifest.ndjson")
+        archive.close()
+    print(f"✅ Batch completed: {succeeded}/{len(jds)} succeeded. Results in '{args.out}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tailor one resume against many job descriptions.")
+    parser.add_argument("--resume", required=True, help="Resume PDF")
+    parser.add_argument("--template", required=True, help="LaTeX resume template")
+    parser.add_argument("--jds", required=True, nargs="+", help="JD .txt files or directories of them")
+    parser.add_argument("--out", default="batch_output", help="Output directory")
+    parser.add_argument("--zip", help="Also write the PDFs and manifest to this zip file")
+    parser.add_argument("--api-key", help="OpenRouter API key (defaults to the api_key env var)")
+    parser.add_argument("--engine", default="full", choices=TAILORING_ENGINES)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Max LLM calls in flight")
+    parser.add_argument("--rate", type=float, default=BATCH_RATE_LIMIT, help="Max LLM calls per second (0 = no limit)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="pdflatex worker processes")
+    asyncio.run(run_batch(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
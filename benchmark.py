@@ -0,0 +1,307 @@
+"""
+Offline benchmarks for the tailoring pipeline, run against a local mock of
+the OpenRouter API (utils/mock_openrouter.py) so no network or API key is
+needed. pdflatex must be installed for the compile stage.
+
+    python benchmark.py                      # stages, app load and memory
+    python benchmark.py stages --iterations 50 --latency 1.5
+    python benchmark.py app --requests 64 --concurrency 16 --json bench.json
+    python benchmark.py imports --import-budget 0.8   # exits 1 when over budget
+
+Caches are off by default so every iteration pays for every stage; use
+--warm-cache to measure the cached path instead.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SAMPLES_DIR = os.path.join(ROOT, "resume-s")
+BENCHMARK_API_KEY = "benchmark-key"
+SUITES = ("stages", "app", "memory", "imports")
+# Loaded on first use or by the startup warm-up; `import main` must not pull them in.
+DEFERRED_MODULES = ("fitz", "numpy", "httpx", "requests", "tenacity", "streamlit", "pandas")
+# Largest acceptable p50 cold `import main`, in seconds (also enforced by tests/test_import_budget.py).
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.0"))
+
+
+def percentile(samples: list, q: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "n": len(samples),
+        "mean": sum(samples) / len(samples) if samples else None,
+        "p50": percentile(samples, 0.50),
+        "p95": percentile(samples, 0.95),
+        "p99": percentile(samples, 0.99),
+        "max": max(samples) if samples else None,
+    }
+
+
+def _fmt(seconds) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.1f}ms"
+
+
+def print_table(title: str, rows: dict):
+    print(f"\n📊 {title}")
+    print(f"  {'':<12}{'n':>6}{'mean':>12}{'p50':>12}{'p95':>12}{'p99':>12}{'max':>12}")
+    for name, s in rows.items():
+        print(f"  {name:<12}{s['n']:>6}{_fmt(s['mean']):>12}{_fmt(s['p50']):>12}{_fmt(s['p95']):>12}"
+              f"{_fmt(s['p99']):>12}{_fmt(s['max']):>12}")
+
+
+def _run_once(args, jd_text: str) -> dict:
+    from tailor_resume import run_tailoring
+    from utils.metrics_utils import current_stage_timings
+
+    started = time.perf_counter()
+    pdf_path, _ = run_tailoring(args.resume, args.template, jd_text, api_key=BENCHMARK_API_KEY, engine=args.engine)
+    # run_tailoring starts its own timings in this context.
+    timings = current_stage_timings()
+    timings["total"] = time.perf_counter() - started
+    timings["ok"] = bool(pdf_path)
+    return timings
+
+
+def bench_stages(args, jd_text: str) -> dict:
+    """Per-stage latency percentiles over sequential pipeline runs."""
+    samples, failures = {}, 0
+    for i in range(args.iterations):
+        timings = _run_once(args, jd_text)
+        failures += not timings.pop("ok")
+        for stage, seconds in timings.items():
+            samples.setdefault(stage, []).append(seconds)
+    result = {stage: summarize(values) for stage, values in samples.items()}
+    print_table(f"Stage latency over {args.iterations} run(s), {failures} failed", result)
+    return {"stages": result, "failures": failures}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_app(args, jd_text: str) -> dict:
+    """Requests/sec through the FastAPI app (app/main.py) served by uvicorn."""
+    import httpx
+    import uvicorn
+
+    sys.path.insert(0, os.path.join(ROOT, "app"))
+    from main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    with open(args.resume, "rb") as f:
+        resume_pdf = f.read()
+    with open(args.template, "rb") as f:
+        template = f.read()
+
+    async def load():
+        latencies, statuses = [], {}
+        queue = asyncio.Queue()
+        for i in range(args.requests):
+            queue.put_nowait(i)
+
+        async def worker(client):
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.post(
+                    "/tailor_resume",
+                    files={"resume_pdf": ("resume.pdf", resume_pdf), "latex_template": ("template.tex", template)},
+                    data={"jd_text": jd_text, "api_key": BENCHMARK_API_KEY, "engine": args.engine},
+                )
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            return time.perf_counter() - started, latencies, statuses
+
+    try:
+        elapsed, latencies, statuses = asyncio.run(load())
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    result = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "seconds": elapsed,
+        "requests_per_second": args.requests / elapsed if elapsed else None,
+        "statuses": statuses,
+        "latency": summarize(latencies),
+    }
+    print_table(f"App latency, {args.requests} request(s) at concurrency {args.concurrency}",
+                {"request": result["latency"]})
+    print(f"  throughput: {result['requests_per_second']:.2f} req/s, statuses: {statuses}")
+    return result
+
+
+def _rss_kb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def bench_memory(args, jd_text: str) -> dict:
+    """Python heap growth (tracemalloc) across repeated pipeline runs, after one warm-up run."""
+    _run_once(args, jd_text)
+    gc.collect()
+    tracemalloc.start(10)
+    baseline = tracemalloc.take_snapshot()
+    rss_before = _rss_kb()
+
+    checkpoints = []
+    for i in range(args.iterations):
+        _run_once(args, jd_text)
+        gc.collect()
+        checkpoints.append(tracemalloc.get_traced_memory()[0])
+
+    final = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    top = final.compare_to(baseline, "lineno")[:args.top]
+    growth = checkpoints[-1] - checkpoints[0] if checkpoints else 0
+
+    result = {
+        "iterations": args.iterations,
+        "traced_bytes": checkpoints,
+        "growth_bytes": growth,
+        "growth_per_iteration_bytes": growth / max(1, len(checkpoints) - 1),
+        "max_rss_kb_before": rss_before,
+        "max_rss_kb_after": _rss_kb(),
+        "top_growth": [{"where": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                       for stat in top],
+    }
+    print(f"\n🧠 Memory over {args.iterations} run(s)")
+    print(f"  traced heap: {checkpoints[0] / 1024:.0f}KB -> {checkpoints[-1] / 1024:.0f}KB "
+          f"({result['growth_per_iteration_bytes'] / 1024:+.1f}KB/run)" if checkpoints else "  no runs")
+    print(f"  max RSS: {rss_before}KB -> {result['max_rss_kb_after']}KB")
+    for entry in result["top_growth"]:
+        print(f"  {entry['size_diff'] / 1024:+8.1f}KB {entry['count_diff']:+6d} blocks  {entry['where']}")
+    return result
+
+
+def measure_imports(runs: int):
+    """Time a cold `import main` in `runs` fresh interpreters; returns (seconds per run, deferred modules loaded)."""
+    script = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "import main\n"
+        "seconds = time.perf_counter() - started\n"
+        f"print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {DEFERRED_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    path = [os.path.join(ROOT, "app"), ROOT] + ([os.environ["PYTHONPATH"]] if os.environ.get("PYTHONPATH") else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path))
+
+    samples, loaded = [], set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+        sample = json.loads(output.stdout.strip().splitlines()[-1])
+        samples.append(sample["seconds"])
+        loaded.update(sample["loaded"])
+    return samples, loaded
+
+
+def bench_imports(args, jd_text: str) -> dict:
+    """Cold `import main` (the service's import path) in fresh interpreters, against --import-budget."""
+    samples, loaded = measure_imports(args.import_runs)
+    result = {"import": summarize(samples), "budget": args.import_budget, "eagerly_loaded": sorted(loaded)}
+    result["ok"] = result["import"]["p50"] <= args.import_budget and not loaded
+    print_table(f"Cold 'import main' over {args.import_runs} interpreter(s)", {"import": result["import"]})
+    print(f"  budget: {args.import_budget * 1000:.0f}ms (p50) -> {'✅ within' if result['ok'] else '❌ over'}")
+    if loaded:
+        print(f"  ❌ imported at startup, should be deferred: {', '.join(sorted(loaded))}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tailoring pipeline against a mock OpenRouter.")
+    parser.add_argument("suites", nargs="*", help="Benchmarks to run: stages, app, memory, imports (default: all)")
+    parser.add_argument("--resume", default=os.path.join(SAMPLES_DIR, "sample_resume.pdf"))
+    parser.add_argument("--template", default=os.path.join(SAMPLES_DIR, "sample_resume_latex.tex"))
+    parser.add_argument("--jd", default=os.path.join(SAMPLES_DIR, "jd.txt"))
+    parser.add_argument("--completion", nargs="+", default=[os.path.join(SAMPLES_DIR, "tailored.tex")],
+                        help="Recorded completion(s) the mock replays in turn")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock LLM latency per call, in seconds")
+    parser.add_argument("--engine", default="full", choices=["full", "sections", "slots"])
+    parser.add_argument("--iterations", type=int, default=20, help="Runs for the stage and memory benchmarks")
+    parser.add_argument("--requests", type=int, default=32, help="Requests for the app benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients for the app benchmark")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters for the import benchmark")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_SECONDS,
+                        help="Largest acceptable p50 cold import time of app/main.py, in seconds")
+    parser.add_argument("--top", type=int, default=10, help="Allocation sites to list for the memory benchmark")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the result and PDF caches on")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+    suites = args.suites or list(SUITES)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown benchmark(s) {sorted(unknown)}, expected {list(SUITES)}")
+
+    # Configuration is read at import time, so set it before importing the pipeline.
+    if not args.warm_cache:
+        os.environ["RESULT_CACHE_BACKEND"] = "off"
+        os.environ["LATEX_BUILD_CACHE"] = "0"
+    os.environ.setdefault("JOBS_DIR", tempfile.mkdtemp(prefix="benchmark_jobs_"))
+    os.environ.setdefault("LLM_MODELS", "benchmark/mock-model")
+
+    from utils.mock_openrouter import MockOpenRouter
+
+    completions = []
+    for path in args.completion:
+        with open(path, "r", encoding="utf-8") as f:
+            completions.append(f.read())
+    with open(args.jd, "r", encoding="utf-8") as f:
+        jd_text = f.read()
+
+    results = {"config": {k: v for k, v in vars(args).items() if k != "suites"}, "suites": suites}
+    with MockOpenRouter(completion=completions, latency=args.latency) as mock:
+        os.environ["OPENROUTER_API_URL"] = mock.url
+        print(f"✅ Mock OpenRouter on {mock.url} (latency {args.latency}s, {len(completions)} completion(s))")
+        if "stages" in suites:
+            results["stages"] = bench_stages(args, jd_text)
+        if "app" in suites:
+            results["app"] = bench_app(args, jd_text)
+        if "memory" in suites:
+            results["memory"] = bench_memory(args, jd_text)
+        if "imports" in suites:
+            results["imports"] = bench_imports(args, jd_text)
+        results["llm_calls"] = len(mock.received)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results written to '{args.json}'")
+    if not results.get("imports", {}).get("ok", True):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
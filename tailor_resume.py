@@ -2,7 +2,7 @@
 # from dotenv import load_dotenv
 # load_dotenv()
 # from utils.llm_utils import resume_tailoring_tool
-# from utils.pdf_and_latex_utils import read_pdf, save_latex_code, latex_to_pdf
+# from utils.pdf_and_latex_utils import read_pdf, save_latex_code
 # from typing import Optional
 
 # pdf_path=os.getenv("pdf_path")
@@ -30,12 +30,30 @@
 # final_pdf_path=latex_to_pdf(output_latex_path)
 
 import os
-from dotenv import load_dotenv
-from utils.llm_utils import resume_tailoring_tool
-from utils.pdf_and_latex_utils import read_pdf, save_latex_code, latex_to_pdf
+from utils.llm_utils import (
+    cached_resume_tailoring_tool,
+    async_cached_resume_tailoring_tool,
+    build_tailoring_prompt,
+    stream_chat_completion,
+    async_repair_latex,
+    model_cache_name,
+    DEFAULT_TEMPERATURE,
+)
+from utils.latex_validation_utils import LatexStreamValidator, LatexValidationError
+from utils.latex_sandbox_utils import compile_failure, format_latex_error
+from utils.http_utils import LLMError
+from utils.cache_utils import get_result_cache, make_cache_key
+from utils.section_utils import tailor_sections
+from utils.slot_utils import tailor_slots
+from utils.pdf_and_latex_utils import read_pdf, save_latex_code
+from utils.page_fit_utils import compile_to_page_limit, enforce_page_limit
+from utils.template_utils import get_template_registry
+from utils.metrics_utils import current_stage_timings, format_stage_timings, stage_timer, start_stage_timings
 from typing import Optional
+import asyncio
+import base64
+import contextvars
 
-load_dotenv()
 
 def resume_tailoring_pipeline(
     pdf_path: Optional[str] = None,
@@ -51,7 +69,7 @@ def resume_tailoring_pipeline(
     2. Reads LaTeX resume template and job description.
     3. Uses LLM to tailor resume content (truthful, ATS-friendly).
     4. Saves tailored LaTeX code.
-    5. Compiles LaTeX to PDF.
+    5. Compiles LaTeX to PDF, within the page limit.
 
     Returns:
         final_pdf_path (str): Path to the compiled tailored resume PDF.
@@ -74,8 +92,11 @@ def resume_tailoring_pipeline(
     }.items():
         print(f"{path_label} exists? {os.path.exists(path)}")
 
+    timings = start_stage_timings()
+
     # Step 1: Read plain text from resume PDF
-    resume_text = read_pdf(pdf_path=pdf_path)
+    with stage_timer("extract"):
+        resume_text = read_pdf(pdf_path=pdf_path)
 
     # Step 2: Load LaTeX template and Job Description
     with open(latex_path, "r", encoding="utf-8") as f:
@@ -84,67 +105,279 @@ def resume_tailoring_pipeline(
     with open(jd_path, "r", encoding="utf-8") as f:
         jd = f.read()
 
-    # Step 3: Call the tailoring tool (LLM)
-    updated_latex = resume_tailoring_tool(
-        resume_text=resume_text,
-        jd_text=jd,
-        latex_code=latex_code,
-        api_key=api_key
-    )
+    # Step 3: Call the tailoring tool (LLM), reusing cached results for identical inputs
+    with stage_timer("llm"):
+        updated_latex = cached_resume_tailoring_tool(
+            resume_text=resume_text,
+            jd_text=jd,
+            latex_code=latex_code,
+            api_key=api_key
+        )
 
     # Step 4: Save tailored LaTeX code
     save_latex_code(latex=updated_latex, save_path=saving_path)
 
-    # Step 5: Compile LaTeX to PDF
-    final_pdf_path = latex_to_pdf(output_latex_path)
+    # Step 5: Compile LaTeX to PDF, shrinking it to the page limit if needed
+    with stage_timer("compile"):
+        final_pdf_path, _, page_fit = enforce_page_limit(output_latex_path, jd, api_key)
+    if final_pdf_path is None and page_fit:
+        raise compile_failure(page_fit["compile_error"])
 
+    print(f"⏱️ Stage timings: {format_stage_timings(timings)}")
     print(f"✅ Pipeline completed. Final tailored PDF at: {final_pdf_path}")
     return final_pdf_path
 
 import tempfile
 import shutil
 
-def run_tailoring(resume_pdf_path, latex_template_path, jd_text, api_key=None, keep_files=False):
+def load_resume_text(resume_pdf) -> str:
+    """Resume text from a PDF path or the PDF bytes themselves."""
+    if isinstance(resume_pdf, (bytes, bytearray)):
+        return read_pdf(data=bytes(resume_pdf))
+    return read_pdf(pdf_path=resume_pdf)
+
+
+def load_template_text(latex_template) -> str:
+    """LaTeX template source from an uploaded str or bytes."""
+    if isinstance(latex_template, (bytes, bytearray)):
+        return bytes(latex_template).decode("utf-8")
+    return latex_template
+
+
+# "full" sends the whole template in one call; "sections" tailors each \section concurrently;
+# "slots" only asks for JSON edits to bullet/skills text and applies them locally.
+TAILORING_ENGINES = ("full", "sections", "slots")
+
+
+async def tailor_latex_async(resume_text, jd_text, latex_code, api_key, engine="full", template=None):
+    """
+    Run the selected tailoring engine, going through the result cache.
+    `template` is a registry entry for `latex_code` (utils/template_utils.py),
+    whose pre-parsed sections/slots are used instead of parsing again.
+    """
+    if engine not in TAILORING_ENGINES:
+        raise ValueError(f"Unknown tailoring engine '{engine}', expected one of {TAILORING_ENGINES}")
+
+    if engine == "full":
+        return await async_cached_resume_tailoring_tool(
+            resume_text=resume_text,
+            jd_text=jd_text,
+            latex_code=latex_code,
+            api_key=api_key
+        )
+
+    cache = get_result_cache()
+    key = make_cache_key(resume_text, jd_text, latex_code, f"{model_cache_name()}#{engine}", DEFAULT_TEMPERATURE)
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"♻️ Result cache hit ({key[:12]})")
+        return cached
+
+    parsed = template if template is not None and template["latex"] == latex_code else {}
+    if engine == "slots":
+        updated_latex = await tailor_slots(resume_text, jd_text, latex_code, api_key, slots=parsed.get("slots"))
+    else:
+        updated_latex = await tailor_sections(resume_text, jd_text, latex_code, api_key,
+                                              sections=parsed.get("sections"))
+    updated_latex = await async_repair_latex(updated_latex, latex_code, api_key)
+    cache.set(key, updated_latex)
+    return updated_latex
+
+
+def run_tailoring(resume_pdf_path, latex_template_path, jd_text, api_key=None, keep_files=False,
+                  output_dir=None, progress=None, engine="full", template_id=None):
     """
     Run tailoring pipeline from FastAPI (works with uploaded files).
+    If `output_dir` is given, artifacts are written there and kept; otherwise a
+    temp dir is used and removed unless `keep_files` is set.
+    `progress`, if given, is called with the name of each stage as it starts
+    ("extract", "llm", "compile").
+    With `template_id`, the registered template is used instead of reading
+    `latex_template_path`.
     Returns:
         (pdf_path, latex_code) -> tuple
     """
+    progress = progress or (lambda stage: None)
+    template = None
+    if template_id:
+        template = get_template_registry().get(template_id)
+        if template is None:
+            raise LookupError(f"Unknown template '{template_id}'")
+    # Start afresh: a reused pool thread still holds the previous run's timings.
+    timings = start_stage_timings()
 
     # Step 1: Read plain text from resume PDF
-    resume_text = read_pdf(pdf_path=resume_pdf_path)
+    progress("extract")
+    with stage_timer("extract"):
+        resume_text = read_pdf(pdf_path=resume_pdf_path)
 
     # Step 2: Load LaTeX template
-    with open(latex_template_path, "r", encoding="utf-8") as f:
-        latex_code = f.read()
+    if template is not None:
+        latex_code = template["latex"]
+    else:
+        with open(latex_template_path, "r", encoding="utf-8") as f:
+            latex_code = f.read()
 
     # Step 3: Call LLM to tailor LaTeX
-    updated_latex = resume_tailoring_tool(
-        resume_text=resume_text,
-        jd_text=jd_text,
-        latex_code=latex_code,
-        api_key=api_key
-    )
+    progress("llm")
+    with stage_timer("llm"):
+        if engine == "full":
+            updated_latex = cached_resume_tailoring_tool(
+                resume_text=resume_text,
+                jd_text=jd_text,
+                latex_code=latex_code,
+                api_key=api_key or os.getenv("api_key")
+            )
+        else:
+            updated_latex = asyncio.run(
+                tailor_latex_async(resume_text, jd_text, latex_code, api_key or os.getenv("api_key"), engine,
+                                   template)
+            )
 
     # Step 4: Write tailored LaTeX to temp file
-    temp_dir = tempfile.mkdtemp()
-    tailored_tex_path = os.path.join(temp_dir, "tailored.tex")
-    save_latex_code(updated_latex, tailored_tex_path)
+    temp_dir = output_dir or tempfile.mkdtemp()
+    try:
+        tailored_tex_path = os.path.join(temp_dir, "tailored.tex")
+        save_latex_code(updated_latex, tailored_tex_path)
+
+        # Step 5: Compile to PDF, shrinking it to the page limit if needed
+        progress("compile")
+        with stage_timer("compile"):
+            tailored_pdf_path, updated_latex, page_fit = enforce_page_limit(
+                tailored_tex_path, jd_text, api_key or os.getenv("api_key")
+            )
+        print(f"⏱️ Stage timings: {format_stage_timings(timings)}")
+        if tailored_pdf_path is None and page_fit:
+            raise compile_failure(page_fit["compile_error"])
+    finally:
+        # Clean up temp files unless debugging, whether or not the compile succeeded
+        if not keep_files and output_dir is None:
+            try:
+                shutil.rmtree(temp_dir)
+            except Exception as e:
+                print(f"⚠️ Cleanup failed: {e}")
 
-    # Step 5: Compile to PDF
-    tailored_pdf_path = latex_to_pdf(tailored_tex_path)
+    return tailored_pdf_path, updated_latex
 
-    # Clean up temp files unless debugging
-    if not keep_files:
-        try:
-            shutil.rmtree(temp_dir)
-        except Exception as e:
-            print(f"⚠️ Cleanup failed: {e}")
 
-    return tailored_pdf_path, updated_latex
+async def run_tailoring_async(resume_pdf, latex_template, jd_text, api_key=None, executor=None, engine="full",
+                              template=None):
+    """
+    Non-blocking, in-memory version of run_tailoring for the FastAPI app.
+    `resume_pdf` is a path or the uploaded PDF bytes; `latex_template` is the
+    template source (str or bytes), or None with `template`, a registry entry
+    (utils/template_utils.py). The LLM call runs on the event loop; PDF
+    extraction and pdflatex run in `executor` (a bounded pool owned by the
+    caller) so they never block it. Only pdflatex touches the disk, in its
+    scratch dir.
+    Returns:
+        (pdf_bytes, latex_code) -> tuple
+    """
+    loop = asyncio.get_running_loop()
+    api_key = api_key or os.getenv("api_key")
+    timings = current_stage_timings()
+
+    # Step 1: Read plain text from resume PDF
+    with stage_timer("extract"):
+        resume_text = await loop.run_in_executor(executor, load_resume_text, resume_pdf)
+
+    # Step 2: Decode the LaTeX template
+    latex_code = template["latex"] if template is not None else load_template_text(latex_template)
+
+    # Step 3: Call LLM to tailor LaTeX
+    with stage_timer("llm"):
+        updated_latex = await tailor_latex_async(resume_text, jd_text, latex_code, api_key, engine, template)
+
+    # Step 4: Compile to PDF in the bounded pool, shrinking it to the page limit if needed
+    # (run in a copy of this context so pdflatex passes land in this request's timings)
+    with stage_timer("compile"):
+        tailored_pdf, updated_latex, page_fit = await loop.run_in_executor(
+            executor, contextvars.copy_context().run, compile_to_page_limit, updated_latex, jd_text, api_key
+        )
+    print(f"⏱️ Stage timings: {format_stage_timings(timings)}")
+    if tailored_pdf is None and page_fit:
+        raise compile_failure(page_fit["compile_error"])
+
+    return tailored_pdf, updated_latex
+
+
+# Emit a progress event every this many streamed lines.
+STREAM_PROGRESS_EVERY_LINES = 10
+
+
+async def stream_tailoring_events(resume_pdf, latex_template, jd_text, api_key=None, executor=None):
+    """
+    Streaming version of run_tailoring_async. Yields (event, data) tuples:
+        ("stage", {"stage": ...})           extract / llm / compile
+        ("progress", {"lines": ..., "chars": ...})
+        ("error", {"error": ...})           generation aborted or compile failed
+        ("done", {"latex": ..., "pdf_base64": ..., "page_fit": {...}})
+    The LLM output is validated while it streams, so clearly broken LaTeX
+    aborts the upstream request instead of waiting for the full completion.
+    """
+    loop = asyncio.get_running_loop()
+    api_key = api_key or os.getenv("api_key")
+
+    yield "stage", {"stage": "extract"}
+    with stage_timer("extract"):
+        resume_text = await loop.run_in_executor(executor, load_resume_text, resume_pdf)
+    latex_code = load_template_text(latex_template)
+
+    yield "stage", {"stage": "llm"}
+    cache = get_result_cache()
+    key = make_cache_key(resume_text, jd_text, latex_code, model_cache_name(), DEFAULT_TEMPERATURE)
+    updated_latex = cache.get(key)
+
+    if updated_latex is None:
+        validator = LatexStreamValidator()
+        prompt = build_tailoring_prompt(resume_text, jd_text, latex_code)
+        chars = 0
+        reported_lines = 0
+        stream = stream_chat_completion(prompt, api_key)
+        try:
+            async for delta in stream:
+                chars += len(delta)
+                validator.feed(delta)
+                if chars == len(delta) or len(validator.lines) - reported_lines >= STREAM_PROGRESS_EVERY_LINES:
+                    reported_lines = len(validator.lines)
+                    yield "progress", {"lines": reported_lines, "chars": chars}
+            updated_latex = validator.finish()
+            for warning in validator.warnings:
+                print(f"⚠️ {warning}")
+            updated_latex = await async_repair_latex(updated_latex, latex_code, api_key)
+        except LatexValidationError as e:
+            print(f"❌ Aborted LLM stream: {e}")
+            yield "error", {"error": f"Model produced invalid LaTeX: {e}"}
+            return
+        except LLMError as e:
+            yield "error", {"error": str(e)}
+            return
+        finally:
+            await stream.aclose()
+
+        cache.set(key, updated_latex)
+
+    yield "stage", {"stage": "compile"}
+    with stage_timer("compile"):
+        tailored_pdf, updated_latex, page_fit = await loop.run_in_executor(
+            executor, contextvars.copy_context().run, compile_to_page_limit, updated_latex, jd_text, api_key
+        )
+
+    if not tailored_pdf:
+        compile_error = page_fit["compile_error"] if page_fit else None
+        yield "error", {"error": f"LaTeX compilation failed: {format_latex_error(compile_error)}",
+                        "compile_error": compile_error, "latex": updated_latex}
+        return
+
+    pdf_base64 = base64.b64encode(tailored_pdf).decode("ascii")
+    yield "done", {"latex": updated_latex, "pdf_base64": pdf_base64, "page_fit": page_fit}
 
 
 # Example usage (if you want to call directly from main.py)
 if __name__ == "__main__":
+    # .env is read by entry points only (here, app/main.py, batch_tailor.py), not on import.
+    from dotenv import load_dotenv
+
+    load_dotenv()
     resume_tailoring_pipeline()
 
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The service imports `utils.*` from the repo root and runs from app/ (see the Dockerfile).
+for path in (ROOT, os.path.join(ROOT, "app")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from utils.mock_openrouter import MockOpenRouter  # noqa: E402 (needs the path above)
+
+
+@pytest.fixture
+def mock_openrouter():
+    """A running MockOpenRouter; script replies through `.responses` and `.completion`."""
+    with MockOpenRouter(completion="ok") as server:
+        yield server
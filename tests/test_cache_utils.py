@@ -0,0 +1,66 @@
+"""Result cache keys and the LRU/TTL backends in utils/cache_utils.py."""
+import itertools
+
+import pytest
+
+from utils import cache_utils
+from utils.cache_utils import MemoryCache, SQLiteCache, make_cache_key
+
+TEMPLATE = "\\begin{document}\n\\section{Skills}\nPython, SQL % languages\n\\end{document}\n"
+
+
+def key(resume="Python developer", jd="Backend role", latex=TEMPLATE, model="m", temperature=0.2):
+    return make_cache_key(resume, jd, latex, model, temperature)
+
+
+@pytest.mark.parametrize("changed", [
+    TEMPLATE.replace("\\section{Skills}\n", "\\section{Skills}\n\n"),     # paragraph break
+    TEMPLATE.replace("Python, SQL", "Python,  SQL"),                    # inner spaces
+    TEMPLATE.replace("% languages\n", "% languages "),                  # newline that ends a comment
+])
+def test_template_whitespace_changes_the_key(changed):
+    assert key(latex=changed) != key()
+
+
+def test_line_endings_and_trailing_whitespace_do_not_change_the_key():
+    assert key(latex=TEMPLATE.replace("\n", "  \r\n")) == key()
+
+
+def test_resume_and_jd_whitespace_is_collapsed():
+    assert key(resume="  Python\n\ndeveloper ", jd="Backend\trole") == key()
+
+
+def test_model_and_temperature_are_part_of_the_key():
+    assert key(model="other") != key()
+    assert key(temperature=0.7) != key()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**limits):
+        if request.param == "memory":
+            return MemoryCache(**limits)
+        return SQLiteCache(str(tmp_path / "cache.sqlite3"), **limits)
+    return make
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, monkeypatch):
+    # A clock that always moves, so SQLite's accessed_at order is unambiguous.
+    clock = itertools.count(1000)
+    monkeypatch.setattr(cache_utils.time, "time", lambda: next(clock))
+    cache = make_cache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+
+def test_expired_entries_are_misses(make_cache):
+    cache = make_cache(ttl=-1)
+    cache.set("a", "1")
+
+    assert cache.get("a") is None
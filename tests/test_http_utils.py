@@ -0,0 +1,103 @@
+"""Retries, Retry-After and the circuit breaker in utils/http_utils.py, against the local mock OpenRouter."""
+import time
+
+import pytest
+
+from utils import http_utils
+from utils.http_utils import CircuitBreaker, CircuitOpenError, LLMError, RetryableHTTPError, post_json
+
+PAYLOAD = {"model": "mock/model", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def rate_limited(retry_after: str = "0") -> dict:
+    return {"status": 429, "headers": {"Retry-After": retry_after}, "body": {"error": "rate limited"}}
+
+
+def completion_text(result: dict) -> str:
+    return result["choices"][0]["message"]["content"]
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(http_utils, "HTTP_BACKOFF_MAX_SECONDS", 0.01)
+
+
+def test_429_is_retried_until_success(mock_openrouter):
+    mock_openrouter.responses = [rate_limited(), rate_limited()]
+    breaker = CircuitBreaker()
+
+    result = post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+
+    assert completion_text(result) == "ok"
+    assert len(mock_openrouter.received) == 3
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_retry_after_is_honoured(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(http_utils, "HTTP_BACKOFF_MAX_SECONDS", 5)
+    mock_openrouter.responses = [rate_limited("1")]
+
+    started = time.monotonic()
+    post_json(mock_openrouter.url, {}, PAYLOAD, breaker=CircuitBreaker())
+
+    assert time.monotonic() - started >= 1
+
+
+def test_non_retryable_4xx_fails_at_once(mock_openrouter):
+    mock_openrouter.responses = [{"status": 401, "body": {"error": "bad key"}}]
+    breaker = CircuitBreaker()
+
+    with pytest.raises(LLMError, match="401") as raised:
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+
+    assert not isinstance(raised.value, RetryableHTTPError)
+    assert len(mock_openrouter.received) == 1
+    assert breaker.failures == 0
+
+
+def test_retries_stop_after_max_attempts(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(http_utils, "HTTP_MAX_ATTEMPTS", 3)
+    mock_openrouter.responses = [{"status": 503, "body": "unavailable"}] * 5
+
+    with pytest.raises(RetryableHTTPError, match="503"):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=CircuitBreaker())
+
+    assert len(mock_openrouter.received) == 3
+
+
+def test_breaker_opens_then_lets_one_trial_through(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(http_utils, "HTTP_MAX_ATTEMPTS", 2)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.3)
+    mock_openrouter.responses = [rate_limited(), rate_limited()]
+
+    with pytest.raises(RetryableHTTPError):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+    assert breaker.state == "open"
+
+    # Open: calls fail fast without reaching the API.
+    with pytest.raises(CircuitOpenError):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+    assert len(mock_openrouter.received) == 2
+
+    # Half-open after the reset timeout: a successful trial call closes it again.
+    time.sleep(0.35)
+    assert breaker.state == "half-open"
+    assert completion_text(post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_call_reopens_the_breaker(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(http_utils, "HTTP_MAX_ATTEMPTS", 1)
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.3)
+    mock_openrouter.responses = [rate_limited(), rate_limited()]
+
+    with pytest.raises(RetryableHTTPError):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+    time.sleep(0.35)
+    assert breaker.state == "half-open"
+
+    with pytest.raises(RetryableHTTPError):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        post_json(mock_openrouter.url, {}, PAYLOAD, breaker=breaker)
@@ -0,0 +1,12 @@
+"""Cold start of the service: `import main` stays within budget and leaves heavy modules for later."""
+from benchmark import DEFERRED_MODULES, IMPORT_BUDGET_SECONDS, measure_imports, percentile
+
+IMPORT_RUNS = 3
+
+
+def test_import_main_within_budget_and_defers_heavy_modules():
+    samples, loaded = measure_imports(IMPORT_RUNS)
+
+    assert not loaded, f"imported at startup, should be deferred: {sorted(loaded)} (of {DEFERRED_MODULES})"
+    p50 = percentile(samples, 0.50)
+    assert p50 <= IMPORT_BUDGET_SECONDS, f"cold 'import main' p50 {p50:.3f}s is over {IMPORT_BUDGET_SECONDS}s"
@@ -0,0 +1,99 @@
+"""The page-fit loop in utils/page_fit_utils.py: which shrinking steps run, in what order."""
+import pytest
+
+from utils import page_fit_utils
+from utils.page_fit_utils import fit_to_pages
+
+RESUME = r"""\documentclass{article}
+\begin{document}
+\section{Experience}
+\resumeItemListStart
+  \resumeItem{Built Python REST APIs with FastAPI}
+  \resumeItem{Organized the office chess tournament}
+  \resumeItem{Tuned PostgreSQL queries for Python services}
+  \resumeItem{Planned the team holiday party}
+\resumeItemListEnd
+\section{Projects}
+\resumeItemListStart
+  \resumeItem{Wrote a knitting pattern generator}
+\resumeItemListEnd
+\end{document}
+"""
+JD = "Python backend engineer: REST APIs with FastAPI, PostgreSQL tuning."
+SPACING = ["spacing 1", "spacing 2", "spacing 3"]
+
+
+@pytest.fixture
+def fits_when(monkeypatch):
+    """Make probe compiles report 1 page for documents passing `predicate`, else 2; records what was probed."""
+    probed = []
+
+    def install(predicate):
+        def probe(latex):
+            probed.append(latex)
+            return 1 if predicate(latex) else 2
+        monkeypatch.setattr(page_fit_utils, "_probe_pages", probe)
+        return probed
+    return install
+
+
+def bullets(latex):
+    return latex.count("\\resumeItem{")
+
+
+def test_spacing_is_tried_first_and_stops_once_it_fits(fits_when):
+    fits_when(lambda latex: "\\linespread{0.94}" in latex)
+
+    latex, stats = fit_to_pages(RESUME, JD, max_pages=1, pages=2)
+
+    assert stats["steps"] == SPACING[:2]
+    assert stats["pages"] == 1 and stats["iterations"] == 2
+    assert bullets(latex) == bullets(RESUME)
+
+
+def test_least_relevant_bullets_are_trimmed_after_spacing(fits_when):
+    fits_when(lambda latex: bullets(latex) <= bullets(RESUME) - 2)
+
+    latex, stats = fit_to_pages(RESUME, JD, max_pages=1, pages=2)
+
+    assert stats["steps"] == SPACING + ["trim bullet", "trim bullet"]
+    assert "chess" not in latex and "holiday" not in latex
+    assert "FastAPI" in latex and "PostgreSQL" in latex
+    # The only bullet of its list is never dropped.
+    assert "knitting" in latex
+
+
+def test_llm_shortens_the_most_compressed_candidate_last(fits_when, monkeypatch):
+    probed = fits_when(lambda latex: "Shortened" in latex)
+    prompts = []
+    monkeypatch.setattr(page_fit_utils, "PAGE_FIT_LLM", True)
+    monkeypatch.setattr(page_fit_utils, "chat_completion",
+                        lambda prompt, api_key, validate=None: prompts.append(prompt) or RESUME + "% Shortened")
+    monkeypatch.setattr(page_fit_utils, "repair_latex", lambda latex, original, api_key: latex)
+
+    latex, stats = fit_to_pages(RESUME, JD, api_key="key", max_pages=1, pages=2)
+
+    trims = page_fit_utils.PAGE_FIT_MAX_BULLET_TRIMS
+    assert stats["steps"] == SPACING + ["trim bullet"] * trims + ["llm shorten"]
+    assert stats["llm_calls"] == 1 and stats["pages"] == 1
+    assert latex.endswith("% Shortened")
+    assert probed[-2] in prompts[0]
+
+
+def test_no_llm_call_without_an_api_key(fits_when, monkeypatch):
+    fits_when(lambda latex: False)
+    monkeypatch.setattr(page_fit_utils, "PAGE_FIT_LLM", True)
+
+    latex, stats = fit_to_pages(RESUME, JD, max_pages=1, pages=2)
+
+    assert "llm shorten" not in stats["steps"] and stats["llm_calls"] == 0
+    assert stats["pages"] == 2
+
+
+def test_probe_budget_caps_the_steps(fits_when):
+    fits_when(lambda latex: False)
+
+    latex, stats = fit_to_pages(RESUME, JD, max_pages=1, pages=2, max_iterations=2)
+
+    assert stats["steps"] == SPACING[:2] and stats["iterations"] == 2
+    assert latex == RESUME  # no candidate was shorter, so the original is kept
@@ -0,0 +1,42 @@
+"""JD boilerplate stripping in utils/prompt_utils.py."""
+from utils.prompt_utils import strip_jd_boilerplate
+
+JD = """Senior Backend Engineer
+
+About Acme Corp:
+Acme is a leading provider of widgets.
+
+About You:
+5+ years of Python experience.
+
+About This Role:
+Build REST APIs in FastAPI.
+
+About the position: remote-first team
+
+Responsibilities:
+Own the billing service.
+
+About us:
+We love widgets.
+
+Benefits:
+Dental, vision
+"""
+
+
+def test_role_and_candidate_sections_are_kept():
+    stripped = strip_jd_boilerplate(JD)
+
+    assert "About You:\n5+ years of Python experience." in stripped
+    assert "About This Role:\nBuild REST APIs in FastAPI." in stripped
+    assert "About the position: remote-first team" in stripped
+    assert "Own the billing service." in stripped
+
+
+def test_company_blurbs_and_benefits_are_dropped():
+    stripped = strip_jd_boilerplate(JD)
+
+    assert "widgets" not in stripped
+    assert "About Acme Corp" not in stripped
+    assert "Dental" not in stripped
@@ -0,0 +1,78 @@
+"""Slot extraction and edit application in utils/slot_utils.py, on the bundled sample template."""
+import os
+
+import pytest
+
+from utils.slot_utils import apply_slot_edits, parse_slot_edits, parse_slots
+
+SAMPLE_TEMPLATE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               "resume-s", "sample_resume_latex.tex")
+
+
+@pytest.fixture(scope="module")
+def latex():
+    with open(SAMPLE_TEMPLATE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def slots(latex):
+    return parse_slots(latex)
+
+
+def by_id(slots):
+    return {slot["id"]: slot for slot in slots}
+
+
+def test_slots_cover_items_and_skills_in_document_order(latex, slots):
+    assert [slot["id"] for slot in slots] == [f"s{n}" for n in range(1, len(slots) + 1)]
+    assert [slot["start"] for slot in slots] == sorted(slot["start"] for slot in slots)
+    assert {slot["kind"] for slot in slots} == {"item", "skills"}
+    assert {slot["section"] for slot in slots if slot["kind"] == "skills"} == {"Technical Skills"}
+    assert "Projects" in {slot["section"] for slot in slots if slot["kind"] == "item"}
+
+
+def test_slot_spans_are_body_text_only(latex, slots):
+    body_start = latex.index("\\begin{document}")
+    for slot in slots:
+        assert latex[slot["start"]:slot["end"]] == slot["text"]
+        assert slot["start"] > body_start
+        assert slot["text"].strip() == slot["text"] and slot["text"]
+    skills = [slot["text"] for slot in slots if slot["kind"] == "skills"]
+    assert all("&" not in text and "\\\\" not in text for text in skills)
+
+
+def test_edits_only_change_their_slots(latex, slots):
+    item = next(slot for slot in slots if slot["kind"] == "item")
+    skills = next(slot for slot in slots if slot["kind"] == "skills")
+    edits = [{"id": item["id"], "text": "Built a FastAPI service"}, {"id": skills["id"], "text": "Go, Rust"}]
+
+    tailored = apply_slot_edits(latex, slots, edits)
+
+    expected = (latex[:item["start"]] + "Built a FastAPI service" + latex[item["end"]:skills["start"]]
+                + "Go, Rust" + latex[skills["end"]:])
+    assert tailored == expected
+    assert by_id(parse_slots(tailored))[skills["id"]]["text"] == "Go, Rust"
+
+
+@pytest.mark.parametrize("kind, text", [
+    ("item", "Unbalanced {brace"),
+    ("item", "First paragraph\n\nSecond paragraph"),
+    ("skills", "Go & Rust"),
+    ("skills", "Go \\\\ Rust"),
+])
+def test_unsafe_edits_are_skipped(latex, slots, kind, text):
+    slot = next(slot for slot in slots if slot["kind"] == kind)
+
+    assert apply_slot_edits(latex, slots, [{"id": slot["id"], "text": text}]) == latex
+
+
+def test_unknown_slot_ids_are_ignored(latex, slots):
+    assert apply_slot_edits(latex, slots, [{"id": "s999", "text": "anything"}]) == latex
+
+
+def test_edit_list_is_read_from_a_chatty_reply():
+    reply = 'Here you go:\n```json\n[{"id": "s1", "text": "A"}, {"id": 2, "text": "B"}, "junk"]\n```'
+
+    assert parse_slot_edits(reply) == [{"id": "s1", "text": "A"}]
+    assert parse_slot_edits("no json here") is None
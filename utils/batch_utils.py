@@ -0,0 +1,79 @@
+import asyncio
+import os
+import re
+
+from utils.latex_sandbox_utils import LatexCompileError, compile_failure
+from utils.page_fit_utils import compile_to_page_limit
+from utils.rate_limit_utils import AsyncTokenBucket
+
+# Concurrent LLM calls and their pace (requests per second, 0 = unlimited).
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_RATE_LIMIT = float(os.getenv("BATCH_RATE_LIMIT", "2"))
+
+
+def safe_name(name: str, fallback: str) -> str:
+    """Filesystem/zip friendly name for a job description."""
+    stem = os.path.splitext(os.path.basename(name or ""))[0]
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", stem).strip("._")
+    return stem or fallback
+
+
+async def tailor_batch(resume_text: str, latex_code: str, jds: list, api_key: str, tailor,
+                       compile_executor=None, concurrency: int = BATCH_CONCURRENCY,
+                       rate_limit: float = BATCH_RATE_LIMIT):
+    """
+    Tailor one resume against many job descriptions.
+
+    `jds` is a list of (name, jd_text) pairs and `tailor` an async callable
+    (resume_text, jd_text, latex_code, api_key) -> latex. Resume text and
+    template are passed in already loaded, LLM calls are capped at
+    `concurrency` in flight and paced at `rate_limit` per second, and PDFs are
+    compiled and fitted to the page limit in `compile_executor` (ideally a
+    ProcessPoolExecutor; see utils/page_fit_utils.py).
+
+    Yields one result dict per JD as soon as it finishes, in completion order:
+        {"index", "name", "status": "succeeded" | "failed", "latex", "pdf", "error", "compile_error", "page_fit"}
+    where compile_error is the parsed pdflatex error when compilation failed
+    and page_fit the fitting stats (pages before/after, steps taken).
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = AsyncTokenBucket(rate_limit, burst=concurrency)
+
+    async def run_one(index, name, jd_text):
+        result = {"index": index, "name": name, "status": "failed", "latex": None, "pdf": None, "error": None,
+                  "compile_error": None, "page_fit": None}
+        try:
+            async with semaphore:
+                await limiter.acquire()
+                latex = await tailor(resume_text, jd_text, latex_code, api_key)
+            if not latex:
+                result["error"] = "LLM returned no LaTeX"
+                return result
+            result["latex"] = latex
+            pdf, result["latex"], page_fit = await loop.run_in_executor(
+                compile_executor, compile_to_page_limit, latex, jd_text, api_key
+            )
+            page_fit = dict(page_fit or {})
+            compile_error = page_fit.pop("compile_error", None)
+            result["page_fit"] = page_fit or None
+            if pdf is None:
+                error = compile_failure(compile_error)
+                if not isinstance(error, LatexCompileError):
+                    raise error
+                result["error"] = f"LaTeX compilation failed: {error}"
+                result["compile_error"] = compile_error
+                return result
+            result["pdf"] = pdf
+            result["status"] = "succeeded"
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    tasks = [asyncio.ensure_future(run_one(index, name, jd_text)) for index, (name, jd_text) in enumerate(jds)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so cosmetic differences in uploads hit the same entry."""
+    return " ".join((text or "").split())
+
+
+def normalize_latex(latex: str) -> str:
+    """
+    Normalize only line endings and trailing whitespace: in LaTeX a newline
+    ends a % comment and a blank line is a paragraph break, so collapsing
+    other whitespace could give differently rendering templates one key.
+    """
+    lines = (latex or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def make_cache_key(resume_text: str, jd_text: str, latex_code: str, model: str, temperature: float) -> str:
+    """Content-addressed key for a tailoring request."""
+    parts = [
+        normalize_text(resume_text),
+        normalize_text(jd_text),
+        normalize_latex(latex_code),
+        model,
+        round(float(temperature), 4),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _size_of(value) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(value)
+
+
+class MemoryCache:
+    """In-process LRU cache with TTL and a total size bound."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, time.time() + self.ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk cache with the same LRU + TTL + size semantics as MemoryCache."""
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        while count > self.max_entries or total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (row[0],))
+            count -= 1
+            total -= row[1]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class ResultCache:
+    """Wraps a backend and keeps hit/miss counters."""
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def get(self, key: str):
+        if self.backend is None:
+            return None
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value):
+        if self.backend is not None and value:
+            self.backend.set(key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "entries": len(self.backend) if self.backend is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+def build_cache_from_env(prefix: str, default_backend: str = "memory", default_path: Optional[str] = None) -> ResultCache:
+    """
+    Build a ResultCache configured by environment variables:
+        <prefix>_BACKEND      memory | sqlite | off
+        <prefix>_PATH         sqlite file (sqlite backend only)
+        <prefix>_TTL          seconds
+        <prefix>_MAX_ENTRIES
+        <prefix>_MAX_BYTES
+    """
+    backend_name = os.getenv(f"{prefix}_BACKEND", default_backend).lower()
+    ttl = float(os.getenv(f"{prefix}_TTL", DEFAULT_TTL_SECONDS))
+    max_entries = int(os.getenv(f"{prefix}_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    max_bytes = int(os.getenv(f"{prefix}_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+    if backend_name in ("off", "none", "0", "false"):
+        return ResultCache(None)
+    if backend_name == "sqlite":
+        path = os.getenv(f"{prefix}_PATH") or default_path or os.path.join(
+            tempfile.gettempdir(), "resume_tailor_cache", f"{prefix.lower()}.sqlite3"
+        )
+        return ResultCache(SQLiteCache(path, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl))
+    return ResultCache(MemoryCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl))
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide cache of tailored LaTeX, keyed on make_cache_key()."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = build_cache_from_env("RESULT_CACHE")
+        return _result_cache
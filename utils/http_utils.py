@@ -0,0 +1,247 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING
+
+# httpx, requests and tenacity are imported on first use: together they add
+# ~200ms to a cold start, before any LLM call is made.
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "180"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_MAX_ATTEMPTS = int(os.getenv("HTTP_MAX_ATTEMPTS", "4"))
+HTTP_BACKOFF_MAX_SECONDS = float(os.getenv("HTTP_BACKOFF_MAX_SECONDS", "30"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """The LLM API could not produce a usable completion."""
+
+
+class RetryableHTTPError(LLMError):
+    """Transient upstream failure (429/5xx or transport error) worth retrying."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(LLMError):
+    """The circuit breaker is open; calls fail fast until it resets."""
+
+
+def parse_retry_after(value) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects
+    calls for `reset_timeout` seconds, then lets a single trial call through.
+    """
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_SECONDS, name: str = "LLM API"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                raise CircuitOpenError(f"{self.name} circuit breaker is open; try again shortly")
+            if self.state == "half-open":
+                # Re-arm the timer so only this trial call goes through.
+                self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+# Default breaker for calls not tied to a model; utils.model_router keeps one per model.
+circuit_breaker = CircuitBreaker()
+
+
+def _wait_with_retry_after(retry_state) -> float:
+    from tenacity import wait_random_exponential
+
+    backoff = wait_random_exponential(multiplier=1, max=HTTP_BACKOFF_MAX_SECONDS)(retry_state)
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return min(retry_after, HTTP_BACKOFF_MAX_SECONDS) + backoff * 0.1
+    return backoff
+
+
+def _retry_policy(deadline: float = None) -> dict:
+    """Retry settings; with a `deadline` (time.monotonic()), backoff never sleeps past it."""
+    from tenacity import retry_if_exception_type, stop_after_attempt
+
+    def wait(retry_state):
+        seconds = _wait_with_retry_after(retry_state)
+        return seconds if deadline is None else max(0.0, min(seconds, deadline - time.monotonic()))
+
+    return {
+        "stop": stop_after_attempt(HTTP_MAX_ATTEMPTS),
+        "wait": wait,
+        "retry": retry_if_exception_type(RetryableHTTPError),
+        "reraise": True,
+    }
+
+
+def _check_response(status_code: int, headers, body_text: str, breaker: CircuitBreaker = circuit_breaker):
+    """Classify a non-2xx response into a retryable or fatal LLMError."""
+    if status_code in RETRYABLE_STATUS_CODES:
+        breaker.record_failure()
+        raise RetryableHTTPError(f"LLM API returned {status_code}: {body_text[:500]}",
+                                 retry_after=parse_retry_after(headers.get("Retry-After")))
+    if status_code >= 400:
+        raise LLMError(f"LLM API returned {status_code}: {body_text[:500]}")
+
+
+def _decode_json(response) -> dict:
+    try:
+        return response.json()
+    except ValueError:
+        raise LLMError(f"Could not decode JSON. Raw response: {response.text[:500]}")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    """Process-wide keep-alive session for blocking callers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+# httpx clients are bound to the event loop they were first used on.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> "httpx.AsyncClient":
+    """Keep-alive AsyncClient shared by every coroutine on the running loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        import httpx
+
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def close_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _remaining(deadline: float, timeout: float) -> float:
+    """Read timeout for the next attempt: `timeout`, cut short by the call's deadline."""
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise LLMError("LLM API call ran out of time")
+    return min(timeout, remaining)
+
+
+def post_json(url: str, headers: dict, payload: dict, timeout: float = None,
+              breaker: CircuitBreaker = None, total_timeout: float = None) -> dict:
+    """
+    POST with pooling, timeout, retries with backoff and a circuit breaker
+    (`breaker`, the shared one by default). `timeout` bounds each attempt;
+    `total_timeout` bounds the whole call, retries and backoff included.
+    """
+    import requests
+    from tenacity import Retrying
+
+    timeout = timeout or HTTP_TIMEOUT_SECONDS
+    breaker = breaker or circuit_breaker
+    deadline = time.monotonic() + total_timeout if total_timeout else None
+    for attempt in Retrying(**_retry_policy(deadline)):
+        with attempt:
+            read_timeout = _remaining(deadline, timeout)
+            breaker.before_call()
+            try:
+                response = get_session().post(url, headers=headers, json=payload,
+                                              timeout=(HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout))
+            except requests.RequestException as e:
+                breaker.record_failure()
+                raise RetryableHTTPError(f"LLM API request failed: {e}")
+            _check_response(response.status_code, response.headers, response.text, breaker)
+            breaker.record_success()
+            return _decode_json(response)
+
+
+async def post_json_async(url: str, headers: dict, payload: dict, timeout: float = None,
+                          breaker: CircuitBreaker = None) -> dict:
+    """Async counterpart of post_json using the shared AsyncClient (bound the whole call with wait_for)."""
+    import httpx
+    from tenacity import AsyncRetrying
+
+    timeout = timeout or HTTP_TIMEOUT_SECONDS
+    breaker = breaker or circuit_breaker
+    async for attempt in AsyncRetrying(**_retry_policy()):
+        with attempt:
+            breaker.before_call()
+            try:
+                response = await get_async_client().post(url, headers=headers, json=payload, timeout=timeout)
+            except httpx.HTTPError as e:
+                breaker.record_failure()
+                raise RetryableHTTPError(f"LLM API request failed: {e!r}")
+            _check_response(response.status_code, response.headers, response.text, breaker)
+            breaker.record_success()
+            return _decode_json(response)
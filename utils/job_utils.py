@@ -0,0 +1,225 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from utils.llm_scheduler import start_llm_request
+from utils.metrics_utils import start_stage_timings
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "resume_tailor_jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs (row, inputs and artifacts) are deleted this long after they finish; 0 keeps them.
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", str(24 * 60 * 60)))
+# Expired jobs are swept at most this often, when new jobs are created.
+JOB_SWEEP_INTERVAL_SECONDS = 60
+
+# Pipeline stages in execution order, with the progress reported once each starts.
+JOB_STAGES = {
+    "queued": 0,
+    "extract": 10,
+    "llm": 30,
+    "compile": 80,
+    "done": 100,
+}
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class JobStore:
+    """
+    SQLite-backed job table; each job also owns a directory for its inputs and
+    artifacts. API keys are only held in memory, never written to the table.
+    """
+
+    def __init__(self, root: str = JOBS_DIR, ttl: float = JOB_TTL_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._api_keys = {}
+        self._last_sweep = 0.0
+        self._conn = sqlite3.connect(os.path.join(root, "jobs.sqlite3"), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT, stage TEXT, jd_text TEXT, "
+            "error TEXT, pdf_path TEXT, latex_path TEXT, created_at REAL, updated_at REAL, template_id TEXT, "
+            "client TEXT)"
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column in ("template_id", "client"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+        scrubbed = 0
+        if "api_key" in columns:
+            # Tables from older versions stored keys in plaintext.
+            scrubbed = self._conn.execute("UPDATE jobs SET api_key = NULL WHERE api_key IS NOT NULL").rowcount
+        self._conn.commit()
+        if scrubbed:
+            self._conn.execute("VACUUM")  # so the old values don't linger in free pages
+        self.sweep()
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def create(self, resume_pdf: bytes, latex_template: Optional[bytes], jd_text: str, api_key: Optional[str] = None,
+               template_id: Optional[str] = None, client: Optional[str] = None) -> str:
+        """
+        `latex_template` may be None when the job uses a registered template
+        (`template_id`). `client` is who the job's LLM calls are fair-queued for.
+        `api_key` stays in this process only, so jobs resumed after a restart
+        fall back to the server's key.
+        """
+        if time.time() - self._last_sweep >= JOB_SWEEP_INTERVAL_SECONDS:
+            self.sweep()
+        job_id = uuid.uuid4().hex
+        job_dir = self.job_dir(job_id)
+        os.makedirs(job_dir)
+        with open(os.path.join(job_dir, "resume.pdf"), "wb") as f:
+            f.write(resume_pdf)
+        if latex_template is not None:
+            with open(os.path.join(job_dir, "template.tex"), "wb") as f:
+                f.write(latex_template)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, jd_text, created_at, updated_at, template_id, client) "
+                "VALUES (?, 'queued', 'queued', ?, ?, ?, ?, ?)",
+                (job_id, jd_text, now, now, template_id, client),
+            )
+            self._conn.commit()
+            if api_key:
+                self._api_keys[job_id] = api_key
+        return job_id
+
+    def pop_api_key(self, job_id: str) -> Optional[str]:
+        """The job's API key, forgotten as it is handed out (None if it had none or the process restarted)."""
+        with self._lock:
+            return self._api_keys.pop(job_id, None)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status NOT IN (?, ?) ORDER BY created_at", FINISHED_STATUSES
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def count_active(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status NOT IN (?, ?)", FINISHED_STATUSES
+            ).fetchone()[0]
+
+    def sweep(self) -> int:
+        """Delete jobs that finished more than `ttl` seconds ago, with their directories. Returns how many."""
+        self._last_sweep = time.time()
+        if self.ttl <= 0:
+            return 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED_STATUSES, self._last_sweep - self.ttl),
+            ).fetchall()
+            job_ids = [row["id"] for row in rows]
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+            self._conn.commit()
+        for job_id in job_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        if job_ids:
+            print(f"🧹 Removed {len(job_ids)} expired job(s)")
+        return len(job_ids)
+
+
+def job_status(job: dict) -> dict:
+    """Public view of a job row (never includes the API key or JD text)."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": JOB_STAGES.get(job["stage"], 0),
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+class JobScheduler:
+    """
+    Runs jobs from a JobStore on a small thread pool.
+    `runner(resume_pdf_path, latex_template_path, jd_text, api_key, output_dir, progress, template_id)`
+    must return (pdf_path, latex_code), i.e. the run_tailoring signature.
+    """
+
+    def __init__(self, store: JobStore, runner: Callable, workers: int = JOB_WORKERS):
+        self.store = store
+        self.runner = runner
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, job_id: str):
+        self._executor.submit(self._run, job_id)
+
+    def resume_unfinished(self) -> int:
+        """Re-queue jobs that were queued or running when the previous worker stopped."""
+        job_ids = self.store.unfinished()
+        for job_id in job_ids:
+            self.store.update(job_id, status="queued", stage="queued")
+            self.submit(job_id)
+        return len(job_ids)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        job_dir = self.store.job_dir(job_id)
+        self.store.update(job_id, status="running")
+        # Pool threads are reused: don't add this job's stage timings to the previous job's.
+        start_stage_timings()
+        # Pool threads don't inherit the submitting request's context: queue the job's LLM calls
+        # under its client again. It was charged at submission, and it may wait in the queue.
+        start_llm_request(job["client"], queue_timeout=None)["admitted"] = True
+
+        def progress(stage: str):
+            self.store.update(job_id, stage=stage)
+
+        try:
+            pdf_path, latex_code = self.runner(
+                os.path.join(job_dir, "resume.pdf"),
+                os.path.join(job_dir, "template.tex"),
+                job["jd_text"],
+                api_key=self.store.pop_api_key(job_id),
+                output_dir=job_dir,
+                progress=progress,
+                template_id=job["template_id"],
+            )
+            latex_path = os.path.join(job_dir, "tailored.tex")
+            if pdf_path and os.path.exists(pdf_path):
+                self.store.update(job_id, status="succeeded", stage="done", pdf_path=pdf_path,
+                                  latex_path=latex_path)
+            else:
+                self.store.update(job_id, status="failed", error="LaTeX compilation failed",
+                                  latex_path=latex_path if latex_code else None)
+        except Exception as e:
+            traceback.print_exc()
+            self.store.update(job_id, status="failed", error=str(e))
@@ -0,0 +1,201 @@
+"""
+Precompiled preamble formats and warm pdflatex workers.
+
+For every distinct preamble we dump a .fmt with mylatexformat
+(texlive-latex-extra), so later compiles load packages and fonts from one
+memory image instead of re-reading them. On top of that, a warm worker is a
+pdflatex process already started with that format, parked on a \\read from
+stdin; compiling hands it a file name, so only the document body is paid for.
+
+Both are opt-in (LATEX_PRECOMPILE=1, LATEX_WARM_WORKERS=1) and every failure
+falls back to a plain pdflatex run. Both run pdflatex in the compile sandbox
+(utils/latex_sandbox_utils.py).
+"""
+import atexit
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from utils.latex_sandbox_utils import (
+    LATEX_TIMEOUT_SECONDS,
+    compile_slots,
+    communicate,
+    kill,
+    run_pdflatex,
+    spawn,
+)
+
+LATEX_PRECOMPILE = os.getenv("LATEX_PRECOMPILE", "0").lower() in ("1", "true", "on")
+LATEX_WARM_WORKERS = os.getenv("LATEX_WARM_WORKERS", "0").lower() in ("1", "true", "on")
+LATEX_FORMAT_DIR = os.getenv(
+    "LATEX_FORMAT_DIR",
+    os.path.join(os.getenv("LATEX_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume_tailor_latex")), "fmt"),
+)
+# Parked warm workers kept at most, and how long one may sit idle before it is killed.
+LATEX_WARM_MAX_IDLE = int(os.getenv("LATEX_WARM_MAX_IDLE", "8"))
+LATEX_WARM_IDLE_SECONDS = float(os.getenv("LATEX_WARM_IDLE_SECONDS", "300"))
+# First line for a warm worker: read the file name from stdin, then compile it.
+_WARM_FIRST_LINE = r"\read16 to\docname \nonstopmode\input\docname"
+
+_format_locks = {}
+_format_locks_guard = threading.Lock()
+_failed_formats = set()
+_mylatexformat_available = None
+
+
+def format_key(source: str) -> str:
+    """Name of the format for this document's preamble."""
+    index = source.find("\\begin{document}")
+    preamble = source if index == -1 else source[:index]
+    return "preamble-" + hashlib.sha256(preamble.encode("utf-8")).hexdigest()[:16]
+
+
+def _has_mylatexformat() -> bool:
+    global _mylatexformat_available
+    if _mylatexformat_available is None:
+        try:
+            found = subprocess.run(["kpsewhich", "mylatexformat.ltx"], capture_output=True, text=True)
+            _mylatexformat_available = bool(found.stdout.strip())
+        except FileNotFoundError:
+            _mylatexformat_available = False
+        if not _mylatexformat_available:
+            print("⚠️ mylatexformat.ltx not found; compiling without precompiled formats")
+    return _mylatexformat_available
+
+
+def format_env(env: dict) -> dict:
+    """`env` with LATEX_FORMAT_DIR on pdflatex's format search path."""
+    env = dict(env)
+    env["TEXFORMATS"] = LATEX_FORMAT_DIR + os.pathsep + env.get("TEXFORMATS", "")
+    return env
+
+
+def ensure_format(source: str, env: dict = None):
+    """
+    Name of a ready .fmt for the preamble of `source`, dumping it on first use,
+    or None if formats are disabled or the preamble cannot be dumped.
+    """
+    if not LATEX_PRECOMPILE or not _has_mylatexformat():
+        return None
+
+    key = format_key(source)
+    if key in _failed_formats:
+        return None
+    fmt_path = os.path.join(LATEX_FORMAT_DIR, key + ".fmt")
+    if os.path.exists(fmt_path):
+        return key
+
+    with _format_locks_guard:
+        lock = _format_locks.setdefault(key, threading.Lock())
+    with lock:
+        if os.path.exists(fmt_path):
+            return key
+        os.makedirs(LATEX_FORMAT_DIR, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=LATEX_FORMAT_DIR)
+        try:
+            with open(os.path.join(build_dir, key + ".tex"), "w", encoding="utf-8") as f:
+                f.write(source)
+            commands = ["pdflatex", "-ini", "-no-shell-escape", "-interaction=nonstopmode", f"-jobname={key}",
+                        "&pdflatex", "mylatexformat.ltx", key + ".tex"]
+            result = run_pdflatex(commands, build_dir, env)
+            built = os.path.join(build_dir, key + ".fmt")
+            if not result["ok"] or not os.path.exists(built):
+                print(f"⚠️ Could not dump a format for preamble {key}; compiling without it")
+                _failed_formats.add(key)
+                return None
+            os.replace(built, fmt_path)
+            print(f"✅ Precompiled preamble format '{fmt_path}'")
+            return key
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def discard_format(key: str):
+    """Stop using a format that produced a failed build the plain run did not."""
+    _failed_formats.add(key)
+    try:
+        os.remove(os.path.join(LATEX_FORMAT_DIR, key + ".fmt"))
+    except OSError:
+        pass
+
+
+class WarmPdflatexPool:
+    """
+    One parked pdflatex process per work dir, started with that dir's format.
+    A compile takes the parked process (or starts one), feeds it the file name,
+    and parks a fresh replacement for the next compile in that dir. A parked
+    process is only reused with the format and env (TEXINPUTS points at the
+    document's source dir) it was started with. At most LATEX_WARM_MAX_IDLE
+    are kept, none for longer than LATEX_WARM_IDLE_SECONDS.
+    """
+
+    def __init__(self, max_idle: int = LATEX_WARM_MAX_IDLE, idle_seconds: float = LATEX_WARM_IDLE_SECONDS):
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _spawn(self, work_dir: str, fmt: str, env: dict):
+        # scrollmode, not nonstopmode: the worker has to \read the file name from stdin.
+        commands = ["pdflatex", "-no-shell-escape", "-interaction=scrollmode", "-halt-on-error", "-file-line-error",
+                    f"-fmt={fmt}", "-jobname=document", f"-output-directory={work_dir}", _WARM_FIRST_LINE]
+        return spawn(commands, work_dir, env, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                     stderr=subprocess.STDOUT, text=True, errors="replace")
+
+    def _take(self, work_dir: str, fmt: str, env: dict):
+        with self._lock:
+            parked = self._idle.pop(work_dir, None)
+        if parked is not None:
+            process, parked_key, parked_at = parked
+            fresh = time.monotonic() - parked_at < self.idle_seconds
+            if parked_key == (fmt, frozenset(env.items())) and fresh and process.poll() is None:
+                return process
+            kill(process)
+        return self._spawn(work_dir, fmt, env)
+
+    def park(self, work_dir: str, fmt: str, env: dict):
+        process = self._spawn(work_dir, fmt, env)
+        now = time.monotonic()
+        with self._lock:
+            evicted = [self._idle.pop(work_dir, None)]
+            self._idle[work_dir] = (process, (fmt, frozenset(env.items())), now)
+            # Expired workers, then the longest-parked ones beyond the cap.
+            for directory, (_, _, parked_at) in list(self._idle.items()):
+                if now - parked_at >= self.idle_seconds:
+                    evicted.append(self._idle.pop(directory))
+            while len(self._idle) > max(self.max_idle, 1):
+                oldest = min(self._idle, key=lambda directory: self._idle[directory][2])
+                evicted.append(self._idle.pop(oldest))
+        for parked in evicted:
+            if parked is not None:
+                kill(parked[0])
+
+    def run(self, work_dir: str, filename: str, fmt: str, env: dict) -> dict:
+        """Compile `filename` (jobname "document") in `work_dir`. Returns a run_pdflatex() result."""
+        with compile_slots:
+            process = self._take(work_dir, fmt, env)
+            try:
+                return communicate(process, filename + "\n", timeout=LATEX_TIMEOUT_SECONDS)
+            finally:
+                self.park(work_dir, fmt, env)
+
+    def discard(self, work_dir: str):
+        """Kill the worker parked for `work_dir`, if any (the dir is about to be deleted)."""
+        with self._lock:
+            parked = self._idle.pop(work_dir, None)
+        if parked is not None:
+            kill(parked[0])
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for process, _, _ in idle.values():
+            kill(process)
+
+
+warm_pool = WarmPdflatexPool()
+atexit.register(warm_pool.close)
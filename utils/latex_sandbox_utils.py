@@ -0,0 +1,208 @@
+"""
+Sandboxed pdflatex runs.
+
+Model output is untrusted LaTeX: an infinite macro loop or a runaway \\input
+must not pin a CPU or fill the disk. Every pdflatex process started by the
+compile code goes through here and gets
+
+    - shell escape disabled (-no-shell-escape, shell_escape=f) and writes
+      restricted to the work dir (openout_any=p)
+    - a wall-clock timeout, after which its whole process group is killed
+    - CPU time, address space and output file size rlimits, applied with
+      prlimit() right after spawning (preexec_fn is not safe in our threads)
+    - a slot from a semaphore sized to the cores, so compiles queue instead
+      of oversubscribing the machine. The semaphore is per process: worker
+      processes (the batch compile pool) each get their own, so size such
+      pools to leave room for the main process's compiles.
+
+and failures come back as a parsed error ({"message", "line", "context"})
+instead of a dumped log.
+"""
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from typing import Optional
+
+from utils.latex_validation_utils import LatexValidationError
+
+LATEX_TIMEOUT_SECONDS = float(os.getenv("LATEX_TIMEOUT_SECONDS", "60"))
+LATEX_CPU_SECONDS = int(os.getenv("LATEX_CPU_SECONDS", "60"))
+LATEX_MEMORY_MB = int(os.getenv("LATEX_MEMORY_MB", "1024"))
+LATEX_MAX_OUTPUT_MB = int(os.getenv("LATEX_MAX_OUTPUT_MB", "64"))
+# pdflatex processes running at once in this process (0 = one per core). Not shared with
+# worker processes: a ProcessPoolExecutor of N workers adds up to N more.
+LATEX_MAX_CONCURRENT = int(os.getenv("LATEX_MAX_CONCURRENT", "0")) or os.cpu_count() or 2
+
+# Flags every pdflatex run gets; -file-line-error makes errors start with "file:line:".
+PDFLATEX_FLAGS = ("-no-shell-escape", "-interaction=nonstopmode", "-halt-on-error", "-file-line-error")
+
+# Held for the duration of every pdflatex run (warm workers included).
+compile_slots = threading.BoundedSemaphore(LATEX_MAX_CONCURRENT)
+_last_error = threading.local()
+
+# Recorded as the compile error when pdflatex is not installed (a server problem, not the document's).
+PDFLATEX_NOT_FOUND = "pdflatex not found"
+
+_FILE_LINE_ERROR = re.compile(r"^(?:\./)?[^\s:]+\.tex:(\d+): (.+)$")
+_LINE_MARKER = re.compile(r"^l\.(\d+) ?(.*)$")
+
+
+class LatexCompileError(LatexValidationError):
+    """pdflatex rejected the document; `error` is the parsed error (see parse_latex_error)."""
+
+    def __init__(self, error: Optional[dict]):
+        super().__init__(format_latex_error(error))
+        self.error = error
+
+    def __reduce__(self):
+        # Raised in batch compile worker processes, so it has to survive pickling.
+        return LatexCompileError, (self.error,)
+
+
+class LatexUnavailableError(RuntimeError):
+    """pdflatex is not installed on this server, so nothing can be compiled."""
+
+
+def compile_failure(error: Optional[dict]) -> Exception:
+    """The exception for a failed compile: LatexUnavailableError without pdflatex, else LatexCompileError."""
+    if error and error.get("message") == PDFLATEX_NOT_FOUND:
+        return LatexUnavailableError("pdflatex is not installed on the server")
+    return LatexCompileError(error)
+
+
+def sandbox_env(env: Optional[dict] = None) -> dict:
+    env = dict(os.environ if env is None else env)
+    env["shell_escape"] = "f"
+    env["openout_any"] = "p"
+    return env
+
+
+def pdflatex_command(filename: str, directory: Optional[str] = None, fmt: Optional[str] = None) -> list:
+    commands = ["pdflatex", *PDFLATEX_FLAGS]
+    if fmt:
+        commands.append(f"-fmt={fmt}")
+    if directory:
+        commands.append(f"-output-directory={directory}")
+    commands.append(filename)
+    return commands
+
+
+def apply_limits(pid: int):
+    """CPU, memory and file-size limits for a child process (Linux; a no-op elsewhere)."""
+    try:
+        import resource
+        limits = (
+            (resource.RLIMIT_CPU, LATEX_CPU_SECONDS),
+            (resource.RLIMIT_AS, LATEX_MEMORY_MB * 1024 * 1024),
+            (resource.RLIMIT_FSIZE, LATEX_MAX_OUTPUT_MB * 1024 * 1024),
+            (resource.RLIMIT_CORE, 0),
+        )
+        for limit, value in limits:
+            resource.prlimit(pid, limit, (value, value))
+    except (ImportError, AttributeError):
+        pass
+    except OSError:
+        pass  # already exited
+
+
+def spawn(commands: list, cwd: str, env: dict, **kwargs) -> subprocess.Popen:
+    """Popen in its own process group with the sandbox env and limits applied."""
+    try:
+        process = subprocess.Popen(commands, cwd=cwd, env=sandbox_env(env), start_new_session=True, **kwargs)
+    except FileNotFoundError:
+        _last_error.value = {"message": PDFLATEX_NOT_FOUND, "line": None, "context": None}
+        raise
+    apply_limits(process.pid)
+    return process
+
+
+def kill(process: subprocess.Popen):
+    """Kill a sandboxed process and anything it started."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        process.kill()
+
+
+def communicate(process: subprocess.Popen, stdin_text: Optional[str] = None,
+                timeout: float = LATEX_TIMEOUT_SECONDS) -> dict:
+    """Wait for a spawned pdflatex run and summarize it as a result dict (see run_pdflatex)."""
+    started = time.perf_counter()
+    try:
+        log, _ = process.communicate(stdin_text, timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        kill(process)
+        log, _ = process.communicate()
+        timed_out = True
+    ok = process.returncode == 0 and not timed_out
+    error = None
+    if not ok:
+        error = parse_latex_error(log or "") or {"message": f"pdflatex exited with status {process.returncode}",
+                                                 "line": None, "context": None}
+        if timed_out:
+            error = {**error, "message": f"Compilation timed out after {timeout:.0f}s"}
+        elif process.returncode == -signal.SIGXCPU or process.returncode == -signal.SIGKILL:
+            error = {**error, "message": "Compilation exceeded its CPU or memory limit"}
+        _last_error.value = error
+    return {"ok": ok, "returncode": process.returncode, "timed_out": timed_out,
+            "seconds": time.perf_counter() - started, "error": error, "log": log}
+
+
+def run_pdflatex(commands: list, cwd: str, env: dict, timeout: float = LATEX_TIMEOUT_SECONDS) -> dict:
+    """
+    Run one sandboxed pdflatex command. Returns {"ok", "returncode",
+    "timed_out", "seconds", "error", "log"}; raises FileNotFoundError if
+    pdflatex is not installed.
+    """
+    with compile_slots:
+        process = spawn(commands, cwd, env, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                        stderr=subprocess.STDOUT, text=True, errors="replace")
+        return communicate(process, timeout=timeout)
+
+
+def parse_latex_error(log: str) -> Optional[dict]:
+    """
+    First error in a pdflatex log: its message, the source line number and
+    the offending text, e.g. {"message": "Undefined control sequence.",
+    "line": 42, "context": "\\\\resumeItm{Built ...}"}. None if there is none.
+    """
+    lines = log.splitlines()
+    for index, line in enumerate(lines):
+        file_line = _FILE_LINE_ERROR.match(line)
+        if file_line:
+            message, line_number = file_line.group(2), int(file_line.group(1))
+        elif line.startswith("! "):
+            message, line_number = line[2:], None
+        else:
+            continue
+
+        context = None
+        for following in lines[index + 1:index + 12]:
+            marker = _LINE_MARKER.match(following)
+            if marker:
+                line_number = line_number or int(marker.group(1))
+                context = marker.group(2).strip() or None
+                break
+        return {"message": message.strip(), "line": line_number, "context": context}
+    return None
+
+
+def format_latex_error(error: Optional[dict]) -> str:
+    if not error:
+        return "LaTeX compilation failed"
+    where = f"line {error['line']}: " if error.get("line") else ""
+    context = f" (at '{error['context'][:80]}')" if error.get("context") else ""
+    return f"{where}{error['message']}{context}"
+
+
+def last_compile_error() -> Optional[dict]:
+    """Parsed error of the most recent failed pdflatex run on this thread."""
+    return getattr(_last_error, "value", None)
+
+
+def clear_compile_error():
+    _last_error.value = None
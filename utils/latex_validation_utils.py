@@ -0,0 +1,309 @@
+import re
+
+# How much non-LaTeX chatter we tolerate before \documentclass shows up.
+MAX_PREAMBLE_CHATTER_CHARS = 500
+
+_ENV_PATTERN = re.compile(r"\\(begin|end)\s*\{([^}]*)\}")
+_FENCE_PATTERN = re.compile(r"^\s*```")
+
+
+class LatexValidationError(Exception):
+    """Raised when LLM output is clearly not a compilable LaTeX document."""
+
+
+def strip_comment(line: str) -> str:
+    """Drop an unescaped % comment from a line of LaTeX."""
+    for match in re.finditer(r"%", line):
+        index = match.start()
+        backslashes = len(line[:index]) - len(line[:index].rstrip("\\"))
+        if backslashes % 2 == 0:
+            return line[:index]
+    return line
+
+
+def brace_delta(line: str) -> int:
+    """Net change in { } nesting for one line, ignoring escaped braces and comments."""
+    code = re.sub(r"\\[{}\\]", "", strip_comment(line))
+    return code.count("{") - code.count("}")
+
+
+class LatexStreamValidator:
+    """
+    Incrementally checks LaTeX as it streams in from the model.
+
+    Tokens are buffered until a full line is available. Markdown code fences
+    are dropped, brace depth and the \\begin/\\end environment stack of the
+    document body are tracked, and LatexValidationError is raised as soon as
+    the output is clearly broken so the caller can abort the upstream request
+    early. Brace imbalance alone is only reported in `warnings`, since real
+    templates often carry a stray brace that pdflatex recovers from.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.warnings = []
+        self.brace_depth = 0
+        self.environments = []
+        self.started = False
+        self.in_body = False
+        self.finished = False
+        self._pending = ""
+        self._chatter = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def feed(self, chunk: str):
+        self._pending += chunk
+        *complete, self._pending = self._pending.split("\n")
+        for line in complete:
+            self._process_line(line)
+
+    def finish(self) -> str:
+        """Flush the last partial line and verify the document is complete."""
+        if self._pending:
+            self._process_line(self._pending)
+            self._pending = ""
+        if not self.started:
+            raise LatexValidationError("Output does not contain a LaTeX document")
+        if not self.finished:
+            raise LatexValidationError("Output ended before \\end{document}")
+        if self.brace_depth != 0:
+            self.warnings.append(f"Unbalanced braces at end of document (depth {self.brace_depth})")
+        return self.text + "\n"
+
+    def _process_line(self, line: str):
+        if _FENCE_PATTERN.match(line) or self.finished:
+            # Fences wrap the document; anything after \end{document} is commentary.
+            return
+
+        if not self.started:
+            if "\\documentclass" not in line:
+                self._chatter += len(line)
+                if self._chatter > MAX_PREAMBLE_CHATTER_CHARS:
+                    raise LatexValidationError("Output does not start with \\documentclass")
+                return
+            self.started = True
+            line = line[line.index("\\documentclass"):]
+
+        self.lines.append(line)
+        depth_before = self.brace_depth
+        self.brace_depth += brace_delta(line)
+        if self.brace_depth < 0 <= depth_before:
+            self.warnings.append(f"Unmatched closing brace on line {len(self.lines)}")
+
+        for kind, name in _ENV_PATTERN.findall(strip_comment(line)):
+            if not self.in_body:
+                # Preamble macros may open environments they never close themselves.
+                self.in_body = kind == "begin" and name == "document"
+                if self.in_body:
+                    self.environments.append(name)
+            elif kind == "begin":
+                self.environments.append(name)
+            elif not self.environments or self.environments[-1] != name:
+                expected = self.environments[-1] if self.environments else "nothing"
+                raise LatexValidationError(
+                    f"\\end{{{name}}} on line {len(self.lines)} does not match open environment {expected}"
+                )
+            else:
+                self.environments.pop()
+                if name == "document":
+                    self.finished = True
+
+
+def is_valid_latex_document(text: str) -> bool:
+    """True if a complete reply passes the same checks as the streaming validator."""
+    validator = LatexStreamValidator()
+    try:
+        validator.feed(text)
+        validator.finish()
+    except LatexValidationError:
+        return False
+    return True
+
+
+# Text-level commands that are safe to introduce even if the template never used them.
+SAFE_COMMANDS = {
+    "textbf", "textit", "emph", "underline", "texttt", "textsc", "textsf", "textrm", "textnormal",
+    "small", "footnotesize", "scriptsize", "tiny", "large", "Large", "LARGE", "huge", "Huge", "normalsize",
+    "bfseries", "itshape", "ttfamily", "scshape", "hfill", "vfill", "hspace", "vspace", "newline", "linebreak",
+    "item", "href", "url", "ldots", "dots", "textbar", "textbullet", "cdot", "quad", "qquad", "today",
+    "LaTeX", "TeX", "and", "par", "noindent", "centering", "raggedright", "textasciitilde", "textbackslash",
+    "textendash", "textemdash", "begin", "end", "section", "subsection", "label", "ref", "documentclass",
+}
+# Environments where an unescaped & is a column separator.
+ALIGNMENT_ENVIRONMENTS = {"tabular", "tabular*", "tabularx", "array", "align", "align*", "matrix"}
+# Error kinds that only make the compile fail in some setups (e.g. a command from a loaded package).
+SOFT_PREFLIGHT_KINDS = {"command"}
+
+_COMMAND_PATTERN = re.compile(r"\\([A-Za-z@]+)")
+_DEFINED_COMMAND = re.compile(r"\\(?:re)?newcommand\*?\s*\{?\\([A-Za-z@]+)|\\def\s*\\([A-Za-z@]+)")
+_URL_ARGUMENT = re.compile(r"\\(?:href|url)\s*\{[^}]*\}")
+_INLINE_MATH = re.compile(r"(?<!\\)\$[^$]*(?<!\\)\$")
+_PERCENT_AFTER_NUMBER = re.compile(r"(?<=\d)%")
+
+
+def _issue(kind: str, line: int, message: str) -> dict:
+    return {"kind": kind, "line": line, "message": message}
+
+
+def _unescaped(char: str, text: str) -> list:
+    return [m.start() for m in re.finditer(r"(?<!\\)" + re.escape(char), text)]
+
+
+def _template_commands(template: str) -> set:
+    commands = set(_COMMAND_PATTERN.findall(template))
+    for groups in _DEFINED_COMMAND.findall(template):
+        commands.update(name for name in groups if name)
+    return commands
+
+
+def preflight_check(latex: str, template: str = None) -> list:
+    """
+    Fast pure-Python checks for things that make pdflatex fail, run before
+    spending a compile on model output. Returns a list of
+    {"kind", "line", "message"} issues (empty if the document looks fine).
+    With the original `template`, commands are checked against the ones it
+    defines or uses.
+    """
+    issues = []
+    lines = latex.splitlines()
+
+    if "\\documentclass" not in latex:
+        issues.append(_issue("structure", 1, "Missing \\documentclass"))
+    if "\\end{document}" not in latex:
+        issues.append(_issue("structure", len(lines), "Missing \\end{document}"))
+
+    known = SAFE_COMMANDS | _template_commands(template if template is not None else latex)
+
+    depth = 0
+    environments = []
+    in_body = False
+    reported_commands = set()
+    for number, raw in enumerate(lines, 1):
+        if _FENCE_PATTERN.match(raw):
+            issues.append(_issue("fence", number, "Markdown code fence"))
+            continue
+        line = strip_comment(raw)
+        depth_before = depth
+        depth += brace_delta(raw)
+        if depth < 0 <= depth_before:
+            # Groups left open at the end are only a warning for pdflatex; an extra } is an error.
+            issues.append(_issue("braces", number, "Unmatched closing brace"))
+
+        for name in _COMMAND_PATTERN.findall(line):
+            if name not in known and name not in reported_commands:
+                reported_commands.add(name)
+                issues.append(_issue("command", number, f"\\{name} is not used or defined in the template"))
+
+        for kind, name in _ENV_PATTERN.findall(line):
+            if not in_body:
+                in_body = kind == "begin" and name == "document"
+                if in_body:
+                    environments.append(name)
+            elif kind == "begin":
+                environments.append(name)
+            elif environments and environments[-1] == name:
+                environments.pop()
+            else:
+                expected = environments[-1] if environments else "nothing"
+                issues.append(_issue("environment", number,
+                                     f"\\end{{{name}}} does not match open environment {expected}"))
+
+        if not in_body or _DEFINED_COMMAND.search(line):
+            continue
+        text = _INLINE_MATH.sub("", _URL_ARGUMENT.sub("", line))
+        if _PERCENT_AFTER_NUMBER.search(raw):
+            issues.append(_issue("special", number, "Unescaped % after a number comments out the rest of the line"))
+        if not set(environments) & ALIGNMENT_ENVIRONMENTS and _unescaped("&", text):
+            issues.append(_issue("special", number, "Unescaped & outside a table"))
+        for char in "#_":
+            if _unescaped(char, text):
+                issues.append(_issue("special", number, f"Unescaped {char} in text"))
+        if len(_unescaped("$", line)) % 2:
+            issues.append(_issue("special", number, "Unbalanced $"))
+
+    if in_body and environments:
+        issues.append(_issue("environment", len(lines), f"Unclosed environments: {', '.join(environments)}"))
+    return issues
+
+
+def _escape_specials(line: str, in_table: bool) -> str:
+    code = strip_comment(line)
+    comment = line[len(code):]
+    protected = {}
+
+    def protect(match):
+        protected[f"\0{len(protected)}\0"] = match.group(0)
+        return f"\0{len(protected) - 1}\0"
+
+    code = _INLINE_MATH.sub(protect, _URL_ARGUMENT.sub(protect, code))
+    if not in_table:
+        code = re.sub(r"(?<!\\)&", r"\\&", code)
+    code = re.sub(r"(?<!\\)([#_])", r"\\\1", code)
+    if len(_unescaped("$", code)) % 2:
+        # A lone $ before a number is a price, not math.
+        code = re.sub(r"(?<!\\)\$(?=\d)", r"\\$", code)
+    for placeholder, original in protected.items():
+        code = code.replace(placeholder, original)
+    return code + comment
+
+
+def auto_repair(latex: str, template: str = None):
+    """
+    Apply the repairs that cannot change meaning: drop fences and chatter
+    around the document, restore the template's preamble, escape stray
+    & % $ # _ in body text, and close environments left open at the end.
+    Returns (latex, list of repair descriptions).
+    """
+    repairs = []
+    lines = latex.splitlines()
+
+    kept = [line for line in lines if not _FENCE_PATTERN.match(line)]
+    if len(kept) != len(lines):
+        repairs.append("removed markdown fences")
+    text = "\n".join(kept)
+
+    start = text.find("\\documentclass")
+    if start > 0:
+        text = text[start:]
+        repairs.append("removed text before \\documentclass")
+    end = text.rfind("\\end{document}")
+    if end != -1 and text[end + len("\\end{document}"):].strip():
+        text = text[:end + len("\\end{document}")]
+        repairs.append("removed text after \\end{document}")
+
+    if template is not None:
+        template_body = template.find("\\begin{document}")
+        body = text.find("\\begin{document}")
+        if template_body != -1 and body != -1 and text[:body] != template[:template_body]:
+            text = template[:template_body] + text[body:]
+            repairs.append("restored the template preamble")
+
+    body = text.find("\\begin{document}")
+    if body != -1:
+        environments = []
+        repaired_lines = []
+        for line in text[body:].splitlines():
+            fixed = line
+            if not _DEFINED_COMMAND.search(line):
+                fixed = _PERCENT_AFTER_NUMBER.sub(r"\\%", line)
+                fixed = _escape_specials(fixed, bool(set(environments) & ALIGNMENT_ENVIRONMENTS))
+            if fixed != line:
+                repairs.append(f"escaped special characters in: {line.strip()[:60]}")
+            for kind, name in _ENV_PATTERN.findall(strip_comment(fixed)):
+                if kind == "begin":
+                    environments.append(name)
+                elif environments and environments[-1] == name:
+                    environments.pop()
+            repaired_lines.append(fixed)
+        text = text[:body] + "\n".join(repaired_lines)
+
+        if "\\end{document}" not in text:
+            open_environments = [name for name in environments if name != "document"]
+            closing = "".join(f"\\end{{{name}}}\n" for name in reversed(open_environments))
+            text = text.rstrip() + "\n" + closing + "\\end{document}"
+            repairs.append("closed the document")
+
+    return text.rstrip() + "\n", repairs
@@ -0,0 +1,387 @@
+"""
+Admission control and fair scheduling in front of every LLM call.
+
+    client bucket   each HTTP client (X-Client-Id header, else its address)
+                    may start LLM_CLIENT_RATE_PER_MINUTE tailoring requests;
+                    past that the API answers 429 with Retry-After
+    key bucket      each API key makes at most LLM_KEY_RATE_PER_MINUTE
+                    upstream calls, LLM_KEY_MAX_INFLIGHT at a time; calls
+                    over the limit wait in that key's queue
+    fair queue      waiting calls are served by start-time fair queuing, so a
+                    client with a big batch cannot starve the others sharing
+                    its key; cost is the prompt's estimated tokens, divided by
+                    the client's weight from LLM_CLIENT_WEIGHTS
+    coalescing      identical in-flight calls (same key, model, temperature
+                    and prompt) share one upstream request
+
+The scheduler is thread-safe and not tied to an event loop: the API's loop,
+job threads running asyncio.run() and the blocking helpers all share it.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from utils.http_utils import LLMError
+
+LLM_KEY_RATE_PER_MINUTE = float(os.getenv("LLM_KEY_RATE_PER_MINUTE", "20"))
+LLM_KEY_BURST = float(os.getenv("LLM_KEY_BURST", "10"))
+LLM_KEY_MAX_INFLIGHT = int(os.getenv("LLM_KEY_MAX_INFLIGHT", "8"))
+LLM_CLIENT_RATE_PER_MINUTE = float(os.getenv("LLM_CLIENT_RATE_PER_MINUTE", "6"))
+# The frontend submits one job per JD it compares (up to 4 at once), so the burst covers that.
+LLM_CLIENT_BURST = float(os.getenv("LLM_CLIENT_BURST", "4"))
+# How long an interactive request's call may wait in its key's queue before giving up with a 429.
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+# "client=weight" pairs, e.g. "frontend=4,batch-runner=0.5"; unlisted clients weigh 1.
+LLM_CLIENT_WEIGHTS = os.getenv("LLM_CLIENT_WEIGHTS", "")
+LLM_COALESCE = os.getenv("LLM_COALESCE", "1").lower() not in ("0", "false", "off")
+# Idle clients and keys (full bucket, nothing queued or in flight) are forgotten at most this often.
+LLM_SCHEDULER_SWEEP_SECONDS = 60
+
+DEFAULT_CLIENT = "default"
+
+_llm_request = contextvars.ContextVar("llm_request", default=None)
+
+
+class RateLimitedError(LLMError):
+    """A client or API key is over its limit; retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_weights(spec: str) -> dict:
+    weights = {}
+    for entry in spec.split(","):
+        name, _, weight = entry.strip().rpartition("=")
+        if name:
+            weights[name] = max(float(weight), 0.01)
+    return weights
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Short hash of an API key, safe to log and to use as a metric label."""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:8]
+
+
+def start_llm_request(client: str, queue_timeout: Optional[float] = LLM_QUEUE_TIMEOUT_SECONDS,
+                      rate_key: Optional[str] = None) -> dict:
+    """
+    Tag the current request/task with the client it serves. Every LLM call it
+    makes (including from tasks and executor threads given a copy of the
+    context) is fair-queued under `client`, and the first one is charged to
+    the `rate_key` bucket (default: `client`). queue_timeout=None waits as
+    long as it takes.
+    """
+    client = client or DEFAULT_CLIENT
+    request = {"client": client, "rate_key": rate_key or client, "admitted": False, "queue_timeout": queue_timeout}
+    _llm_request.set(request)
+    return request
+
+
+def current_client() -> str:
+    request = _llm_request.get()
+    return request["client"] if request else DEFAULT_CLIENT
+
+
+class TokenBucket:
+    """`burst` tokens, refilled at `rate` per second. Not locked; the scheduler's lock covers it."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def full(self, now: float) -> bool:
+        """Whether the bucket has refilled completely, i.e. forgetting it changes nothing."""
+        return self.rate <= 0 or self.tokens + (now - self.updated) * self.rate >= self.burst
+
+    def take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _Waiter:
+    __slots__ = ("client", "start", "grant", "granted")
+
+    def __init__(self, client: str, start: float, grant):
+        self.client = client
+        self.start = start
+        self.grant = grant
+        self.granted = False
+
+
+class _KeyState:
+    def __init__(self):
+        self.bucket = TokenBucket(LLM_KEY_RATE_PER_MINUTE / 60, LLM_KEY_BURST)
+        self.inflight = 0
+        self.queue = []
+        self.virtual_time = 0.0
+        self.finish_tags = {}  # client -> virtual finish time of its last queued call
+        self.timer = None
+
+
+class LLMScheduler:
+    def __init__(self, weights: Optional[dict] = None):
+        self.weights = parse_weights(LLM_CLIENT_WEIGHTS) if weights is None else weights
+        self._keys = {}
+        self._clients = {}
+        self._inflight_calls = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.counters = {"calls": 0, "queued": 0, "rate_limited": 0, "queue_timeouts": 0, "coalesced": 0}
+
+    def _sweep(self):
+        """Forget idle client buckets and key states, or every address and key ever seen stays. Caller holds the lock."""
+        now = time.monotonic()
+        if now - self._last_sweep < LLM_SCHEDULER_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        for client in [client for client, bucket in self._clients.items() if bucket.full(now)]:
+            del self._clients[client]
+        for key in [key for key, state in self._keys.items()
+                    if not state.queue and not state.inflight and state.timer is None and state.bucket.full(now)]:
+            del self._keys[key]
+
+    # --- admission -------------------------------------------------------
+
+    def admit_client(self, client: str):
+        """Charge one request to `client`'s bucket; raises RateLimitedError if it is empty."""
+        with self._lock:
+            self._sweep()
+            bucket = self._clients.get(client)
+            if bucket is None:
+                bucket = self._clients[client] = TokenBucket(LLM_CLIENT_RATE_PER_MINUTE / 60, LLM_CLIENT_BURST)
+            wait = bucket.take()
+            if wait:
+                self.counters["rate_limited"] += 1
+        if wait:
+            raise RateLimitedError(f"Client '{client}' is over its rate limit", retry_after=wait)
+
+    def admit(self):
+        """
+        Charge the current request to its client, once however many calls it
+        makes. Only requests tagged by start_llm_request() are charged; CLI
+        runs and background jobs are not.
+        """
+        request = _llm_request.get()
+        if request is not None and not request["admitted"]:
+            self.admit_client(request["rate_key"])
+            request["admitted"] = True
+
+    # --- fair queue ------------------------------------------------------
+
+    def _enqueue(self, api_key: str, cost: float, grant):
+        client = current_client()
+        with self._lock:
+            self._sweep()
+            state = self._keys.get(key_id(api_key))
+            if state is None:
+                state = self._keys[key_id(api_key)] = _KeyState()
+            start = max(state.virtual_time, state.finish_tags.get(client, 0.0))
+            state.finish_tags[client] = start + cost / self.weights.get(client, 1.0)
+            waiter = _Waiter(client, start, grant)
+            state.queue.append(waiter)
+            self.counters["calls"] += 1
+            self._dispatch(state)
+            if not waiter.granted:
+                self.counters["queued"] += 1
+        return state, waiter
+
+    def _dispatch(self, state: _KeyState):
+        """Grant queued calls while the key has both a free slot and a token. Caller holds the lock."""
+        while state.queue and state.inflight < LLM_KEY_MAX_INFLIGHT:
+            wait = state.bucket.take()
+            if wait:
+                if state.timer is None:
+                    state.timer = threading.Timer(wait, self._on_timer, (state,))
+                    state.timer.daemon = True
+                    state.timer.start()
+                return
+            waiter = min(state.queue, key=lambda w: w.start)
+            state.queue.remove(waiter)
+            state.virtual_time = max(state.virtual_time, waiter.start)
+            state.inflight += 1
+            waiter.granted = True
+            waiter.grant()
+        if not state.queue and not state.inflight:
+            # Idle key: forget finish tags so returning clients are not penalized for old work.
+            state.finish_tags.clear()
+
+    def _on_timer(self, state: _KeyState):
+        with self._lock:
+            state.timer = None
+            self._dispatch(state)
+
+    def _withdraw(self, state: _KeyState, waiter: _Waiter) -> bool:
+        """Remove a waiter that gave up; False if it had been granted a slot in the meantime."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            state.queue.remove(waiter)
+            return True
+
+    def _release(self, state: _KeyState):
+        with self._lock:
+            state.inflight -= 1
+            self._dispatch(state)
+
+    def _timeout_error(self, state: _KeyState) -> RateLimitedError:
+        with self._lock:
+            self.counters["queue_timeouts"] += 1
+            backlog = len(state.queue) + 1
+        return RateLimitedError("Too many LLM calls queued for this API key",
+                                retry_after=backlog * 60 / max(LLM_KEY_RATE_PER_MINUTE, 1))
+
+    @staticmethod
+    def _queue_timeout() -> Optional[float]:
+        request = _llm_request.get()
+        return request["queue_timeout"] if request else None
+
+    @asynccontextmanager
+    async def slot(self, api_key: str, cost: float = 1.0):
+        """Hold one of `api_key`'s call slots, waiting for it in the fair queue."""
+        self.admit()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        state, waiter = self._enqueue(api_key, cost, grant)
+        try:
+            await asyncio.wait_for(granted, self._queue_timeout())
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if not self._withdraw(state, waiter):
+                self._release(state)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._timeout_error(state) from None
+            raise
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    @contextmanager
+    def slot_sync(self, api_key: str, cost: float = 1.0):
+        """Blocking counterpart of slot()."""
+        self.admit()
+        granted = threading.Event()
+        state, waiter = self._enqueue(api_key, cost, granted.set)
+        if not granted.wait(self._queue_timeout()):
+            if self._withdraw(state, waiter):
+                raise self._timeout_error(state)
+        try:
+            yield
+        finally:
+            self._release(state)
+
+    # --- coalescing ------------------------------------------------------
+
+    def _join(self, key: str):
+        """(future, True) for the first caller of `key`, (its future, False) for identical callers meanwhile."""
+        with self._lock:
+            future = self._inflight_calls.get(key)
+            if future is not None:
+                self.counters["coalesced"] += 1
+                return future, False
+            future = self._inflight_calls[key] = concurrent.futures.Future()
+            return future, True
+
+    def _settle(self, key: str, future: concurrent.futures.Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._inflight_calls.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, Exception):
+            future.set_exception(error)
+        else:
+            future.set_exception(LLMError("The shared LLM request was cancelled"))
+
+    async def run(self, api_key: str, cost: float, coalesce_key: Optional[str], call):
+        """Await `call()` in a slot of `api_key`; callers with the same `coalesce_key` share the result."""
+        if coalesce_key is None or not LLM_COALESCE:
+            async with self.slot(api_key, cost):
+                return await call()
+
+        future, leader = self._join(coalesce_key)
+        if not leader:
+            self.admit()
+            print(f"🔗 Sharing an identical in-flight LLM request ({coalesce_key[:12]})")
+            # Shielded so a follower that goes away does not cancel the shared call.
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            async with self.slot(api_key, cost):
+                result = await call()
+        except BaseException as e:
+            self._settle(coalesce_key, future, error=e)
+            raise
+        self._settle(coalesce_key, future, result)
+        return result
+
+    def run_sync(self, api_key: str, cost: float, coalesce_key: Optional[str], call):
+        """Blocking counterpart of run()."""
+        if coalesce_key is None or not LLM_COALESCE:
+            with self.slot_sync(api_key, cost):
+                return call()
+
+        future, leader = self._join(coalesce_key)
+        if not leader:
+            self.admit()
+            print(f"🔗 Sharing an identical in-flight LLM request ({coalesce_key[:12]})")
+            return future.result()
+        try:
+            with self.slot_sync(api_key, cost):
+                result = call()
+        except BaseException as e:
+            self._settle(coalesce_key, future, error=e)
+            raise
+        self._settle(coalesce_key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            keys = {
+                key: {"inflight": state.inflight, "queued": len(state.queue),
+                      "tokens": round(state.bucket.tokens, 2)}
+                for key, state in self._keys.items()
+            }
+            return {**self.counters, "coalescing": len(self._inflight_calls), "keys": keys,
+                    "clients": len(self._clients)}
+
+
+def coalesce_key(api_key: str, model: str, temperature: float, prompt: str, validate=None) -> str:
+    """Identity of an LLM call for coalescing: same key, model, temperature, prompt and validator."""
+    digest = hashlib.sha256()
+    for part in (key_id(api_key), model, repr(temperature), getattr(validate, "__qualname__", ""), prompt):
+        digest.update(str(part).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
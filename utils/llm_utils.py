@@ -1,13 +1,54 @@
-import requests
 import json
 import os
-import dotenv
+from contextlib import aclosing
 
+from utils.cache_utils import get_result_cache, make_cache_key
+from utils.latex_validation_utils import (
+    SOFT_PREFLIGHT_KINDS,
+    LatexValidationError,
+    auto_repair,
+    is_valid_latex_document,
+    preflight_check,
+)
+from utils.model_router import get_model_router
+from utils.llm_scheduler import coalesce_key, get_llm_scheduler
+from utils.metrics_utils import llm_tokens
+from utils.prompt_utils import PROMPT_COMPACTION, compact_prompt_inputs, estimate_tokens
+from utils.relevance_utils import top_relevant_lines
+from utils.http_utils import (
+    CircuitBreaker,
+    LLMError,
+    get_async_client,
+    post_json,
+    post_json_async,
+)
 
 
-OPENROUTER_API_URL= "https://openrouter.ai/api/v1/chat/completions"
+
+# Overridable so tests and benchmarks can point at utils/mock_openrouter.py.
+OPENROUTER_API_URL= os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+DEFAULT_MODEL = "x-ai/grok-4-fast:free"
+# Passing model=None to the functions below routes through utils.model_router
+# (ordered fallback list from LLM_MODELS, optional hedging).
+DEFAULT_TEMPERATURE = 0.3
+# Extra LLM round trips allowed to fix LaTeX that auto_repair could not.
+LATEX_REPAIR_ATTEMPTS = int(os.getenv("LATEX_REPAIR_ATTEMPTS", "1"))
         
-def resume_tailoring_tool(resume_text: str, jd_text: str, latex_code: str, api_key: str) -> dict:
+def build_tailoring_prompt(resume_text: str, jd_text: str, latex_code: str) -> str:
+
+    if PROMPT_COMPACTION:
+        resume_text, jd_text, stats = compact_prompt_inputs(resume_text, jd_text, latex_code)
+        print(f"✂️ Prompt compaction saved ~{stats['tokens_saved']} tokens "
+              f"({stats['tokens_before']} -> {stats['tokens_after']})")
+        if stats["over_budget"]:
+            print("⚠️ Prompt is still over PROMPT_TOKEN_BUDGET; the template alone may be too large")
+
+    # Scored locally, so the model knows which content to lead with.
+    highlights = "\n".join(f"- {line}" for line in top_relevant_lines(resume_text, jd_text))
+    highlights_block = f"""
+Resume content most relevant to this job, best match first (emphasize it; keep the rest brief):
+{highlights}
+""" if highlights else ""
 
     prompt = f"""
 You are a highly skilled professional resume assistant and LaTeX expert.
@@ -41,15 +82,19 @@ Task:
 
 Job description:
 {jd_text}
-
+{highlights_block}
 Original LaTeX template:
 {latex_code}
 
 Original resume text (plain):
 {resume_text}
 """
+    return prompt
 
-    
+
+def build_request(prompt: str, api_key: str, model: str = DEFAULT_MODEL,
+                  temperature: float = DEFAULT_TEMPERATURE):
+    """Headers and JSON payload for an OpenRouter chat completion."""
     headers = {
         "Authorization": f"Bearer {api_key}",  # use the argument, not global
         # "HTTP-Referer": "http://localhost",
@@ -57,28 +102,262 @@ Original resume text (plain):
     }
 
     payload = {
-        "model": "x-ai/grok-4-fast:free",
+        "model": model,
         "messages": [
             {"role": "system", "content": "You are a helpful assistant for tailoring resumes."},
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0.3
+        "temperature": temperature
     }
-    response = requests.post(OPENROUTER_API_URL, headers=headers, json=payload)
-    try:
-         result = response.json()
-
-         if "choices" in result and len(result["choices"]) > 0:
-             tailored_content = result["choices"][0]["message"]["content"]
-         elif "error" in result:
-             print("⚠️ API returned an error:", result["error"])
-             tailored_content = ""
-         else:
-             print("⚠️ Unexpected response format:", result)
-             tailored_content = ""
-
-         return tailored_content
-
-    except json.JSONDecodeError:
-         print("⚠️ Could not decode JSON. Raw response:", response.text)
-         return ""
+    return headers, payload
+
+
+def parse_completion(result: dict) -> str:
+    """Reply text of a completion; raises LLMError instead of returning nothing usable."""
+    if "choices" in result and len(result["choices"]) > 0:
+        usage = result.get("usage") or {}
+        for kind in ("prompt", "completion"):
+            if usage.get(f"{kind}_tokens"):
+                llm_tokens.inc(usage[f"{kind}_tokens"], model=result.get("model", ""), kind=kind)
+        content = result["choices"][0]["message"]["content"]
+        if not content or not content.strip():
+            raise LLMError("LLM API returned an empty completion")
+        return content
+    elif "error" in result:
+        print("⚠️ API returned an error:", result["error"])
+        raise LLMError(f"LLM API returned an error: {result['error']}")
+    else:
+        print("⚠️ Unexpected response format:", result)
+        raise LLMError("Unexpected response format from LLM API")
+
+
+def model_cache_name(model: str = None) -> str:
+    """What to put in cache keys for `model` (None = whatever the router would use)."""
+    return model or get_model_router().name
+
+
+def _call_cost(prompt: str) -> float:
+    # Fair-queue cost of a call, in thousands of prompt tokens.
+    return max(estimate_tokens(prompt), 1) / 1000
+
+
+def chat_completion(prompt: str, api_key: str, model: str = None,
+                    temperature: float = DEFAULT_TEMPERATURE, validate=None) -> str:
+    """
+    Blocking completion; raises LLMError on failure. Scheduled and coalesced
+    per API key by utils.llm_scheduler (RateLimitedError when over the limit).
+    """
+
+    def call(model_name, timeout):
+        headers, payload = build_request(prompt, api_key, model_name, temperature)
+        breaker = get_model_router().breaker(model_name)
+        return parse_completion(post_json(OPENROUTER_API_URL, headers, payload, timeout=timeout,
+                                          breaker=breaker, total_timeout=timeout))
+
+    def complete():
+        if model:
+            return call(model, None)
+        text, _ = get_model_router().complete_sync(call, validate=validate)
+        return text
+
+    key = coalesce_key(api_key, model_cache_name(model), temperature, prompt, validate)
+    return get_llm_scheduler().run_sync(api_key, _call_cost(prompt), key, complete)
+
+
+def build_repair_prompt(latex: str, issues: list) -> str:
+    problems = "\n".join(f"- line {issue['line']}: {issue['message']}" for issue in issues)
+    return f"""
+You are a LaTeX expert. The following LaTeX resume does not compile because of these problems:
+{problems}
+
+Fix only these problems. Do NOT change the wording, the preamble, packages or formatting.
+Return the **full LaTeX code**, ready to compile. Do NOT return JSON or extra commentary.
+
+LaTeX:
+{latex}
+"""
+
+
+def _preflight(latex: str, template: str):
+    latex, repairs = auto_repair(latex, template)
+    for repair in repairs:
+        print(f"🔧 Auto-repair: {repair}")
+    return latex, preflight_check(latex, template)
+
+
+def _finish_preflight(latex: str, issues: list) -> str:
+    blocking = [issue for issue in issues if issue["kind"] not in SOFT_PREFLIGHT_KINDS]
+    if blocking:
+        raise LatexValidationError("; ".join(f"line {i['line']}: {i['message']}" for i in blocking[:5]))
+    for issue in issues:
+        print(f"⚠️ Pre-flight: line {issue['line']}: {issue['message']}")
+    return latex
+
+
+def repair_latex(latex: str, template: str, api_key: str, model: str = None,
+                 temperature: float = DEFAULT_TEMPERATURE, max_attempts: int = LATEX_REPAIR_ATTEMPTS) -> str:
+    """
+    Pre-flight model output before compiling: apply safe local repairs, then ask
+    the LLM to fix what is left, at most `max_attempts` times. Raises
+    LatexValidationError if it still would not compile.
+    """
+    latex, issues = _preflight(latex, template)
+    for _ in range(max_attempts):
+        if not issues:
+            break
+        print(f"🔁 Asking the model to fix {len(issues)} LaTeX problem(s)")
+        fixed = chat_completion(build_repair_prompt(latex, issues), api_key, model, temperature,
+                                validate=is_valid_latex_document)
+        latex, issues = _preflight(fixed, template)
+    return _finish_preflight(latex, issues)
+
+
+async def async_repair_latex(latex: str, template: str, api_key: str, model: str = None,
+                             temperature: float = DEFAULT_TEMPERATURE,
+                             max_attempts: int = LATEX_REPAIR_ATTEMPTS) -> str:
+    """Non-blocking variant of repair_latex."""
+    latex, issues = _preflight(latex, template)
+    for _ in range(max_attempts):
+        if not issues:
+            break
+        print(f"🔁 Asking the model to fix {len(issues)} LaTeX problem(s)")
+        fixed = await async_chat_completion(build_repair_prompt(latex, issues), api_key, model, temperature,
+                                            validate=is_valid_latex_document)
+        latex, issues = _preflight(fixed, template)
+    return _finish_preflight(latex, issues)
+
+
+def resume_tailoring_tool(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                          model: str = None, temperature: float = DEFAULT_TEMPERATURE) -> dict:
+
+    prompt = build_tailoring_prompt(resume_text, jd_text, latex_code)
+    output = chat_completion(prompt, api_key, model, temperature, validate=is_valid_latex_document)
+    return repair_latex(output, latex_code, api_key, model, temperature)
+
+
+async def async_chat_completion(prompt: str, api_key: str, model: str = None,
+                                temperature: float = DEFAULT_TEMPERATURE, validate=None) -> str:
+    """Send one prompt without blocking the event loop; raises LLMError on failure (see chat_completion)."""
+
+    async def call(model_name):
+        headers, payload = build_request(prompt, api_key, model_name, temperature)
+        breaker = get_model_router().breaker(model_name)
+        return parse_completion(await post_json_async(OPENROUTER_API_URL, headers, payload, breaker=breaker))
+
+    async def complete():
+        if model:
+            return await call(model)
+        text, _ = await get_model_router().complete(call, validate=validate)
+        return text
+
+    key = coalesce_key(api_key, model_cache_name(model), temperature, prompt, validate)
+    return await get_llm_scheduler().run(api_key, _call_cost(prompt), key, complete)
+
+
+async def async_resume_tailoring_tool(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                                      model: str = None, temperature: float = DEFAULT_TEMPERATURE) -> str:
+    """Non-blocking variant of resume_tailoring_tool for use on an event loop."""
+
+    prompt = build_tailoring_prompt(resume_text, jd_text, latex_code)
+    output = await async_chat_completion(prompt, api_key, model, temperature, validate=is_valid_latex_document)
+    return await async_repair_latex(output, latex_code, api_key, model, temperature)
+
+
+async def stream_chat_completion(prompt: str, api_key: str, model: str = None,
+                                 temperature: float = DEFAULT_TEMPERATURE):
+    """
+    Yield content deltas from an OpenRouter completion as they arrive (SSE, `stream: true`).
+    Closing the generator early closes the upstream connection. Streams are
+    not retried (tokens may already have been forwarded), but they go through
+    the shared pool, the circuit breaker and the API key's fair queue (never
+    coalesced). Without an explicit model, the router's primary model is used.
+    """
+    model = model or get_model_router().primary_model
+    headers, payload = build_request(prompt, api_key, model, temperature)
+    payload["stream"] = True
+
+    async with get_llm_scheduler().slot(api_key, _call_cost(prompt)), \
+            aclosing(_stream_deltas(headers, payload, get_model_router().breaker(model))) as deltas:
+        async for delta in deltas:
+            yield delta
+
+
+async def _stream_deltas(headers: dict, payload: dict, breaker: CircuitBreaker):
+    breaker.before_call()
+    async with get_async_client().stream("POST", OPENROUTER_API_URL, headers=headers, json=payload) as response:
+        if response.status_code != 200:
+            body = (await response.aread()).decode("utf-8", "replace")
+            if response.status_code == 429 or response.status_code >= 500:
+                breaker.record_failure()
+            print("⚠️ API returned an error:", body)
+            raise LLMError(f"LLM API returned {response.status_code}: {body[:500]}")
+        breaker.record_success()
+        async for line in response.aiter_lines():
+            # Lines starting with ":" are keep-alive comments.
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                print("⚠️ Could not decode stream chunk:", data)
+                continue
+            if "error" in chunk:
+                print("⚠️ API returned an error:", chunk["error"])
+                raise LLMError(f"LLM API returned an error: {chunk['error']}")
+            for choice in chunk.get("choices", []):
+                delta = choice.get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+
+def cached_resume_tailoring_tool(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                                 model: str = None, temperature: float = DEFAULT_TEMPERATURE) -> str:
+    """
+    Same as resume_tailoring_tool, but consults the result cache first.
+    Failed calls raise and are never stored, so they are retried next time.
+    """
+    cache = get_result_cache()
+    key = make_cache_key(resume_text, jd_text, latex_code, model_cache_name(model), temperature)
+
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"♻️ Result cache hit ({key[:12]})")
+        return cached
+
+    tailored_content = resume_tailoring_tool(
+        resume_text=resume_text,
+        jd_text=jd_text,
+        latex_code=latex_code,
+        api_key=api_key,
+        model=model,
+        temperature=temperature
+    )
+    cache.set(key, tailored_content)
+    return tailored_content
+
+
+async def async_cached_resume_tailoring_tool(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                                             model: str = None,
+                                             temperature: float = DEFAULT_TEMPERATURE) -> str:
+    """Async counterpart of cached_resume_tailoring_tool."""
+    cache = get_result_cache()
+    key = make_cache_key(resume_text, jd_text, latex_code, model_cache_name(model), temperature)
+
+    cached = cache.get(key)
+    if cached is not None:
+        print(f"♻️ Result cache hit ({key[:12]})")
+        return cached
+
+    tailored_content = await async_resume_tailoring_tool(
+        resume_text=resume_text,
+        jd_text=jd_text,
+        latex_code=latex_code,
+        api_key=api_key,
+        model=model,
+        temperature=temperature
+    )
+    cache.set(key, tailored_content)
+    return tailored_content
@@ -0,0 +1,164 @@
+"""
+Minimal Prometheus text-format metrics and per-request stage timings.
+
+    with stage_timer("llm"):
+        ...
+
+records the duration in the `resume_stage_seconds` histogram and, if the
+current request called start_stage_timings(), in that request's timings too.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, float("inf"))
+
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = self._values or ({(): 0} if not self.labels else {})
+            for key, value in sorted(values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = STAGE_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[key] = (counts, total + value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, counts):
+                    le = 'le="' + _format_bound(bound) + '"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+class Collector:
+    """
+    Metrics computed at scrape time. `collect()` yields (name, type, help, samples),
+    each sample being (labels dict, value) or (suffix, labels dict, value) for
+    histogram series such as "_bucket".
+    """
+
+    def __init__(self, collect):
+        self.collect = collect
+        REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = []
+        for name, kind, help_text, samples in self.collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample in samples:
+                suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+                names = tuple(labels)
+                lines.append(f"{name}{suffix}{_format_labels(names, tuple(labels[n] for n in names))} {value}")
+        return lines
+
+
+REGISTRY = []
+
+stage_seconds = Histogram("resume_stage_seconds", "Time spent in each pipeline stage.", ("stage",))
+http_request_seconds = Histogram("http_request_duration_seconds", "HTTP request latency.",
+                                 ("method", "path", "status"))
+llm_tokens = Counter("llm_tokens_total", "Tokens reported by the LLM API.", ("model", "kind"))
+compile_failures = Counter("latex_compile_failures_total", "LaTeX documents that failed to compile.")
+pdf_cache_hits = Counter("latex_pdf_cache_hits_total", "Compiles answered from the PDF cache.")
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            print(f"⚠️ Could not render metric: {e}")
+    return "\n".join(lines) + "\n"
+
+
+def start_stage_timings() -> dict:
+    """Start collecting stage timings for the current request/task; returns the dict being filled."""
+    timings = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+def current_stage_timings() -> dict:
+    """The timings being collected for the current request/task, starting them if needed."""
+    timings = _stage_timings.get()
+    return timings if timings is not None else start_stage_timings()
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        timings = _stage_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def format_stage_timings(timings: dict) -> str:
+    return " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in timings.items())
+
+
+def server_timing_header(timings: dict) -> str:
+    """Server-Timing header value, e.g. 'extract;dur=12.1, llm;dur=3204.5' (milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,162 @@
+"""
+Local stand-in for the OpenRouter chat completions API, for offline tests and benchmarks.
+
+    with MockOpenRouter(completion=latex, responses=[{"status": 429, "headers": {"Retry-After": "1"}}]) as server:
+        os.environ["OPENROUTER_API_URL"] = server.url   # or patch utils.llm_utils.OPENROUTER_API_URL
+        ...
+
+Run standalone with:
+    python -m utils.mock_openrouter --completion-file resume-s/tailored.tex --latency 2
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STREAM_CHUNK_CHARS = 40
+
+
+class MockOpenRouter:
+    """
+    Serves scripted replies from `responses` in order, then `completion` for
+    every later request (a list of completions is replayed round-robin). A scripted reply is either completion text or a dict
+    {"status": int, "body": dict | str, "headers": dict, "latency": float}.
+    Every request waits `latency` seconds (spread over the chunks when streaming).
+    """
+
+    def __init__(self, completion: str = "", latency: float = 0.0, responses=None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.completion = completion
+        self.latency = latency
+        self.responses = list(responses or [])
+        self.received = []
+        self._replayed = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/v1/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_reply(self, payload: dict):
+        with self._lock:
+            self.received.append(payload)
+            if self.responses:
+                reply = self.responses.pop(0)
+            elif isinstance(self.completion, list):
+                reply = self.completion[self._replayed % len(self.completion)]
+                self._replayed += 1
+            else:
+                reply = self.completion
+        if isinstance(reply, str):
+            reply = {"status": 200, "completion": reply}
+        return reply
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                reply = mock._next_reply(payload)
+                latency = reply.get("latency", mock.latency)
+                status = reply.get("status", 200)
+
+                if status != 200 or "completion" not in reply:
+                    time.sleep(latency)
+                    body = reply.get("body", {"error": {"code": status, "message": "mock error"}})
+                    self._send(status, body, reply.get("headers", {}))
+                elif payload.get("stream"):
+                    self._stream(reply["completion"], payload.get("model"), latency)
+                else:
+                    time.sleep(latency)
+                    self._send(200, completion_body(reply["completion"], payload), {})
+
+            def _send(self, status, body, headers):
+                data = body if isinstance(body, (bytes, str)) else json.dumps(body)
+                data = data.encode("utf-8") if isinstance(data, str) else data
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, completion, model, latency):
+                chunks = [completion[i:i + STREAM_CHUNK_CHARS]
+                          for i in range(0, len(completion), STREAM_CHUNK_CHARS)] or [""]
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+                for chunk in chunks:
+                    time.sleep(latency / len(chunks))
+                    event = {"model": model, "choices": [{"index": 0, "delta": {"content": chunk}}]}
+                    self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        return Handler
+
+
+def completion_body(completion: str, payload: dict) -> dict:
+    prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+    return {
+        "id": "mock-completion",
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": completion}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(completion) // 4,
+            "total_tokens": (prompt_chars + len(completion)) // 4,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock OpenRouter server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--completion-file", required=True, nargs="+",
+                        help="File(s) whose content is returned as the completion, replayed in turn")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait per request")
+    args = parser.parse_args()
+
+    completion = []
+    for path in args.completion_file:
+        with open(path, "r", encoding="utf-8") as f:
+            completion.append(f.read())
+    server = MockOpenRouter(completion=completion, latency=args.latency, host=args.host, port=args.port)
+    print(f"✅ Mock OpenRouter listening on {server.url}")
+    try:
+        server.start()._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from utils.http_utils import CircuitBreaker, LLMError
+
+# Ordered "model=timeout_seconds" list; the first entry is the primary model.
+LLM_MODELS = os.getenv("LLM_MODELS", "x-ai/grok-4-fast:free=120,deepseek/deepseek-chat-v3.1:free=150")
+LLM_DEFAULT_MODEL_TIMEOUT = float(os.getenv("LLM_DEFAULT_MODEL_TIMEOUT", "180"))
+# Hedging: start the next model once the current one is slower than its p95.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "on")
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "60"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180, float("inf"))
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a window of recent samples for percentiles."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window: int = 500):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+        self.outcomes = {}
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, outcome: str = "ok"):
+        with self._lock:
+            self.total += 1
+            self.sum += seconds
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+            if outcome == "ok":
+                self._recent.append(seconds)
+
+    def percentile(self, q: float):
+        with self._lock:
+            samples = sorted(self._recent)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q * len(samples))) - 1))
+        return samples[index]
+
+    @property
+    def samples(self) -> int:
+        return len(self._recent)
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.total,
+            "sum": self.sum,
+            "outcomes": dict(self.outcomes),
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "buckets": {("+Inf" if b == float("inf") else str(b)): c for b, c in zip(self.buckets, self.counts)},
+        }
+
+
+def parse_models(spec: str) -> list:
+    """'a=60,b' -> [("a", 60.0), ("b", LLM_DEFAULT_MODEL_TIMEOUT)]"""
+    models = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, timeout = entry.partition("=")
+        models.append((name.strip(), float(timeout) if timeout else LLM_DEFAULT_MODEL_TIMEOUT))
+    return models
+
+
+class ModelRouter:
+    """
+    Tries an ordered list of models, falling back to the next one on error,
+    timeout or output rejected by `validate`. With hedging enabled, the next
+    model is also started when the current one runs past its observed p95
+    latency, and whichever valid answer arrives first wins.
+    """
+
+    def __init__(self, models: list, hedge: bool = LLM_HEDGE, hedge_default_delay: float = LLM_HEDGE_DEFAULT_DELAY,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = models
+        self.hedge = hedge
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.histograms = {name: LatencyHistogram() for name, _ in models}
+        # One breaker per model: the primary's failures must not trip the fallback.
+        self.breakers = {name: CircuitBreaker(name=name) for name, _ in models}
+        self._breakers_lock = threading.Lock()
+
+    @property
+    def primary_model(self) -> str:
+        return self.models[0][0]
+
+    @property
+    def name(self) -> str:
+        """Stable identifier for cache keys: the routed model list."""
+        return "router:" + ",".join(name for name, _ in self.models)
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        """Circuit breaker for `model` (created on first use for models outside the list)."""
+        with self._breakers_lock:
+            if model not in self.breakers:
+                self.breakers[model] = CircuitBreaker(name=model)
+            return self.breakers[model]
+
+    def hedge_delay(self, model: str) -> float:
+        histogram = self.histograms[model]
+        if histogram.samples < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return histogram.percentile(0.95)
+
+    def stats(self) -> dict:
+        return {name: {**histogram.snapshot(), "circuit": self.breaker(name).state}
+                for name, histogram in self.histograms.items()}
+
+    async def _attempt(self, call, model: str, timeout: float, validate):
+        started = time.monotonic()
+        try:
+            text = await asyncio.wait_for(call(model), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.histograms[model].record(time.monotonic() - started, "timeout")
+            raise TimeoutError(f"{model} timed out after {timeout:.0f}s")
+        except asyncio.CancelledError:
+            self.histograms[model].record(time.monotonic() - started, "cancelled")
+            raise
+        except Exception:
+            self.histograms[model].record(time.monotonic() - started, "error")
+            raise
+        if validate is not None and not validate(text):
+            self.histograms[model].record(time.monotonic() - started, "invalid")
+            raise ValueError(f"{model} returned output that failed validation")
+        self.histograms[model].record(time.monotonic() - started, "ok")
+        return text
+
+    async def complete(self, call, validate=None):
+        """
+        `call(model)` is a coroutine returning the completion text for one model.
+        Returns (text, model). Raises LLMError if every model fails.
+        """
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            if next_index >= len(self.models):
+                return False
+            model, timeout = self.models[next_index]
+            next_index += 1
+            pending[asyncio.ensure_future(self._attempt(call, model, timeout, validate))] = model
+            return True
+
+        launch()
+        try:
+            while pending:
+                can_hedge = self.hedge and next_index < len(self.models)
+                last_model = self.models[next_index - 1][0]
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=self.hedge_delay(last_model) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    print(f"⏱️ {last_model} is slow, hedging with the next model")
+                    launch()
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result(), model
+                    print(f"⚠️ Model {model} failed: {task.exception()}")
+                    errors.append(task.exception())
+                if not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise LLMError(f"All models failed; last error: {errors[-1]}") from errors[-1]
+
+    def complete_sync(self, call, validate=None):
+        """
+        Blocking fallback chain (no hedging); `call(model, timeout)` returns text
+        and must finish within `timeout` seconds, retries included. Raises LLMError.
+        """
+        last_error = None
+        for model, timeout in self.models:
+            started = time.monotonic()
+            try:
+                text = call(model, timeout)
+            except Exception as e:
+                self.histograms[model].record(time.monotonic() - started, "error")
+                print(f"⚠️ Model {model} failed: {e}")
+                last_error = e
+                continue
+            if validate is not None and not validate(text):
+                self.histograms[model].record(time.monotonic() - started, "invalid")
+                print(f"⚠️ Model {model} returned output that failed validation")
+                last_error = ValueError(f"{model} returned output that failed validation")
+                continue
+            self.histograms[model].record(time.monotonic() - started, "ok")
+            return text, model
+        raise LLMError(f"All models failed; last error: {last_error}") from last_error
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter(parse_models(LLM_MODELS))
+        return _router
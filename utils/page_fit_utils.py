@@ -0,0 +1,227 @@
+import os
+import re
+import threading
+
+from utils.http_utils import LLMError
+from utils.latex_validation_utils import LatexValidationError, is_valid_latex_document
+from utils.llm_utils import chat_completion, repair_latex
+from utils.pdf_and_latex_utils import compile_latex, compile_probe, save_latex_code
+from utils.latex_sandbox_utils import last_compile_error
+from utils.pdf_extract_utils import count_pdf_pages
+from utils.slot_utils import parse_slots
+from utils.relevance_utils import score_texts
+
+# 0 disables the page check.
+RESUME_MAX_PAGES = int(os.getenv("RESUME_MAX_PAGES", "1"))
+# Probe compiles allowed per document before giving up.
+PAGE_FIT_MAX_ITERATIONS = int(os.getenv("PAGE_FIT_MAX_ITERATIONS", "8"))
+# Bullets that may be dropped before asking the LLM to shorten the text instead.
+PAGE_FIT_MAX_BULLET_TRIMS = int(os.getenv("PAGE_FIT_MAX_BULLET_TRIMS", "3"))
+PAGE_FIT_LLM = os.getenv("PAGE_FIT_LLM", "1").lower() not in ("0", "false", "off")
+
+# Tightening steps, cheapest first: each replaces the previous one.
+SPACING_STEPS = (
+    "\\linespread{0.97}\\selectfont",
+    "\\linespread{0.94}\\selectfont",
+    "\\linespread{0.9}\\selectfont\\small",
+)
+_SPACING_MARKER = "% page-fit spacing"
+_BULLET_LINE_PREFIX = re.compile(r"[ \t]*\\(resumeItem|resumeSubItem)\s*\{$")
+_LIST_START = re.compile(r"\\resumeItemListStart|\\begin\{(itemize|enumerate)\}")
+
+_totals = {"documents": 0, "overflowing": 0, "fitted": 0, "iterations": 0, "llm_calls": 0}
+_totals_lock = threading.Lock()
+
+
+def tighten_spacing(latex: str, step: int) -> str:
+    """Put SPACING_STEPS[step] right after \\begin{document}, replacing an earlier step."""
+    latex = re.sub(r"\n[^\n]*" + re.escape(_SPACING_MARKER), "", latex)
+    index = latex.find("\\begin{document}")
+    if index == -1:
+        return latex
+    index += len("\\begin{document}")
+    return latex[:index] + f"\n{SPACING_STEPS[step]} {_SPACING_MARKER}" + latex[index:]
+
+
+def _bullet_line(latex: str, slot: dict):
+    """Span of the whole line holding this bullet, or None if it shares the line with other code."""
+    line_start = latex.rfind("\n", 0, slot["start"]) + 1
+    line_end = latex.find("\n", slot["end"])
+    line_end = len(latex) if line_end == -1 else line_end
+    if not _BULLET_LINE_PREFIX.fullmatch(latex[line_start:slot["start"]]):
+        return None
+    if latex[slot["end"]:line_end].strip() != "}":
+        return None
+    return line_start, min(line_end + 1, len(latex))
+
+
+def score_bullets(latex: str, jd_text: str) -> list:
+    """Removable bullets as (score, slot), least relevant to the JD first."""
+    bullets = [slot for slot in parse_slots(latex) if slot["kind"] == "item" and _bullet_line(latex, slot)]
+    scores = score_texts([slot["text"] for slot in bullets], jd_text, latex=True)
+    scored = [(float(score), slot) for score, slot in zip(scores, bullets)]
+    # Ties go to the later bullet, which is usually the weaker one in its list.
+    return sorted(scored, key=lambda item: (item[0], -item[1]["start"]))
+
+
+def _list_key(latex: str, slot: dict) -> int:
+    """Offset of the list a bullet belongs to (the last list start before it)."""
+    starts = [m.start() for m in _LIST_START.finditer(latex, 0, slot["start"])]
+    return starts[-1] if starts else -1
+
+
+def trim_least_relevant_bullet(latex: str, jd_text: str, min_per_list: int = 1):
+    """Drop the least relevant bullet, keeping `min_per_list` in every list. None if nothing can go."""
+    scored = score_bullets(latex, jd_text)
+    per_list = {}
+    for _, slot in scored:
+        key = _list_key(latex, slot)
+        per_list[key] = per_list.get(key, 0) + 1
+    for _, slot in scored:
+        if per_list[_list_key(latex, slot)] <= min_per_list:
+            continue
+        start, end = _bullet_line(latex, slot)
+        print(f"✂️ Dropping bullet from '{slot['section']}': {slot['text'][:60]}")
+        return latex[:start] + latex[end:]
+    return None
+
+
+def build_shorten_prompt(latex: str, pages: int, max_pages: int) -> str:
+    return f"""
+You are a LaTeX resume expert. This resume compiles to {pages} pages but must fit on {max_pages} page(s).
+
+Shorten the content until it fits:
+- Tighten bullet wording and drop the least important details first.
+- Do NOT invent anything and do NOT change LaTeX packages, formatting or commands.
+- Return the **full LaTeX code**, ready to compile. Do NOT return JSON or extra commentary.
+
+LaTeX:
+{latex}
+"""
+
+
+def _probe_pages(latex: str):
+    data = compile_probe(latex)
+    return count_pdf_pages(data=data) if data else None
+
+
+def fit_to_pages(latex: str, jd_text: str, api_key: str = None, max_pages: int = RESUME_MAX_PAGES,
+                 pages: int = None, max_iterations: int = PAGE_FIT_MAX_ITERATIONS):
+    """
+    Shrink `latex` until it compiles to at most `max_pages` pages, measuring
+    each candidate with a single-pass probe compile. Strategies, cheapest
+    first: tighter line spacing, dropping the bullets least relevant to the JD,
+    and finally one LLM call to shorten the text (if PAGE_FIT_LLM and an API
+    key are available). Returns (latex, stats); the latex is the shortest
+    candidate found, even if it still overflows.
+    """
+    stats = {"pages_before": pages, "pages": pages, "iterations": 0, "steps": [], "llm_calls": 0}
+    if pages is None:
+        pages = stats["pages_before"] = stats["pages"] = _probe_pages(latex)
+        stats["iterations"] += 1
+    best = (pages, latex)
+    latest = latex
+
+    def candidates():
+        for step in range(len(SPACING_STEPS)):
+            yield f"spacing {step + 1}", tighten_spacing(latex, step)
+        trimmed = tighten_spacing(latex, len(SPACING_STEPS) - 1)
+        for _ in range(PAGE_FIT_MAX_BULLET_TRIMS):
+            trimmed = trim_least_relevant_bullet(trimmed, jd_text)
+            if trimmed is None:
+                break
+            yield "trim bullet", trimmed
+        if PAGE_FIT_LLM and api_key:
+            try:
+                stats["llm_calls"] += 1
+                # Start from the most compressed local candidate.
+                shortened = chat_completion(build_shorten_prompt(latest, best[0], max_pages), api_key,
+                                            validate=is_valid_latex_document)
+                yield "llm shorten", repair_latex(shortened, latex, api_key)
+            except (LLMError, LatexValidationError) as e:
+                print(f"⚠️ LLM shortening failed: {e}")
+
+    if pages is not None and pages > max_pages:
+        for step, candidate in candidates():
+            if stats["iterations"] >= max_iterations:
+                break
+            stats["iterations"] += 1
+            stats["steps"].append(step)
+            latest = candidate
+            candidate_pages = _probe_pages(candidate)
+            if candidate_pages is None:
+                continue
+            if candidate_pages < best[0]:
+                best = (candidate_pages, candidate)
+            if candidate_pages <= max_pages:
+                break
+
+    stats["pages"] = best[0]
+    with _totals_lock:
+        _totals["documents"] += 1
+        _totals["iterations"] += stats["iterations"]
+        _totals["llm_calls"] += stats["llm_calls"]
+        if stats["pages_before"] is not None and stats["pages_before"] > max_pages:
+            _totals["overflowing"] += 1
+            if best[0] <= max_pages:
+                _totals["fitted"] += 1
+    return best[1], stats
+
+
+def compile_to_page_limit(latex: str, jd_text: str, api_key: str = None, max_pages: int = RESUME_MAX_PAGES,
+                          source_dir: str = None):
+    """
+    Compile `latex` in memory; if the PDF is longer than `max_pages`, fit it
+    with fit_to_pages and compile again.
+    Returns (pdf_bytes, latex, stats); if compilation failed, pdf_bytes is None
+    and stats["compile_error"] holds the parsed pdflatex error.
+    """
+    pdf = compile_latex(latex, source_dir)
+    if not pdf:
+        return None, latex, {"compile_error": last_compile_error()}
+    if max_pages <= 0:
+        return pdf, latex, None
+
+    pages = count_pdf_pages(data=pdf)
+    if pages <= max_pages:
+        with _totals_lock:
+            _totals["documents"] += 1
+        return pdf, latex, {"pages_before": pages, "pages": pages, "iterations": 0, "steps": [], "llm_calls": 0}
+
+    print(f"📄 Resume is {pages} pages, fitting it to {max_pages}")
+    fitted, stats = fit_to_pages(latex, jd_text, api_key, max_pages, pages=pages)
+    print(f"📄 Page fit: {stats['pages_before']} -> {stats['pages']} pages "
+          f"in {stats['iterations']} probe(s) ({', '.join(stats['steps']) or 'no changes'})")
+    if fitted == latex:
+        return pdf, latex, stats
+    pdf = compile_latex(fitted, source_dir)
+    if not pdf:
+        stats["compile_error"] = last_compile_error()
+    return pdf, fitted, stats
+
+
+def enforce_page_limit(latex_path: str, jd_text: str, api_key: str = None, max_pages: int = RESUME_MAX_PAGES):
+    """
+    compile_to_page_limit for a .tex file: rewrites `latex_path` if it was
+    fitted and writes the PDF next to it.
+    Returns (pdf_path, latex, stats); pdf_path is None if compilation failed.
+    """
+    with open(latex_path, "r", encoding="utf-8") as f:
+        latex = f.read()
+    source_dir = os.path.dirname(os.path.abspath(latex_path))
+    pdf, fitted, stats = compile_to_page_limit(latex, jd_text, api_key, max_pages, source_dir)
+    if fitted != latex:
+        save_latex_code(fitted, latex_path)
+    if not pdf:
+        return None, fitted, stats
+
+    pdf_path = os.path.splitext(latex_path)[0] + ".pdf"
+    with open(pdf_path, "wb") as f:
+        f.write(pdf)
+    print(f"✅ Successfully created PDF: '{pdf_path}'")
+    return pdf_path, fitted, stats
+
+
+def page_fit_totals() -> dict:
+    with _totals_lock:
+        return dict(_totals)
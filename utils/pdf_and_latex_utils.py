@@ -1,12 +1,65 @@
-import fitz
 import subprocess
 import os
+import hashlib
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
 
-def read_pdf(pdf_path:str)->str:
-    doc=fitz.open(pdf_path)
-    page=doc[0]
-    content=page.get_text()
-    return content
+from utils.pdf_extract_utils import extract_pdf_text
+from utils.metrics_utils import compile_failures, pdf_cache_hits, stage_timer
+from utils.latex_format_utils import LATEX_WARM_WORKERS, discard_format, ensure_format, format_env, warm_pool
+from utils.latex_sandbox_utils import (
+    clear_compile_error,
+    compile_failure,
+    format_latex_error,
+    last_compile_error,
+    pdflatex_command,
+    run_pdflatex,
+)
+
+LATEX_CACHE_DIR = os.getenv("LATEX_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume_tailor_latex"))
+LATEX_BUILD_CACHE = os.getenv("LATEX_BUILD_CACHE", "1").lower() not in ("0", "false", "off")
+LATEX_PDF_CACHE_MAX_FILES = int(os.getenv("LATEX_PDF_CACHE_MAX_FILES", "256"))
+# Preambles whose work dirs each process keeps; the least recently used beyond this are deleted.
+LATEX_WORKDIR_MAX_TEMPLATES = int(os.getenv("LATEX_WORKDIR_MAX_TEMPLATES", "32"))
+
+
+def _default_scratch_dir() -> str:
+    # /dev/shm is a tmpfs on Linux, so compile scratch files never reach the disk.
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return os.path.join("/dev/shm", "resume_tailor_latex")
+    return os.path.join(tempfile.gettempdir(), "resume_tailor_latex")
+
+
+# Work dirs for compiles that only need to hand back PDF bytes.
+LATEX_SCRATCH_DIR = os.getenv("LATEX_SCRATCH_DIR", _default_scratch_dir())
+
+# Files that feed information from one pdflatex pass into the next.
+_PASS_STATE_EXTENSIONS = (".aux", ".out")
+
+# template key -> slot locks, least recently used first.
+_workdir_slots = OrderedDict()
+_orphans_removed = False
+_workdir_slots_guard = threading.Lock()
+
+
+def read_pdf(pdf_path:str=None, data:bytes=None)->str:
+    """Text of every page, from a path or in-memory PDF bytes (see utils/pdf_extract_utils.py)."""
+    return extract_pdf_text(pdf_path=pdf_path, data=data)
+
+
+def pdflatex_version() -> Optional[str]:
+    """First line of `pdflatex --version`, or None if pdflatex is missing or broken."""
+    try:
+        result = subprocess.run(["pdflatex", "--version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout.splitlines()[0]
 
 
 def save_latex_code(latex:str,save_path:str):
@@ -14,6 +67,230 @@ def save_latex_code(latex:str,save_path:str):
         f.write(latex)
 
 
+def _sha256(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_preamble(latex: str) -> str:
+    """Everything before \\begin{document} (the whole source if there is none)."""
+    index = latex.find("\\begin{document}")
+    return latex if index == -1 else latex[:index]
+
+
+def _pass_state_digest(directory: str, jobname: str) -> str:
+    """Hash of the auxiliary files pdflatex reads back on the next pass."""
+    digest = hashlib.sha256()
+    for ext in _PASS_STATE_EXTENSIONS:
+        path = os.path.join(directory, jobname + ext)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(ext.encode() + f.read())
+    return digest.hexdigest()
+
+
+def _run_pdflatex(directory: str, filename: str, pass_number: int, env=None, fmt=None) -> bool:
+    with stage_timer("pdflatex"):
+        return _run_pdflatex_pass(directory, filename, pass_number, env, fmt)
+
+
+def _run_pdflatex_pass(directory: str, filename: str, pass_number: int, env=None, fmt=None) -> bool:
+    # Sandboxed: time, CPU and memory limits, no shell escape (see utils/latex_sandbox_utils.py).
+    try:
+        if fmt and LATEX_WARM_WORKERS:
+            result = warm_pool.run(directory, filename, fmt, env)
+        else:
+            result = run_pdflatex(pdflatex_command(filename, directory, fmt), directory, env)
+    except FileNotFoundError:
+        print("❌ Error: 'pdflatex' command not found.")
+        print("Please ensure you have a LaTeX distribution (like MiKTeX, TeX Live) installed and in your system's PATH.")
+        return False
+
+    if not result["ok"]:
+        print(f"❌ LaTeX compilation failed on pass {pass_number}: {format_latex_error(result['error'])}")
+    return result["ok"]
+
+
+def _work_dir(template_key: str, index: int) -> str:
+    return os.path.join(LATEX_SCRATCH_DIR, "work", f"{template_key}-{os.getpid()}-{index}")
+
+
+def _evict_work_dirs():
+    """
+    Delete the work dirs of the least recently used templates beyond
+    LATEX_WORKDIR_MAX_TEMPLATES, skipping any with a build in progress.
+    Caller holds _workdir_slots_guard.
+    """
+    for template_key in list(_workdir_slots):
+        if len(_workdir_slots) <= max(LATEX_WORKDIR_MAX_TEMPLATES, 1):
+            return
+        slots = _workdir_slots[template_key]
+        held = [lock for lock in slots if lock.acquire(blocking=False)]
+        if len(held) < len(slots):
+            for lock in held:
+                lock.release()
+            continue
+        del _workdir_slots[template_key]
+        for index in range(len(slots)):
+            work_dir = _work_dir(template_key, index)
+            warm_pool.discard(work_dir)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _remove_orphaned_work_dirs():
+    """Delete work dirs left behind by processes that have exited (restarts, retired pool workers)."""
+    root = os.path.join(LATEX_SCRATCH_DIR, "work")
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        try:
+            pid = int(name.split("-")[1])
+            os.kill(pid, 0)
+        except (IndexError, ValueError):
+            continue
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except OSError:
+            continue
+
+
+@contextmanager
+def _acquire_work_dir(template_key: str):
+    """
+    Check out a persistent work dir for a template. Concurrent builds of the
+    same template get separate slots, and the pid keeps worker processes apart.
+    """
+    global _orphans_removed
+    with _workdir_slots_guard:
+        if not _orphans_removed:
+            _orphans_removed = True
+            _remove_orphaned_work_dirs()
+        slots = _workdir_slots.setdefault(template_key, [])
+        _workdir_slots.move_to_end(template_key)
+        for index, lock in enumerate(slots):
+            if lock.acquire(blocking=False):
+                break
+        else:
+            index = len(slots)
+            lock = threading.Lock()
+            lock.acquire()
+            slots.append(lock)
+        _evict_work_dirs()
+
+    work_dir = _work_dir(template_key, index)
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        yield work_dir
+    finally:
+        lock.release()
+
+
+def _store_cached_pdf(pdf: bytes, cached_pdf_path: str):
+    os.makedirs(os.path.dirname(cached_pdf_path), exist_ok=True)
+    tmp_path = f"{cached_pdf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp_path, cached_pdf_path)
+
+    cache_dir = os.path.dirname(cached_pdf_path)
+    entries = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".pdf")]
+    if len(entries) > LATEX_PDF_CACHE_MAX_FILES:
+        entries.sort(key=os.path.getmtime)
+        for stale in entries[:len(entries) - LATEX_PDF_CACHE_MAX_FILES]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _compile_in_place(directory: str, filename: str):
+    for i in range(2):
+        if not _run_pdflatex(directory, filename, i + 1):
+            return None
+    return os.path.join(directory, os.path.splitext(filename)[0] + '.pdf')
+
+
+def _compile_in_work_dir(source: str, source_dir: Optional[str] = None) -> Optional[bytes]:
+    """
+    Compile inside a persistent work dir reused by every document with the same
+    preamble, so .aux/.out from the previous build carry over. The second pass
+    only runs when the first one changed them. Returns the PDF bytes.
+    """
+    jobname = "document"
+
+    # Let \input / \includegraphics still resolve files next to the original .tex.
+    env = dict(os.environ)
+    if source_dir:
+        env["TEXINPUTS"] = source_dir + os.pathsep + env.get("TEXINPUTS", "")
+
+    # Precompiled preamble, if enabled (see utils/latex_format_utils.py).
+    fmt = ensure_format(source, env)
+    fmt_env = format_env(env) if fmt else env
+
+    with _acquire_work_dir(_sha256(get_preamble(source))[:16]) as work_dir:
+        save_latex_code(source, os.path.join(work_dir, jobname + ".tex"))
+        built_pdf = os.path.join(work_dir, jobname + ".pdf")
+        if os.path.exists(built_pdf):
+            os.remove(built_pdf)
+
+        ok = _run_passes(work_dir, jobname, fmt_env, fmt)
+        if not ok and fmt:
+            print("⚠️ Retrying without the precompiled format")
+            ok = _run_passes(work_dir, jobname, env, None)
+            if ok:
+                discard_format(fmt)
+        if not ok:
+            return None
+        if not os.path.exists(built_pdf):
+            print("❌ Error: PDF file was not generated, even though compilation reported success.")
+            return None
+        with open(built_pdf, "rb") as f:
+            return f.read()
+
+
+def _compile_cached(source: str, source_dir: Optional[str] = None) -> Optional[bytes]:
+    """PDF bytes for `source`, from the PDF cache or a work-dir build that is then cached."""
+    cached_pdf_path = os.path.join(LATEX_CACHE_DIR, "pdf", _sha256(source) + ".pdf")
+    if os.path.exists(cached_pdf_path):
+        try:
+            with open(cached_pdf_path, "rb") as f:
+                pdf = f.read()
+            pdf_cache_hits.inc()
+            print("♻️ Reused cached PDF for identical LaTeX source")
+            return pdf
+        except OSError:
+            pass  # evicted by another worker in the meantime
+
+    pdf = _compile_in_work_dir(source, source_dir)
+    if pdf:
+        _store_cached_pdf(pdf, cached_pdf_path)
+    return pdf
+
+
+def _run_passes(work_dir: str, jobname: str, env: dict, fmt) -> bool:
+    state_before = _pass_state_digest(work_dir, jobname)
+    if not _run_pdflatex(work_dir, jobname + ".tex", 1, env=env, fmt=fmt):
+        _discard_pass_state(work_dir, jobname)
+        return False
+
+    if _pass_state_digest(work_dir, jobname) != state_before:
+        if not _run_pdflatex(work_dir, jobname + ".tex", 2, env=env, fmt=fmt):
+            _discard_pass_state(work_dir, jobname)
+            return False
+    return True
+
+
+def _discard_pass_state(work_dir: str, jobname: str):
+    # A failed run can leave half-written aux files behind; start clean next time.
+    for ext in _PASS_STATE_EXTENSIONS:
+        path = os.path.join(work_dir, jobname + ext)
+        if os.path.exists(path):
+            os.remove(path)
+
+
 def latex_to_pdf(latex_file_path: str):
 
     directory=os.path.dirname(latex_file_path)
@@ -22,40 +299,91 @@ def latex_to_pdf(latex_file_path: str):
     if directory=='':
         directory='.'
 
-     
-    commands=['pdflatex','-interaction=nonstopmode',f'-output-directory={directory}',filename]
-
-    for i in range(2):
+    if not LATEX_BUILD_CACHE:
+        pdf_path = _compile_in_place(directory, filename)
+    else:
+        with open(latex_file_path, "r", encoding="utf-8") as f:
+            source = f.read()
 
-        try:
-            result=subprocess.run(
-            commands,   
-            cwd=directory,
-            capture_output=True,
-            text=True,
-            check=True)
-
-        except FileNotFoundError:
-            print("❌ Error: 'pdflatex' command not found.")
-            print("Please ensure you have a LaTeX distribution (like MiKTeX, TeX Live) installed and in your system's PATH.")
-            return None
-        
-        except subprocess.CalledProcessError as e:
-            # This block catches errors from the pdflatex compilation itself.
-            print(f"❌ LaTeX compilation failed on pass {i + 1}.")
-            print("----------------- LaTeX Error Log -----------------")
-            # The error log from LaTeX is the most useful part for debugging.
-            print(e.stdout)
-            print("---------------------------------------------------")
-            return None
-        
-    pdf_filename=os.path.splitext(filename)[0]+'.pdf'
-    pdf_path=os.path.join(directory,pdf_filename)
+        pdf = _compile_cached(source, os.path.dirname(os.path.abspath(latex_file_path)))
+        pdf_path = None
+        if pdf:
+            pdf_path = os.path.join(directory, os.path.splitext(filename)[0] + '.pdf')
+            with open(pdf_path, "wb") as f:
+                f.write(pdf)
 
-    if os.path.exists(pdf_path):
+    if pdf_path is None:
+           compile_failures.inc()
+           return None
+    elif os.path.exists(pdf_path):
            print(f"✅ Successfully created PDF: '{pdf_path}'")
            return pdf_path
     else:
            print("❌ Error: PDF file was not generated, even though compilation reported success.")
+           compile_failures.inc()
            return None
-        
+
+
+def compile_probe(latex: str) -> Optional[bytes]:
+    """
+    Single pdflatex pass in the template's work dir, skipping the second pass
+    and the PDF cache. Good enough for measuring layout (e.g. the page count)
+    between edits; returns the PDF bytes or None.
+    """
+    env = dict(os.environ)
+    fmt = ensure_format(latex, env)
+    if fmt:
+        env = format_env(env)
+
+    with _acquire_work_dir(_sha256(get_preamble(latex))[:16]) as work_dir:
+        save_latex_code(latex, os.path.join(work_dir, "document.tex"))
+        built_pdf = os.path.join(work_dir, "document.pdf")
+        if os.path.exists(built_pdf):
+            os.remove(built_pdf)
+        if not _run_pdflatex(work_dir, "document.tex", 1, env=env, fmt=fmt):
+            _discard_pass_state(work_dir, "document")
+            return None
+        if not os.path.exists(built_pdf):
+            return None
+        with open(built_pdf, "rb") as f:
+            return f.read()
+
+
+def compile_latex(latex: str, source_dir: Optional[str] = None) -> Optional[bytes]:
+    """
+    Compile LaTeX source and return the PDF bytes (None on failure), without
+    writing anything outside the scratch dir (LATEX_SCRATCH_DIR, a tmpfs where
+    available). Module-level and path-free, so it can be submitted to a
+    ProcessPoolExecutor. The parsed pdflatex error of a failure is then
+    available from last_compile_error() on the same thread.
+    """
+    clear_compile_error()
+    if LATEX_BUILD_CACHE:
+        pdf = _compile_cached(latex, source_dir)
+    else:
+        os.makedirs(LATEX_SCRATCH_DIR, exist_ok=True)
+        temp_dir = tempfile.mkdtemp(dir=LATEX_SCRATCH_DIR)
+        try:
+            save_latex_code(latex, os.path.join(temp_dir, "tailored.tex"))
+            pdf_path = _compile_in_place(temp_dir, "tailored.tex")
+            pdf = None
+            if pdf_path and os.path.exists(pdf_path):
+                with open(pdf_path, "rb") as f:
+                    pdf = f.read()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if pdf is None:
+        compile_failures.inc()
+    return pdf
+
+
+def compile_latex_or_raise(latex: str, source_dir: Optional[str] = None) -> bytes:
+    """
+    compile_latex, raising LatexCompileError with the parsed pdflatex error on
+    failure (LatexUnavailableError when pdflatex is not installed).
+    """
+    pdf = compile_latex(latex, source_dir)
+    if pdf is None:
+        raise compile_failure(last_compile_error())
+    return pdf
@@ -0,0 +1,159 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.cache_utils import build_cache_from_env
+
+# Documents with at least this many pages are split across worker processes.
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# A side must hold this share of the page's text for the page to count as two-column.
+TWO_COLUMN_MIN_SHARE = 0.25
+
+_text_cache = build_cache_from_env("PDF_TEXT_CACHE")
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _open_document(pdf_path: str = None, data: bytes = None):
+    import fitz  # PyMuPDF takes ~150ms to import; only pay for it once a PDF is opened
+
+    if data is not None:
+        return fitz.open(stream=data, filetype="pdf")
+    return fitz.open(pdf_path)
+
+
+def _rows(blocks: list) -> list:
+    """Group blocks sharing a baseline band into rows, read left to right."""
+    rows = []
+    for block in sorted(blocks, key=lambda b: (b["bbox"][1], b["bbox"][0])):
+        x0, y0, x1, y1 = block["bbox"]
+        if rows:
+            row_top, row_bottom = rows[-1]["top"], rows[-1]["bottom"]
+            overlap = min(y1, row_bottom) - max(y0, row_top)
+            if overlap > 0.5 * min(y1 - y0, row_bottom - row_top):
+                rows[-1]["blocks"].append(block)
+                rows[-1]["bottom"] = max(row_bottom, y1)
+                continue
+        rows.append({"top": y0, "bottom": y1, "blocks": [block]})
+    return [block for row in rows for block in sorted(row["blocks"], key=lambda b: b["bbox"][0])]
+
+
+def order_blocks(blocks: list, page_width: float) -> list:
+    """
+    Reading order for one page. Two-column layouts (enough text entirely on
+    each side of the centre line) read full-width headers, then the left
+    column, then the right one. Everything else is read row by row, which
+    keeps right-aligned dates next to the heading they belong to.
+    """
+    middle = page_width / 2
+    left = [b for b in blocks if b["bbox"][2] <= middle]
+    right = [b for b in blocks if b["bbox"][0] >= middle]
+    total_chars = sum(len(b["text"]) for b in blocks) or 1
+    left_share = sum(len(b["text"]) for b in left) / total_chars
+    right_share = sum(len(b["text"]) for b in right) / total_chars
+
+    if left_share < TWO_COLUMN_MIN_SHARE or right_share < TWO_COLUMN_MIN_SHARE:
+        return _rows(blocks)
+
+    columns_top = min(b["bbox"][1] for b in left + right)
+    spanning = [b for b in blocks if b not in left and b not in right]
+    header = [b for b in spanning if b["bbox"][3] <= columns_top]
+    footer = [b for b in spanning if b["bbox"][3] > columns_top]
+    return _rows(header) + _rows(left) + _rows(right) + _rows(footer)
+
+
+def _extract_page_range(pdf_path: str, data: bytes, first_page: int, last_page: int) -> list:
+    """Blocks for pages [first_page, last_page); module-level so worker processes can run it."""
+    blocks = []
+    with _open_document(pdf_path, data) as doc:
+        for page_number in range(first_page, last_page):
+            page = doc[page_number]
+            page_blocks = [
+                {"page": page_number, "bbox": tuple(block[:4]), "text": block[4].strip()}
+                for block in page.get_text("blocks")
+                if block[6] == 0 and block[4].strip()
+            ]
+            blocks.extend(order_blocks(page_blocks, page.rect.width))
+    return blocks
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    """
+    Worker processes for large PDFs, shared by every caller and started on
+    first use. They are spawned rather than forked: forking a server that is
+    already running threads can copy a lock some other thread holds.
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return _extract_pool
+
+
+def _discard_extract_pool(pool: ProcessPoolExecutor):
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is pool:
+            _extract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_blocks(pdf_path: str = None, data: bytes = None, parallel: bool = None) -> list:
+    """
+    Text blocks of every page, in reading order:
+        [{"page": int, "bbox": (x0, y0, x1, y1), "text": str}, ...]
+    Accepts a path or the PDF bytes. Large documents are split across
+    processes unless `parallel` is False.
+    """
+    with _open_document(pdf_path, data) as doc:
+        page_count = len(doc)
+
+    if parallel is None:
+        parallel = page_count >= PDF_PARALLEL_MIN_PAGES and PDF_EXTRACT_WORKERS > 1
+    if not parallel:
+        return _extract_page_range(pdf_path, data, 0, page_count)
+
+    chunk = -(-page_count // PDF_EXTRACT_WORKERS)
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    pool = get_extract_pool()
+    try:
+        futures = [pool.submit(_extract_page_range, pdf_path, data, start, end) for start, end in ranges]
+        return [block for future in futures for block in future.result()]
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); replace the pool for next time, extract here for now.
+        print("⚠️ PDF extraction workers died; extracting in-process")
+        _discard_extract_pool(pool)
+        return _extract_page_range(pdf_path, data, 0, page_count)
+
+
+def extract_pdf_text(pdf_path: str = None, data: bytes = None) -> str:
+    """Plain text of the whole document, cached by the SHA-256 of the PDF bytes."""
+    if data is None:
+        with open(pdf_path, "rb") as f:
+            data = f.read()
+
+    key = hashlib.sha256(data).hexdigest()
+    cached = _text_cache.get(key)
+    if cached is not None:
+        return cached
+
+    blocks = extract_pdf_blocks(data=data)
+    pages = []
+    for block in blocks:
+        if not pages or pages[-1][0] != block["page"]:
+            pages.append((block["page"], []))
+        pages[-1][1].append(block["text"])
+    text = "\n\n".join("\n".join(texts) for _, texts in pages) + "\n"
+    _text_cache.set(key, text)
+    return text
+
+
+def count_pdf_pages(pdf_path: str = None, data: bytes = None) -> int:
+    with _open_document(pdf_path, data) as doc:
+        return len(doc)
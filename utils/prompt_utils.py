@@ -0,0 +1,198 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+from utils.relevance_utils import rank_texts
+from utils.text_utils import strip_latex, tokenize
+
+PROMPT_COMPACTION = os.getenv("PROMPT_COMPACTION", "1").lower() not in ("0", "false", "off")
+# Budget for the whole user prompt (instructions + JD + template + resume), in estimated tokens.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "8000"))
+# Fixed instructions in build_tailoring_prompt, roughly.
+PROMPT_OVERHEAD_TOKENS = 450
+# The JD is never cut below this, even when the template alone exceeds the budget.
+PROMPT_MIN_JD_TOKENS = int(os.getenv("PROMPT_MIN_JD_TOKENS", "300"))
+# Likewise for the resume text: the model always gets at least this much of it.
+PROMPT_MIN_RESUME_TOKENS = int(os.getenv("PROMPT_MIN_RESUME_TOKENS", "600"))
+
+# "About ..." headings that introduce the role or the candidate, never a company blurb.
+_ABOUT_ROLE = r"(you\b|your(self)?\b|this\b|the (role|job|position|internship|opportunity)\b)"
+# Section headings whose whole section is boilerplate. A company name after "About" must be capitalized.
+_BOILERPLATE_HEADINGS = re.compile(
+    rf"^\s*(about (?!{_ABOUT_ROLE})(us|the company|the team|(?-i:[A-Z][\w&.\-]*( [A-Z][\w&.\-]*){{0,4}}))\b|"
+    r"benefits|perks( and benefits)?|what we offer|"
+    r"why (join|work)|equal (employment )?opportunit|eeo|diversity|our (values|culture|mission)|"
+    r"compensation|salary|how to apply|activity on)\b",
+    re.IGNORECASE,
+)
+# Lines that are whole EEO/legal sentences, wherever they appear.
+_BOILERPLATE_LINES = re.compile(
+    r"\b(is an|are an|proud to be an) equal (employment )?opportunity( and affirmative action)? employer\b|"
+    r"\baffirmative action employer\b|\bwithout regard to (race|color|religion|sex|age|gender)\b|"
+    r"\bregardless of (race|color|religion|sex|age|gender)\b|\bprotected veteran status\b|"
+    r"\b(request|need|provide|require) (a )?reasonable accommodations?\b|"
+    r"\bsubject to (a |the )?(successful )?background checks?\b|\bparticipates? in e-verify\b",
+    re.IGNORECASE,
+)
+# Benefits: a line offering benefits, or a line that is nothing but a list of them.
+_BENEFIT = (r"(medical|health|dental|vision|life|disability)( insurance| coverage| plans?)?|"
+            r"401\(?k\)?( match(ing)?)?|paid time off|pto|paid (holidays|parental leave)|parental leave")
+_BENEFIT_LINES = re.compile(
+    rf"\b(we offer|benefits include|you('ll| will) (get|receive|enjoy))\b.*\b({_BENEFIT})(?!\w)|"
+    rf"^\W*({_BENEFIT})((\s*[,/&]\s*(and\s+)?|\s+and\s+)({_BENEFIT}))+\W*$",
+    re.IGNORECASE,
+)
+
+_token_pieces = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+
+_totals = {"requests": 0, "tokens_before": 0, "tokens_after": 0}
+_totals_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate close to BPE tokenizers: long words cost ~1 token per 4 chars."""
+    return sum(max(1, math.ceil(len(piece) / 4)) if piece[0].isalpha() else max(1, math.ceil(len(piece) / 3))
+               for piece in _token_pieces.findall(text or ""))
+
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip()
+    return 0 < len(stripped) <= 60 and (stripped.endswith(":") or not stripped.endswith("."))
+
+
+def strip_jd_boilerplate(jd_text: str) -> str:
+    """Drop benefits/EEO/company-blurb sections and lines that say nothing about the role."""
+    kept = []
+    skipping = False
+    for line in jd_text.splitlines():
+        stripped = line.strip()
+        if _is_heading(stripped) and _BOILERPLATE_HEADINGS.match(stripped):
+            # "Perks: Certificate" style lines carry their content inline; drop just the line.
+            skipping = stripped.endswith(":")
+            continue
+        if skipping:
+            if not stripped:
+                continue
+            if _is_heading(stripped) and stripped.endswith(":"):
+                skipping = False
+            else:
+                continue
+        if _BOILERPLATE_LINES.search(stripped) or _BENEFIT_LINES.search(stripped):
+            continue
+        kept.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+
+def _normalize(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+def dedupe_resume_text(resume_text: str, latex_code: str) -> str:
+    """Remove resume lines whose content is already spelled out in the LaTeX template."""
+    template_text = _normalize(strip_latex(latex_code))
+    kept = []
+    for line in resume_text.splitlines():
+        normalized = _normalize(line)
+        if len(normalized.split()) >= 3 and normalized in template_text:
+            continue
+        kept.append(line)
+    return "\n".join(kept).strip()
+
+
+def _sentences(text: str) -> list:
+    parts = re.split(r"(?<=[.!?;])\s+|\n+", text)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def rank_jd_sentences(jd_text: str) -> list:
+    """
+    JD sentences ranked by TF-IDF weight of their terms (TF over the whole JD,
+    IDF over its sentences), highest first, as (score, position, sentence).
+    """
+    sentences = _sentences(jd_text)
+    tokenized = [set(tokenize(sentence)) for sentence in sentences]
+    term_frequency = Counter(tokenize(jd_text))
+    document_frequency = Counter(term for terms in tokenized for term in terms)
+    count = len(sentences) or 1
+
+    ranked = []
+    for position, (sentence, terms) in enumerate(zip(sentences, tokenized)):
+        score = sum(term_frequency[t] * math.log(1 + count / document_frequency[t]) for t in terms)
+        ranked.append((score / math.sqrt(len(terms) or 1), position, sentence))
+    return sorted(ranked, key=lambda item: (-item[0], item[1]))
+
+
+def extract_key_requirements(jd_text: str, token_budget: int) -> str:
+    """Highest-ranked JD sentences that fit in `token_budget`, in their original order."""
+    chosen = []
+    seen = set()
+    used = 0
+    for score, position, sentence in rank_jd_sentences(jd_text):
+        cost = estimate_tokens(sentence)
+        if used + cost > token_budget or _normalize(sentence) in seen:
+            continue
+        seen.add(_normalize(sentence))
+        chosen.append((position, sentence))
+        used += cost
+    return "\n".join(sentence for _, sentence in sorted(chosen))
+
+
+def trim_resume_text(resume_text: str, jd_text: str, token_budget: int) -> str:
+    """Keep the resume lines most relevant to the JD (see utils/relevance_utils.py) that fit in `token_budget`."""
+    lines = [line for line in resume_text.splitlines() if line.strip()]
+    chosen = []
+    used = 0
+    for _, position in rank_texts(lines, jd_text):
+        line = lines[position]
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            continue
+        chosen.append((position, line))
+        used += cost
+    return "\n".join(line for _, line in sorted(chosen))
+
+
+def compact_prompt_inputs(resume_text: str, jd_text: str, latex_code: str,
+                          token_budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    Shrink the JD and resume text before they go into the prompt. The template
+    itself is never touched. Returns (resume_text, jd_text, stats).
+    """
+    template_tokens = estimate_tokens(latex_code)
+    before = PROMPT_OVERHEAD_TOKENS + template_tokens + estimate_tokens(jd_text) + estimate_tokens(resume_text)
+
+    jd_text = strip_jd_boilerplate(jd_text)
+    resume_text = dedupe_resume_text(resume_text, latex_code)
+
+    available = token_budget - PROMPT_OVERHEAD_TOKENS - template_tokens
+    jd_tokens = estimate_tokens(jd_text)
+    resume_tokens = estimate_tokens(resume_text)
+    if available < PROMPT_MIN_JD_TOKENS + PROMPT_MIN_RESUME_TOKENS:
+        print(f"⚠️ Template uses {template_tokens} of the {token_budget}-token prompt budget; "
+              f"keeping the minimum JD and resume text, the prompt will run over budget")
+    if jd_tokens + resume_tokens > available:
+        # Split what is left between JD and resume, JD first: it drives the tailoring.
+        jd_share = max(available // 2, available - resume_tokens, PROMPT_MIN_JD_TOKENS)
+        if jd_tokens > jd_share:
+            jd_text = extract_key_requirements(jd_text, max(jd_share, 0))
+            jd_tokens = estimate_tokens(jd_text)
+        if resume_tokens > available - jd_tokens:
+            resume_text = trim_resume_text(resume_text, jd_text, max(available - jd_tokens, PROMPT_MIN_RESUME_TOKENS))
+
+    after = PROMPT_OVERHEAD_TOKENS + template_tokens + estimate_tokens(jd_text) + estimate_tokens(resume_text)
+    stats = {"tokens_before": before, "tokens_after": after, "tokens_saved": before - after,
+             "over_budget": after > token_budget}
+    with _totals_lock:
+        _totals["requests"] += 1
+        _totals["tokens_before"] += before
+        _totals["tokens_after"] += after
+    return resume_text, jd_text, stats
+
+
+def compaction_totals() -> dict:
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["tokens_saved"] = totals["tokens_before"] - totals["tokens_after"]
+    return totals
@@ -0,0 +1,161 @@
+"""
+Local JD-resume relevance scoring, no LLM involved.
+
+Texts become hashed n-gram vectors (word unigrams and bigrams plus character
+trigrams of longer words, so "react" still meets "reactjs"), weighted by
+TF-IDF over the batch being scored, L2-normalized, and compared with the JD
+by cosine similarity in one NumPy matrix product. NumPy is imported on the
+first score, keeping it off the service's import path.
+"""
+import math
+import os
+import zlib
+from typing import TYPE_CHECKING
+
+from utils.text_utils import strip_latex, tokenize
+
+# Feature ids are hashed into 2**RELEVANCE_HASH_BITS buckets.
+RELEVANCE_HASH_BITS = int(os.getenv("RELEVANCE_HASH_BITS", "20"))
+# Character trigrams count for less than whole words.
+CHAR_NGRAM_WEIGHT = 0.3
+# JD terms checked for coverage in match_score.
+MATCH_KEYWORDS = 25
+# Best-matching resume lines listed in the tailoring prompt (0 disables the list).
+RELEVANCE_HINT_LINES = int(os.getenv("RELEVANCE_HINT_LINES", "8"))
+
+_HASH_MASK = (1 << RELEVANCE_HASH_BITS) - 1
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Words every JD uses that say nothing about the role; never reported as keywords.
+_JD_FILLER = frozenset("""
+ability able candidate candidates create experience good great help ideas including issues join knowledge
+looking new opportunity overview plus preferred required requirements responsibilities role skills strong
+team understanding using work working year years
+""".split())
+
+
+def _feature_id(key: str) -> int:
+    # crc32 rather than hash(): stable across processes, so scores are reproducible.
+    return zlib.crc32(key.encode("utf-8")) & _HASH_MASK
+
+
+def text_features(text: str, latex: bool = False) -> dict:
+    """Hashed n-gram counts of a text, as {feature id: weight}."""
+    tokens = tokenize(strip_latex(text) if latex else text)
+    features = {}
+
+    def add(key, weight):
+        feature = _feature_id(key)
+        features[feature] = features.get(feature, 0.0) + weight
+
+    for token in tokens:
+        add("w:" + token, 1.0)
+        if len(token) >= 4:
+            padded = f"<{token}>"
+            for i in range(len(padded) - 2):
+                add("c:" + padded[i:i + 3], CHAR_NGRAM_WEIGHT)
+    for first, second in zip(tokens, tokens[1:]):
+        add(f"b:{first} {second}", 1.0)
+    return features
+
+
+def tfidf_matrix(feature_rows: list) -> "np.ndarray":
+    """
+    Row-normalized TF-IDF matrix for a batch of feature dicts. Columns are the
+    hashed features present in the batch, so the matrix stays small.
+    """
+    import numpy as np
+
+    rows = np.repeat(np.arange(len(feature_rows)), [len(features) for features in feature_rows])
+    ids = np.fromiter((f for features in feature_rows for f in features), dtype=np.int64, count=len(rows))
+    weights = np.fromiter((w for features in feature_rows for w in features.values()), dtype=np.float64,
+                          count=len(rows))
+    columns, inverse = np.unique(ids, return_inverse=True)
+
+    matrix = np.zeros((len(feature_rows), len(columns)))
+    np.add.at(matrix, (rows, inverse), weights)
+    matrix = np.log1p(matrix)  # sublinear TF
+
+    document_frequency = np.count_nonzero(matrix, axis=0)
+    matrix *= np.log((1 + len(feature_rows)) / (1 + document_frequency)) + 1
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def score_texts(texts: list, jd_text: str, latex: bool = False) -> "np.ndarray":
+    """Cosine similarity of each text to the JD, in [0, 1]; `latex` strips markup from the texts first."""
+    import numpy as np
+
+    if not texts:
+        return np.zeros(0)
+    matrix = tfidf_matrix([text_features(jd_text)] + [text_features(text, latex) for text in texts])
+    return matrix[1:] @ matrix[0]
+
+
+def rank_texts(texts: list, jd_text: str, latex: bool = False) -> list:
+    """(score, index) for every text, most relevant first; ties keep document order."""
+    import numpy as np
+
+    scores = score_texts(texts, jd_text, latex)
+    order = np.lexsort((np.arange(len(texts)), -scores))
+    return [(float(scores[i]), int(i)) for i in order]
+
+
+def top_relevant_lines(resume_text: str, jd_text: str, limit: int = RELEVANCE_HINT_LINES) -> list:
+    """Up to `limit` resume lines that share anything with the JD, most relevant first (headings skipped)."""
+    lines = [line.strip() for line in resume_text.splitlines() if len(line.split()) >= 4]
+    if limit <= 0 or not lines:
+        return []
+    return [lines[i] for score, i in rank_texts(lines, jd_text)[:limit] if score > 0]
+
+
+def jd_keywords(jd_text: str, limit: int = MATCH_KEYWORDS) -> list:
+    """The JD's most distinctive single words, weighted by frequency and spread over its lines."""
+    lines = [line for line in jd_text.splitlines() if line.strip()] or [jd_text]
+    counts = {}
+    spread = {}
+    for line in lines:
+        terms = [term for term in tokenize(line) if term not in _JD_FILLER and not term.replace(".", "").isdigit()]
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term in set(terms):
+            spread[term] = spread.get(term, 0) + 1
+    # Terms on nearly every line are JD filler ("experience", "team"); favour concentrated ones.
+    weighted = sorted(counts, key=lambda t: (-counts[t] * math.log(1 + len(lines) / spread[t]), t))
+    return weighted[:limit]
+
+
+def match_score(resume_text: str, jd_text: str, items: list = None, top: int = 5) -> dict:
+    """
+    How well a resume matches a JD:
+        score      0-100, 60% keyword coverage + 40% whole-text similarity
+        similarity cosine of the whole resume vs the JD
+        coverage   share of the JD's top keywords found in the resume
+    plus the matched/missing keywords and the `top` best-matching `items`
+    (resume lines by default; pass bullet texts to rank those instead).
+    """
+    import numpy as np
+
+    items = items if items is not None else [line.strip() for line in resume_text.splitlines() if line.strip()]
+    scores = score_texts([resume_text] + items, jd_text)
+    similarity = float(scores[0]) if len(scores) else 0.0
+
+    keywords = jd_keywords(jd_text)
+    resume_terms = set(tokenize(resume_text))
+    matched = [k for k in keywords if k in resume_terms]
+    missing = [k for k in keywords if k not in resume_terms]
+    coverage = len(matched) / len(keywords) if keywords else 0.0
+
+    item_scores = scores[1:]
+    best = np.argsort(-item_scores, kind="stable")[:top]
+    return {
+        "score": round(100 * (0.6 * coverage + 0.4 * similarity), 1),
+        "similarity": round(similarity, 4),
+        "coverage": round(coverage, 4),
+        "matched_keywords": matched,
+        "missing_keywords": missing,
+        "top_items": [{"text": items[i], "score": round(float(item_scores[i]), 4)} for i in best],
+    }
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import re
+
+from utils.latex_validation_utils import brace_delta
+from utils.http_utils import LLMError
+from utils.llm_utils import async_chat_completion, DEFAULT_TEMPERATURE
+from utils.text_utils import keyword_set, tokenize
+
+SECTION_CONCURRENCY = int(os.getenv("SECTION_CONCURRENCY", "4"))
+# Resume lines sent along with each section.
+SECTION_EXCERPT_MAX_LINES = int(os.getenv("SECTION_EXCERPT_MAX_LINES", "25"))
+
+_SECTION_START = re.compile(r"\\section\*?\s*\{")
+_END_DOCUMENT = "\\end{document}"
+# Template placeholders such as "[Your GPA]" always need filling in.
+_PLACEHOLDER = re.compile(r"\[[A-Z][^\]\n]*\]")
+
+
+def _matching_brace(text: str, open_index: int) -> int:
+    """Index of the } closing the { at open_index (or len(text) if unbalanced)."""
+    depth = 0
+    i = open_index
+    while i < len(text):
+        char = text[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(text)
+
+
+def parse_sections(latex: str) -> list:
+    """
+    Split a LaTeX document into its \\section blocks.
+    Each entry has the section title, the span [start, end) of the whole block
+    (header included) in `latex`, and the block text itself. A block ends at the
+    next \\section or at \\end{document}.
+    """
+    body_end = latex.rfind(_END_DOCUMENT)
+    if body_end == -1:
+        body_end = len(latex)
+
+    starts = [m for m in _SECTION_START.finditer(latex) if m.start() < body_end]
+    # Skip commented-out sections such as "% \section{Work Experience}".
+    starts = [m for m in starts if "%" not in latex[latex.rfind("\n", 0, m.start()) + 1:m.start()]]
+
+    sections = []
+    for i, match in enumerate(starts):
+        start = match.start()
+        end = starts[i + 1].start() if i + 1 < len(starts) else body_end
+        title_close = _matching_brace(latex, match.end() - 1)
+        sections.append({
+            "title": latex[match.end():title_close].strip(),
+            "start": start,
+            "end": end,
+            "text": latex[start:end],
+        })
+    return sections
+
+
+def relevant_resume_excerpt(resume_text: str, section_text: str, jd_keywords: set,
+                            max_lines: int = SECTION_EXCERPT_MAX_LINES) -> str:
+    """Resume lines that share vocabulary with the section or the JD, in original order."""
+    section_keywords = keyword_set(section_text, latex=True)
+    scored = []
+    for index, line in enumerate(resume_text.splitlines()):
+        tokens = set(tokenize(line))
+        if not tokens:
+            continue
+        score = 2 * len(tokens & section_keywords) + len(tokens & jd_keywords)
+        if score:
+            scored.append((score, index, line.strip()))
+    top = sorted(scored, key=lambda item: (-item[0], item[1]))[:max_lines]
+    return "\n".join(line for _, _, line in sorted(top, key=lambda item: item[1]))
+
+
+def build_section_prompt(section: dict, resume_excerpt: str, jd_text: str) -> str:
+    return f"""
+You are a professional resume assistant.
+
+Task:
+- Take the following LaTeX resume section and tailor it using the resume content.
+- Do NOT modify LaTeX commands or formatting.
+- Only change the content inside the fields of this section.
+- Keep it ATS-friendly, concise, keyword-rich, and truthful. Do NOT invent experience.
+- Keep the same number of items and roughly the same length, so the resume stays on one page.
+- Job description must guide your adjustments.
+
+Section name: {section["title"]}
+Original section (LaTeX):
+{section["text"]}
+
+Relevant lines from the original resume text:
+{resume_excerpt}
+
+Job description:
+{jd_text}
+
+Return only the LaTeX code of this section (header + content). Do NOT return JSON or commentary.
+"""
+
+
+def clean_section_output(output: str, section: dict):
+    """Strip fences and sanity-check a tailored section; None means keep the original."""
+    lines = [line for line in (output or "").strip().splitlines() if not line.strip().startswith("```")]
+    text = "\n".join(lines).strip()
+    match = _SECTION_START.search(text)
+    if match is None or _END_DOCUMENT in text:
+        return None
+    text = text[match.start():]
+    # Either as (un)balanced as the original block, or fully balanced.
+    if brace_delta(text) not in (0, brace_delta(section["text"])):
+        return None
+    # Keep the whitespace that separated this block from the next one.
+    trailing = section["text"][len(section["text"].rstrip()):]
+    return text + trailing
+
+
+async def tailor_sections(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                          model: str = None, temperature: float = DEFAULT_TEMPERATURE,
+                          max_concurrency: int = SECTION_CONCURRENCY, sections: list = None) -> str:
+    """
+    Tailor each \\section independently and concurrently, sending only the
+    section and the matching resume lines. Sections that share no vocabulary
+    with the JD (and have no placeholders to fill), and sections whose reply fails the sanity check, are kept
+    as-is. The document is reassembled by span offsets, so the preamble and
+    everything between sections is byte-for-byte unchanged. A failed call
+    keeps its section unchanged; LLMError is raised only if every call failed.
+    `sections` may be passed in if `latex_code` was already parsed.
+    """
+    sections = parse_sections(latex_code) if sections is None else sections
+    jd_keywords = keyword_set(jd_text)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    errors = []
+    attempted = []
+
+    async def tailor_one(section):
+        has_placeholders = _PLACEHOLDER.search(section["text"]) is not None
+        if not has_placeholders and not keyword_set(section["text"], latex=True) & jd_keywords:
+            print(f"⏭️ Skipping section '{section['title']}' (no overlap with the job description)")
+            return None
+        attempted.append(section)
+        excerpt = relevant_resume_excerpt(resume_text, section["text"], jd_keywords)
+        prompt = build_section_prompt(section, excerpt, jd_text)
+        async with semaphore:
+            try:
+                output = await async_chat_completion(prompt, api_key, model, temperature)
+            except LLMError as e:
+                print(f"⚠️ Keeping original section '{section['title']}' ({e})")
+                errors.append(e)
+                return None
+        tailored = clean_section_output(output, section)
+        if tailored is None:
+            print(f"⚠️ Keeping original section '{section['title']}' (unusable model output)")
+        return tailored
+
+    results = await asyncio.gather(*(tailor_one(section) for section in sections))
+    if attempted and len(errors) == len(attempted):
+        raise errors[0]
+
+    pieces = []
+    cursor = 0
+    for section, tailored in zip(sections, results):
+        pieces.append(latex_code[cursor:section["start"]])
+        pieces.append(tailored if tailored is not None else section["text"])
+        cursor = section["end"]
+    pieces.append(latex_code[cursor:])
+    return "".join(pieces)
@@ -0,0 +1,197 @@
+import json
+import re
+
+from utils.latex_validation_utils import brace_delta, strip_comment
+from utils.http_utils import LLMError
+from utils.llm_utils import async_chat_completion, DEFAULT_TEMPERATURE
+from utils.prompt_utils import PROMPT_COMPACTION, strip_jd_boilerplate
+from utils.section_utils import _matching_brace, parse_sections
+
+_BEGIN_DOCUMENT = "\\begin{document}"
+_ITEM_MACRO = re.compile(r"\\(resumeItem|resumeSubItem)\s*\{")
+# A bare \item followed by its text on the same line (not \item\small{...} macro plumbing).
+_BARE_ITEM = re.compile(r"\\item(?![A-Za-z])[ \t]*(?:\[[^\]\n]*\])?[ \t]*([^\\\s%][^\n]*)")
+_TABULAR = re.compile(r"\\begin\{(tabular\*?|tabularx)\}(.*?)\\end\{\1\}", re.DOTALL)
+_ROW_END = re.compile(r"\\\\\s*(?:\[[^\]]*\])?\s*$")
+_UNESCAPED_SPECIAL = re.compile(r"(?<!\\)[&%$#_]")
+_CELL_SEPARATOR = re.compile(r"(?<!\\)&")
+
+
+def _commented(latex: str, index: int) -> bool:
+    line_start = latex.rfind("\n", 0, index) + 1
+    return strip_comment(latex[line_start:index]) != latex[line_start:index]
+
+
+def _section_title(sections: list, index: int) -> str:
+    for section in sections:
+        if section["start"] <= index < section["end"]:
+            return section["title"]
+    return ""
+
+
+def parse_slots(latex: str) -> list:
+    """
+    Editable content slots of the document body, in document order:
+        [{"id": "s1", "kind": "item" | "skills", "section": str, "start": int, "end": int, "text": str}, ...]
+    Slots are \\resumeItem / \\resumeSubItem arguments, bare \\item lines, and
+    the value column of tabular rows such as "\\textbf{Web} & React, HTML \\\\".
+    [start, end) is the span of `text` in `latex`; headings, dates and the
+    preamble are never slots.
+    """
+    body_start = latex.find(_BEGIN_DOCUMENT)
+    body_start = body_start + len(_BEGIN_DOCUMENT) if body_start != -1 else 0
+    sections = parse_sections(latex)
+    spans = []
+
+    for match in _ITEM_MACRO.finditer(latex, body_start):
+        if _commented(latex, match.start()):
+            continue
+        close = _matching_brace(latex, match.end() - 1)
+        spans.append(("item", match.end(), close))
+
+    for match in _BARE_ITEM.finditer(latex, body_start):
+        if _commented(latex, match.start()):
+            continue
+        text = strip_comment(match.group(1)).rstrip()
+        if text and brace_delta(text) == 0:
+            spans.append(("item", match.start(1), match.start(1) + len(text)))
+
+    for table in _TABULAR.finditer(latex, body_start):
+        offset = table.start(2)
+        for line in re.finditer(r"[^\n]+", table.group(2)):
+            code = strip_comment(line.group(0))
+            separator = _CELL_SEPARATOR.search(code)
+            if separator is None or _commented(latex, offset + line.start()):
+                continue
+            value_start = separator.end()
+            row_end = _ROW_END.search(code)
+            value_end = row_end.start() if row_end else len(code.rstrip())
+            value = code[value_start:value_end]
+            if _CELL_SEPARATOR.search(value) or not value.strip():
+                continue
+            lead = len(value) - len(value.lstrip())
+            start = offset + line.start() + value_start + lead
+            spans.append(("skills", start, offset + line.start() + value_start + len(value.rstrip())))
+
+    slots = []
+    for number, (kind, start, end) in enumerate(sorted(spans, key=lambda span: span[1]), 1):
+        slots.append({
+            "id": f"s{number}",
+            "kind": kind,
+            "section": _section_title(sections, start),
+            "start": start,
+            "end": end,
+            "text": latex[start:end],
+        })
+    return slots
+
+
+def build_slot_prompt(slots: list, resume_text: str, jd_text: str) -> str:
+    listing = "\n".join(
+        json.dumps({"id": slot["id"], "section": slot["section"], "text": slot["text"]}, ensure_ascii=False)
+        for slot in slots
+    )
+    return f"""
+You are a professional resume assistant and LaTeX expert.
+
+Task:
+- Below are the editable text fields of a LaTeX resume, one JSON object per line.
+- Tailor the fields to the job description using the original resume text.
+- Keep it truthful, ATS-friendly and concise. Do NOT invent experience, tools or outcomes.
+- Fill in any [Placeholder] fields from the resume text.
+- Keep every field about the same length, so the resume stays on one page.
+- Field text is LaTeX: escape & % $ # _ as \\& \\% \\$ \\# \\_ and keep braces balanced.
+- "skills" fields are one table cell: a comma-separated list, no & and no \\\\.
+
+Output instructions:
+- Return ONLY a JSON array of the fields you changed: [{{"id": "s1", "text": "new text"}}, ...]
+- Do NOT return the LaTeX document, markdown or commentary.
+
+Job description:
+{jd_text}
+
+Fields:
+{listing}
+
+Original resume text (plain):
+{resume_text}
+"""
+
+
+def parse_slot_edits(output: str):
+    """The JSON edit list from a model reply, or None if it cannot be read."""
+    text = (output or "").strip()
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return None
+    try:
+        edits = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(edits, list):
+        return None
+    return [edit for edit in edits
+            if isinstance(edit, dict) and isinstance(edit.get("id"), str) and isinstance(edit.get("text"), str)]
+
+
+def _usable_edit(slot: dict, text: str) -> bool:
+    if "\n\n" in text or brace_delta(text.replace("\n", " ")) != 0 or "\\end{document}" in text:
+        return False
+    if slot["kind"] == "skills" and ("\\\\" in text or _CELL_SEPARATOR.search(text)):
+        return False
+    if _UNESCAPED_SPECIAL.search(text.replace("$|$", "")) and not _UNESCAPED_SPECIAL.search(slot["text"]):
+        # The original field had no specials, so a raw one in the edit is a mistake, not math.
+        return False
+    return True
+
+
+def apply_slot_edits(latex: str, slots: list, edits: list) -> str:
+    """
+    Splice edited slot text into `latex`. Unknown ids and edits that would
+    break the document (unbalanced braces, stray & in a table cell, ...) are
+    skipped, so everything outside the slots is byte-for-byte unchanged.
+    """
+    by_id = {slot["id"]: slot for slot in slots}
+    replacements = {}
+    for edit in edits:
+        slot = by_id.get(edit["id"])
+        if slot is None:
+            print(f"⚠️ Ignoring edit for unknown slot '{edit['id']}'")
+            continue
+        text = edit["text"].strip()
+        if not _usable_edit(slot, text):
+            print(f"⚠️ Keeping original slot '{slot['id']}' (unsafe edit)")
+            continue
+        replacements[slot["id"]] = text
+
+    for slot in sorted(slots, key=lambda s: s["start"], reverse=True):
+        if slot["id"] in replacements:
+            latex = latex[:slot["start"]] + replacements[slot["id"]] + latex[slot["end"]:]
+    return latex
+
+
+async def tailor_slots(resume_text: str, jd_text: str, latex_code: str, api_key: str,
+                       model: str = None, temperature: float = DEFAULT_TEMPERATURE, slots: list = None) -> str:
+    """
+    Tailor only the template's content slots: the model gets the slot texts
+    and returns a JSON list of edits, which are applied locally. Output tokens
+    scale with the changed text instead of the whole document, and the
+    preamble can never be touched. Raises LLMError if the model fails or
+    never returns a readable edit list. `slots` may be passed in if
+    `latex_code` was already parsed (e.g. a registered template).
+    """
+    slots = parse_slots(latex_code) if slots is None else slots
+    if not slots:
+        raise LLMError("Template has no editable slots (\\resumeItem, \\item or table rows)")
+
+    if PROMPT_COMPACTION:
+        jd_text = strip_jd_boilerplate(jd_text)
+    prompt = build_slot_prompt(slots, resume_text, jd_text)
+    output = await async_chat_completion(prompt, api_key, model, temperature,
+                                         validate=lambda text: parse_slot_edits(text) is not None)
+    edits = parse_slot_edits(output)
+    if edits is None:
+        raise LLMError("Model did not return a JSON list of slot edits")
+
+    print(f"✏️ Applying {len(edits)} slot edits out of {len(slots)} slots")
+    return apply_slot_edits(latex_code, slots, edits)
@@ -0,0 +1,164 @@
+"""
+Template registry: upload a LaTeX template once, then reference it by id.
+
+Templates are content-addressed (the id is a prefix of the source's SHA-256),
+so uploading the same file twice returns the same entry. Each entry keeps the
+parsed \\section and slot structure, the preamble hash and the name of its
+precompiled format, so requests that pass a template_id skip the upload and
+the parsing; prewarm_template() builds the format and seeds the compile work
+dir ahead of the first request.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from utils.latex_format_utils import ensure_format, format_key
+from utils.pdf_and_latex_utils import compile_probe, get_preamble
+from utils.section_utils import parse_sections
+from utils.slot_utils import parse_slots
+
+TEMPLATES_DIR = os.getenv("TEMPLATES_DIR", os.path.join(tempfile.gettempdir(), "resume_tailor_templates"))
+
+_TEMPLATE_ID = re.compile(r"[0-9a-f]{16}")
+
+
+def template_id_for(latex: str) -> str:
+    return hashlib.sha256(latex.encode("utf-8")).hexdigest()[:16]
+
+
+def analyze_template(latex: str, name: Optional[str] = None) -> dict:
+    """Registry entry for a template: its source plus everything derived from it."""
+    if "\\begin{document}" not in latex or "\\end{document}" not in latex:
+        raise ValueError("Template must be a complete LaTeX document (\\begin{document} ... \\end{document})")
+    return {
+        "id": template_id_for(latex),
+        "name": name,
+        "latex": latex,
+        "size": len(latex.encode("utf-8")),
+        "preamble_hash": hashlib.sha256(get_preamble(latex).encode("utf-8")).hexdigest(),
+        "format_key": format_key(latex),
+        "sections": parse_sections(latex),
+        "slots": parse_slots(latex),
+        "created_at": time.time(),
+    }
+
+
+def template_summary(entry: dict) -> dict:
+    """Public view of an entry (no source, just the structure)."""
+    return {
+        "template_id": entry["id"],
+        "name": entry["name"],
+        "size": entry["size"],
+        "preamble_hash": entry["preamble_hash"],
+        "sections": [section["title"] for section in entry["sections"]],
+        "slots": len(entry["slots"]),
+        # None until prewarm_template has compiled it once in this process.
+        "compiles": entry.get("compiles"),
+        "created_at": entry["created_at"],
+    }
+
+
+class TemplateRegistry:
+    """Templates on disk (<id>.tex + <id>.json) with an in-memory copy of every entry loaded."""
+
+    def __init__(self, root: str = TEMPLATES_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _path(self, template_id: str, ext: str) -> str:
+        return os.path.join(self.root, template_id + ext)
+
+    def register(self, latex: str, name: Optional[str] = None) -> dict:
+        """Store a template (a no-op for one already registered) and return its entry."""
+        existing = self.get(template_id_for(latex))
+        if existing is not None:
+            return existing
+
+        entry = analyze_template(latex, name)
+        metadata = {key: value for key, value in entry.items() if key != "latex"}
+        for ext, content in ((".tex", latex), (".json", json.dumps(metadata))):
+            tmp_path = f"{self._path(entry['id'], ext)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(entry["id"], ext))
+
+        with self._lock:
+            self._entries[entry["id"]] = entry
+        print(f"✅ Registered template {entry['id']} ({len(entry['sections'])} sections, {len(entry['slots'])} slots)")
+        return entry
+
+    def get(self, template_id: str) -> Optional[dict]:
+        if not _TEMPLATE_ID.fullmatch(template_id or ""):
+            return None
+        with self._lock:
+            entry = self._entries.get(template_id)
+        if entry is not None:
+            return entry
+
+        try:
+            with open(self._path(template_id, ".json"), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(self._path(template_id, ".tex"), "r", encoding="utf-8") as f:
+                entry["latex"] = f.read()
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._entries[template_id] = entry
+        return entry
+
+    def list(self) -> list:
+        template_ids = sorted(name[:-len(".json")] for name in os.listdir(self.root) if name.endswith(".json"))
+        entries = [self.get(template_id) for template_id in template_ids]
+        return sorted((entry for entry in entries if entry), key=lambda entry: entry["created_at"])
+
+    def delete(self, template_id: str) -> bool:
+        if self.get(template_id) is None:
+            return False
+        with self._lock:
+            self._entries.pop(template_id, None)
+        for ext in (".tex", ".json"):
+            try:
+                os.remove(self._path(template_id, ext))
+            except OSError:
+                pass
+        return True
+
+
+def prewarm_template(entry: dict) -> bool:
+    """
+    Do a template's compile work ahead of time: dump its preamble format (if
+    LATEX_PRECOMPILE is on) and probe-compile it once, which leaves .aux/.out
+    in the work dir later builds with the same preamble start from. Never
+    raises (it runs unattended after upload); the outcome is kept in
+    entry["compiles"] and shown by template_summary.
+    """
+    try:
+        env = dict(os.environ)
+        ensure_format(entry["latex"], env)
+        ok = compile_probe(entry["latex"]) is not None
+    except Exception as e:
+        print(f"❌ Prewarming template {entry['id']} failed: {e}")
+        ok = False
+    if not ok:
+        print(f"⚠️ Template {entry['id']} did not compile while prewarming")
+    entry["compiles"] = ok
+    return ok
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_template_registry() -> TemplateRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TemplateRegistry()
+        return _registry
@@ -0,0 +1,32 @@
+import re
+
+from utils.latex_validation_utils import strip_comment
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each etc few for from further had has have having he her here
+hers him his how i if in into is it its itself just me more most my no nor not now of off on once only or
+other our ours out over own per same she should so some such than that the their theirs them then there these
+they this those through to too under until up us very via was we were what when where which while who whom
+why will with within without would you your yours
+""".split())
+
+# LaTeX control sequences, \begin{env}/\end{env} and bracketed template placeholders carry no content.
+_LATEX_NOISE = re.compile(r"\\(?:begin|end)\s*\{[^}]*\}|\\[a-zA-Z@]+\*?|\\.")
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+
+
+def strip_latex(text: str) -> str:
+    """Rough plain-text view of a LaTeX fragment (commands removed, arguments kept)."""
+    text = "\n".join(strip_comment(line) for line in text.splitlines())
+    text = _LATEX_NOISE.sub(" ", text)
+    return re.sub(r"[{}$&~\\[\]]", " ", text)
+
+
+def tokenize(text: str) -> list:
+    """Lowercase content words, keeping tech tokens like c++, c#, node.js."""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def keyword_set(text: str, latex: bool = False) -> set:
+    return set(tokenize(strip_latex(text) if latex else text))